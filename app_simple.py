@@ -1,69 +1,166 @@
-from flask import Flask, render_template, redirect, url_for, flash, request # type: ignore
-from flask_login import LoginManager, current_user, login_user, logout_user, login_required # type: ignore
-from werkzeug.security import generate_password_hash, check_password_hash # type: ignore
+"""Application AVEC.
+
+``create_app()`` construit l'application ; ``app_simple:app`` reste
+disponible et n'est créée qu'au premier accès. Sous gunicorn, l'application
+est préchargée dans le maître (``preload_app``, voir ``gunicorn.conf.py``) :
+les modules importés sont partagés par copie sur écriture entre les workers,
+qui démarrent alors sans rien réimporter. La durée de démarrage à froid est
+mesurée et exposée (journal, ``STARTUP_MS``, métrique
+``avec_app_startup_seconds``).
+"""
+import time
+
+_MODULE_STARTED = time.perf_counter()
+
 import os
-from datetime import datetime
-import logging
-from logging.handlers import RotatingFileHandler
-
-# Configuration par défaut
-os.environ.setdefault('FLASK_APP', 'app_simple.py')
-os.environ.setdefault('FLASK_ENV', 'development')
-os.environ.setdefault('SECRET_KEY', 'your-secret-key-here')
-os.environ.setdefault('DATABASE_URL', 'sqlite:///avec.db')
-
-# Configuration du logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
-
-# Initialisation de l'application Flask
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///avec.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Configuration de sécurité
-app.config['SESSION_COOKIE_SECURE'] = os.getenv('FLASK_ENV') == 'production'
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-
-# Import des modèles et db
-from models import db, User, Cycle, Group, Transaction
-
-# Initialisation des extensions
-db.init_app(app)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
-login_manager.login_message_category = 'info'
-
-# Import des routes
-from routes import auth, cycles, groups, transactions
-from routes import notifications
-from routes import avec
-
-# Enregistrement des blueprints
-app.register_blueprint(auth.bp)
-app.register_blueprint(cycles.bp)
-app.register_blueprint(groups.bp)
-app.register_blueprint(transactions.bp)
-app.register_blueprint(notifications.bp)
-app.register_blueprint(avec.bp)
-
-@login_manager.user_loader
+import weakref
+
+from flask import Flask, current_app, render_template, redirect, url_for, flash, request # type: ignore
+from flask_login import LoginManager, current_user, login_required # type: ignore
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.security import generate_password_hash # type: ignore
+
+_first_app = True
+
+# Moteurs de toutes les applications créées ; un seul hook de fork pour le processus
+_engines = weakref.WeakSet()
+
+def load_config(app, config=None):
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-here')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///avec.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        # Une connexion par thread de worker (gunicorn gthread, voir gunicorn.conf.py)
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', os.getenv('GUNICORN_THREADS', '8'))),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '2')),
+            'pool_timeout': 10,
+            'pool_pre_ping': True,
+        }
+    
+    # Configuration de sécurité
+    app.config['SESSION_COOKIE_SECURE'] = os.getenv('FLASK_ENV') == 'production'
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+    
+    # Instrumentation des performances
+    app.config['PERF_SLOW_REQUEST_MS'] = int(os.getenv('PERF_SLOW_REQUEST_MS', '500'))
+    app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', '200'))
+    app.config['SLOW_QUERY_EXPLAIN'] = os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    
+    # SMS sortants (flask sms send) : fichier local par défaut, URL http(s) du fournisseur en production
+    app.config['SMS_GATEWAY'] = os.getenv('SMS_GATEWAY', 'file:logs/sms.jsonl')
+    app.config['SMS_RATE_PER_SECOND'] = float(os.getenv('SMS_RATE_PER_SECOND', '5'))
+    
+    if config:
+        app.config.update(config)
+
+def create_app(config=None):
+    """Construit l'application : configuration, extensions, blueprints et commandes"""
+    global _first_app
+    # Le premier appel compte aussi l'import de Flask et de ce module
+    started = _MODULE_STARTED if _first_app else time.perf_counter()
+    _first_app = False
+    
+    app = Flask(__name__)
+    load_config(app, config)
+    
+    # Import des modèles et db
+    from models import db
+    
+    # Initialisation des extensions
+    db.init_app(app)
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.login_view = 'auth.login'
+    login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
+    login_manager.login_message_category = 'info'
+    login_manager.user_loader(load_user)
+    
+    # Instrumentation des requêtes (SQL, templates, temps total)
+    from monitoring import perf, metrics, slow_queries
+    perf.init_app(app)
+    metrics.init_app(app)
+    slow_queries.init_app(app)
+    
+    # Index de recherche plein texte (FTS5 / pg_trgm)
+    from search import index as search_index
+    search_index.init_app(app)
+    
+    # Ressources statiques avec empreinte (static/dist, servies par /assets)
+    from assets import pipeline as assets_pipeline
+    assets_pipeline.init_app(app)
+    
+    # Import des routes
+    from routes import auth, cycles, groups, transactions
+    from routes import notifications
+    from routes import avec
+    from routes import debug
+    from routes import metrics as metrics_routes
+    from routes import search as search_routes
+    from routes import assets as assets_routes
+    
+    # Enregistrement des blueprints
+    app.register_blueprint(auth.bp)
+    app.register_blueprint(cycles.bp)
+    app.register_blueprint(groups.bp)
+    app.register_blueprint(transactions.bp)
+    app.register_blueprint(notifications.bp)
+    app.register_blueprint(avec.bp)
+    app.register_blueprint(debug.bp)
+    app.register_blueprint(metrics_routes.bp)
+    app.register_blueprint(search_routes.bp)
+    app.register_blueprint(assets_routes.bp)
+    
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/dashboard', 'dashboard', dashboard)
+    app.add_url_rule('/about', 'about', about)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, internal_error)
+    app.register_error_handler(StaleDataError, stale_data_error)
+    app.register_error_handler(403, forbidden_error)
+    
+    # Commandes CLI : modules importés seulement si la CLI flask les demande
+    from commands import LazyCommands
+    app.cli = LazyCommands(app.name)
+    
+    _track_engines(app)
+    
+    elapsed = time.perf_counter() - started
+    app.config['STARTUP_MS'] = round(elapsed * 1000, 1)
+    metrics.startup_completed(elapsed)
+    app.logger.info('Application prête en %.0f ms', elapsed * 1000)
+    return app
+
+def _track_engines(app):
+    """Inscrit les moteurs de l'application pour la remise à zéro des pools après un fork"""
+    from models import db
+    
+    with app.app_context():
+        _engines.update(db.engines.values())
+
+def _reset_pools_after_fork():
+    """Après un fork (workers gunicorn préchargés), ne pas réutiliser les connexions du maître"""
+    for engine in list(_engines):
+        # close=False : les connexions restent ouvertes pour le maître
+        engine.dispose(close=False)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
 def load_user(user_id):
+    from models import User
     return User.query.get(int(user_id))
 
-@app.route('/')
 def index():
     if current_user.is_authenticated:
         return redirect(url_for('dashboard'))
     return render_template('index.html')
 
-@app.route('/dashboard')
 @login_required
 def dashboard():
+    from models import Cycle, Group, Transaction
     try:
         # Statistiques pour le tableau de bord
         total_cycles = Cycle.query.count()
@@ -81,7 +178,7 @@ def dashboard():
                              active_cycles=active_cycles,
                              recent_cycles=recent_cycles)
     except Exception as e:
-        app.logger.error(f"Erreur dashboard: {str(e)}")
+        current_app.logger.error(f"Erreur dashboard: {str(e)}")
         flash('Erreur lors du chargement du tableau de bord', 'error')
         return render_template('dashboard.html',
                              total_cycles=0,
@@ -90,25 +187,40 @@ def dashboard():
                              active_cycles=0,
                              recent_cycles=[])
 
-@app.route('/about')
 def about():
     return render_template('about.html')
 
-@app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def internal_error(error):
+    from models import db
     db.session.rollback()
-    app.logger.error(f"Erreur 500: {str(error)}")
+    current_app.logger.error(f"Erreur 500: {str(error)}")
     return render_template('errors/500.html'), 500
 
-@app.errorhandler(403)
+def stale_data_error(error):
+    from models import db
+    # Conflit de version non géré localement par la route : on signale plutôt que d'écraser
+    db.session.rollback()
+    flash('Ces données ont été modifiées simultanément par un autre utilisateur, veuillez réessayer', 'error')
+    return redirect(request.referrer or url_for('dashboard'))
+
 def forbidden_error(error):
     return render_template('errors/403.html'), 403
 
+def __getattr__(name):
+    # ``app_simple:app`` (flask, app.py, anciens déploiements) : application
+    # créée au premier accès plutôt qu'à l'import du module
+    global app
+    if name == 'app':
+        app = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 if __name__ == '__main__':
+    from models import db, User
+    app = create_app()
     with app.app_context():
         # Supprimer et recréer toutes les tables
         db.drop_all()
@@ -0,0 +1,198 @@
+"""Ressources statiques : copies locales, empreintes et précompression.
+
+Les feuilles de style et scripts tiers (Bootstrap, Bootstrap Icons,
+Chart.js) sont copiés dans ``static/vendor`` par ``flask assets vendor`` :
+l'application ne dépend plus d'un CDN et fonctionne hors connexion.
+``static/vendor`` n'est pas versionné : la commande fait partie du
+déploiement, et les pages gardent les adresses du CDN tant qu'elle n'a pas
+été lancée (signalé une fois par processus, au premier rendu concerné).
+``build`` copie chaque ressource de ``static/`` dans ``static/dist`` sous un
+nom qui contient l'empreinte de son contenu (``app.3f2a9c1b7d4e.css``),
+avec ses variantes précompressées (``.gz``, et ``.br`` si le module
+``brotli`` est installé). Ces fichiers ne changent jamais : ``/assets`` les
+sert avec un cache d'un an « immutable », et un nouveau contenu produit un
+nouveau nom. Une page déjà visitée ne recharge plus que son HTML.
+
+Dans les templates, ``asset_url('css/app.css')`` donne l'URL avec empreinte,
+ou l'adresse du CDN tant qu'une ressource tierce n'a pas été copiée.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import urllib.request
+
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:  # dépendance facultative : gzip seul
+    brotli = None
+
+logger = logging.getLogger('avec.assets')
+
+CDN = 'https://cdn.jsdelivr.net/npm'
+
+# Ressources tierces : chemin dans static/ -> adresse d'origine (versions figées)
+VENDOR = {
+    'vendor/bootstrap.min.css': f'{CDN}/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap.bundle.min.js': f'{CDN}/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/bootstrap-icons.css': f'{CDN}/bootstrap-icons@1.10.0/font/bootstrap-icons.css',
+    'vendor/fonts/bootstrap-icons.woff2': f'{CDN}/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff2',
+    'vendor/fonts/bootstrap-icons.woff': f'{CDN}/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff',
+    'vendor/chart.umd.js': f'{CDN}/chart.js@4.4.0/dist/chart.umd.js',
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+# Types texte qui gagnent à être compressés (woff2, png... le sont déjà)
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.woff')
+MAX_AGE = 365 * 24 * 3600
+
+_CSS_URL = re.compile(r'url\(\s*(["\']?)([^"\')]+?)\1\s*\)')
+
+_manifest = {}
+_built = frozenset()
+_dist_dir = None
+_cdn_warned = False
+
+
+def fingerprinted_name(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, extension = os.path.splitext(path)
+    return f'{stem}.{digest}{extension}'
+
+
+def _sources(static_dir):
+    """Chemins relatifs (avec des /) des ressources de static/, hors dist/"""
+    paths = []
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [name for name in dirs if os.path.join(root, name) != os.path.join(static_dir, DIST_DIR)]
+        for name in files:
+            paths.append(os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, '/'))
+    # Les CSS en dernier : leurs url(...) pointent vers les noms avec empreinte
+    return sorted(paths, key=lambda path: (path.endswith('.css'), path))
+
+
+def _rewrite_css(path, content, manifest):
+    base = os.path.dirname(path)
+
+    def replace(match):
+        quote, target = match.groups()
+        if target.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        reference, _, suffix = target.partition('?')
+        resolved = os.path.normpath(os.path.join(base, reference)).replace(os.sep, '/')
+        if resolved not in manifest:
+            return match.group(0)
+        relative = os.path.relpath(manifest[resolved], base or '.').replace(os.sep, '/')
+        return f'url({quote}{relative}{quote})'
+
+    return _CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as handle:
+        handle.write(content)
+
+
+def build(static_dir):
+    """Produit static/dist (fichiers avec empreinte et variantes compressées) ; retourne le manifeste"""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    manifest = {}
+    for path in _sources(static_dir):
+        with open(os.path.join(static_dir, path), 'rb') as handle:
+            content = handle.read()
+        if path.endswith('.css'):
+            content = _rewrite_css(path, content, manifest)
+        name = fingerprinted_name(path, content)
+        manifest[path] = name
+
+        target = os.path.join(dist_dir, name)
+        if os.path.exists(target):
+            continue  # Même empreinte : déjà produit par une construction précédente
+        _write(target, content)
+        if name.endswith(COMPRESSIBLE):
+            _write(target + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(content))
+
+    _write(os.path.join(dist_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def vendor(static_dir, force=False):
+    """Télécharge les ressources tierces dans static/vendor ; retourne les chemins copiés"""
+    copied = []
+    for path, url in VENDOR.items():
+        target = os.path.join(static_dir, path)
+        if os.path.exists(target) and not force:
+            continue
+        with urllib.request.urlopen(url, timeout=30) as response:
+            _write(target, response.read())
+        copied.append(path)
+    return copied
+
+
+def _stale(static_dir, manifest_path):
+    built_at = os.path.getmtime(manifest_path)
+    return any(
+        os.path.getmtime(os.path.join(static_dir, path)) > built_at
+        for path in _sources(static_dir)
+    )
+
+
+def load(static_dir):
+    """Charge le manifeste, en reconstruisant static/dist s'il manque ou si une source a changé"""
+    global _manifest, _built, _dist_dir
+    _dist_dir = os.path.join(static_dir, DIST_DIR)
+    manifest_path = os.path.join(_dist_dir, MANIFEST)
+    try:
+        if not os.path.exists(manifest_path) or _stale(static_dir, manifest_path):
+            _manifest = build(static_dir)
+        else:
+            with open(manifest_path, encoding='utf-8') as handle:
+                _manifest = json.load(handle)
+    except OSError as exc:
+        # Système de fichiers en lecture seule : ressources servies sans empreinte
+        logger.warning('Ressources statiques non construites : %s', exc)
+        _manifest = {}
+    _built = frozenset(_manifest.values())
+    return _manifest
+
+
+def missing_vendor():
+    """Ressources tierces absentes du manifeste courant (servies par le CDN)"""
+    return [path for path in VENDOR if path not in _manifest]
+
+
+def dist_dir():
+    return _dist_dir
+
+
+def is_built(name):
+    """Vrai si ``name`` est un fichier avec empreinte du manifeste courant"""
+    return name in _built
+
+
+def asset_url(path):
+    """URL d'une ressource de static/ : avec empreinte si construite, sinon CDN ou /static"""
+    global _cdn_warned
+    name = _manifest.get(path)
+    if name is not None:
+        return url_for('assets.serve', filename=name)
+    if path in VENDOR:
+        if not _cdn_warned:
+            _cdn_warned = True
+            logger.warning('Ressources tierces servies par le CDN (flask assets vendor) : %s',
+                           ', '.join(missing_vendor()))
+        return VENDOR[path]
+    return url_for('static', filename=path)
+
+
+def init_app(app):
+    load(app.static_folder)
+    app.jinja_env.globals['asset_url'] = asset_url
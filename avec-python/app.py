@@ -14,8 +14,14 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-pro
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///avec.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Bases dédiées des grosses organisations : TENANT_DATABASES="12=postgresql://...;15=..."
+from models.tenancy import parse_tenant_databases
+app.config['SQLALCHEMY_BINDS'] = parse_tenant_databases(os.getenv('TENANT_DATABASES'))
+
 # Import des modèles et db
 from models import db, User, Cycle, Group, Transaction, Organization
+from models import tenancy
+from models.tenancy import scoped, use_tenant, dedicated_organization_ids
 
 # Initialisation des extensions
 db.init_app(app)
@@ -24,6 +30,7 @@ login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
 login_manager.login_message_category = 'info'
+tenancy.init_app(app)
 
 # Import des routes
 from routes import auth, cycles, groups, transactions, organizations
@@ -35,6 +42,9 @@ app.register_blueprint(groups.bp)
 app.register_blueprint(transactions.bp)
 app.register_blueprint(organizations.bp)
 
+from commands import tenants
+app.cli.add_command(tenants.cli)
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -50,21 +60,32 @@ def index():
 def dashboard():
     # Statistiques pour le tableau de bord
     if current_user.role == 'admin':
-        # Admin global - voir toutes les organisations
+        # Admin global - voir toutes les organisations : base partagée puis bases dédiées
         total_organizations = Organization.query.count()
-        total_cycles = Cycle.query.count()
-        total_groups = Group.query.count()
-        total_transactions = Transaction.query.count()
-        active_cycles = Cycle.query.filter_by(status='active').count()
-        recent_cycles = Cycle.query.order_by(Cycle.created_at.desc()).limit(5).all()
+        total_cycles = total_groups = total_transactions = active_cycles = 0
+        recent_cycles = []
+        for organization_id in [None] + dedicated_organization_ids(db):
+            with use_tenant(organization_id):
+                total_cycles += Cycle.query.count()
+                total_groups += Group.query.count()
+                total_transactions += Transaction.query.count()
+                active_cycles += Cycle.query.filter_by(status='active').count()
+                cycles = Cycle.query.order_by(Cycle.created_at.desc()).limit(5).all()
+                recent_cycles += [(cycle, cycle.groups.count(), organization_id) for cycle in cycles]
+            # Les mêmes identifiants existent dans plusieurs bases : les cycles lus
+            # sont détachés de la session avant de lire la base suivante
+            for cycle in cycles:
+                db.session.expunge(cycle)
+        recent_cycles = sorted(recent_cycles, key=lambda entry: entry[0].created_at, reverse=True)[:5]
     else:
-        # Utilisateur d'organisation - voir seulement ses données
+        # Utilisateur d'organisation - voir seulement ses données (dans sa base)
         total_organizations = 1 if current_user.organization else 0
-        total_cycles = Cycle.query.filter_by(organization_id=current_user.organization_id).count() if current_user.organization_id else 0
-        total_groups = Group.query.join(Cycle).filter(Cycle.organization_id == current_user.organization_id).count() if current_user.organization_id else 0
-        total_transactions = Transaction.query.join(Group).join(Cycle).filter(Cycle.organization_id == current_user.organization_id).count() if current_user.organization_id else 0
-        active_cycles = Cycle.query.filter_by(status='active', organization_id=current_user.organization_id).count() if current_user.organization_id else 0
-        recent_cycles = Cycle.query.filter_by(organization_id=current_user.organization_id).order_by(Cycle.created_at.desc()).limit(5).all() if current_user.organization_id else []
+        total_cycles = scoped(Cycle).count()
+        total_groups = scoped(Group).count()
+        total_transactions = scoped(Transaction).count()
+        active_cycles = scoped(Cycle).filter_by(status='active').count()
+        recent_cycles = [(cycle, cycle.groups.count(), None)
+                         for cycle in scoped(Cycle).order_by(Cycle.created_at.desc()).limit(5)]
     
     return render_template('dashboard.html',
                         total_organizations=total_organizations,
@@ -0,0 +1,122 @@
+"""Gestion des bases par organisation.
+
+Utilisation :
+    flask tenants backfill          # ajoute et remplit organization_id sur groups/transactions
+    flask tenants provision 12      # déplace les données de l'organisation 12 dans sa base dédiée
+
+La base dédiée doit d'abord être déclarée dans TENANT_DATABASES
+(« 12=postgresql://.../avec_org12 »), puis l'application redémarrée.
+"""
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+from sqlalchemy.schema import CreateTable
+
+from models import db
+from models.tenancy import TENANT_TABLES, tenant_bind_key
+
+cli = AppGroup('tenants', help='Cloisonnement des données par organisation.')
+
+BATCH_SIZE = 1000
+
+
+def _tables():
+    return [db.metadata.tables[name] for name in TENANT_TABLES]
+
+
+def backfill_organization_ids(connection):
+    """Ajoute les colonnes et index manquants, puis recopie organization_id depuis les parents"""
+    inspector = sa.inspect(connection)
+    for table in (db.metadata.tables['groups'], db.metadata.tables['transactions']):
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        if 'organization_id' not in columns:
+            connection.execute(sa.text(f'ALTER TABLE {table.name} ADD COLUMN organization_id INTEGER'))
+    for table in _tables():
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+
+    cycles, groups, transactions = (db.metadata.tables[name] for name in ('cycles', 'groups', 'transactions'))
+    updated = connection.execute(
+        groups.update().where(groups.c.organization_id.is_(None)).values(
+            organization_id=sa.select(cycles.c.organization_id)
+            .where(cycles.c.id == groups.c.cycle_id).scalar_subquery()
+        )
+    ).rowcount
+    updated += connection.execute(
+        transactions.update().where(transactions.c.organization_id.is_(None)).values(
+            organization_id=sa.select(groups.c.organization_id)
+            .where(groups.c.id == transactions.c.group_id).scalar_subquery()
+        )
+    ).rowcount
+    return updated
+
+
+def create_tenant_schema(connection):
+    """Crée les tables tenant sans les clés étrangères vers users/organizations (base partagée)"""
+    inspector = sa.inspect(connection)
+    for table in _tables():
+        if inspector.has_table(table.name):
+            continue
+        local_keys = [
+            constraint for constraint in table.foreign_key_constraints
+            if constraint.referred_table.name in TENANT_TABLES
+        ]
+        connection.execute(CreateTable(table, include_foreign_key_constraints=local_keys))
+        for index in table.indexes:
+            index.create(connection)
+
+
+def _selections(organization_id):
+    cycles, groups, group_members, transactions = _tables()
+    return {
+        'cycles': cycles.c.organization_id == organization_id,
+        'groups': groups.c.organization_id == organization_id,
+        'group_members': group_members.c.group_id.in_(
+            sa.select(groups.c.id).where(groups.c.organization_id == organization_id)
+        ),
+        'transactions': transactions.c.organization_id == organization_id,
+    }
+
+
+@cli.command('backfill')
+def backfill():
+    """Remplit organization_id des groupes et transactions de la base partagée."""
+    with db.engines[None].begin() as connection:
+        updated = backfill_organization_ids(connection)
+    click.echo(f'✅ {updated} ligne(s) mise(s) à jour')
+
+
+@cli.command('provision')
+@click.argument('organization_id', type=int)
+def provision(organization_id):
+    """Déplace les données d'une organisation vers sa base dédiée."""
+    key = tenant_bind_key(organization_id)
+    if key not in db.engines:
+        raise click.ClickException(f'Aucune base déclarée pour l\'organisation {organization_id} dans TENANT_DATABASES')
+
+    selections = _selections(organization_id)
+    with db.engines[None].begin() as source:
+        backfill_organization_ids(source)
+        with db.engines[key].begin() as target:
+            create_tenant_schema(target)
+            for table in _tables():
+                copied = 0
+                result = source.execute(sa.select(table).where(selections[table.name]))
+                for rows in result.mappings().partitions(BATCH_SIZE):
+                    target.execute(table.insert(), [dict(row) for row in rows])
+                    copied += len(rows)
+                click.echo(f'  {table.name:14} {copied} ligne(s) copiée(s)')
+            if target.dialect.name == 'postgresql':
+                # Les identifiants ont été copiés tels quels : recaler les séquences
+                for table in _tables():
+                    if 'id' in table.c:
+                        target.execute(sa.text(
+                            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                            f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+                        ))
+        # La base dédiée est validée : retirer les lignes de la base partagée (enfants d'abord)
+        for table in reversed(_tables()):
+            source.execute(table.delete().where(selections[table.name]))
+    click.echo(f'✅ Organisation {organization_id} servie par sa base dédiée')
@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from .tenancy import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 from .user import User
 from .cycle import Cycle
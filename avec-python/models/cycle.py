@@ -3,6 +3,9 @@ from . import db
 
 class Cycle(db.Model):
     __tablename__ = 'cycles'
+    __table_args__ = (
+        db.Index('ix_cycles_organization_created', 'organization_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
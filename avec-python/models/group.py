@@ -3,11 +3,15 @@ from . import db
 
 class Group(db.Model):
     __tablename__ = 'groups'
+    __table_args__ = (
+        db.Index('ix_groups_organization_created', 'organization_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     cycle_id = db.Column(db.Integer, db.ForeignKey('cycles.id'), nullable=False)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'))  # recopié du cycle
     creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     max_members = db.Column(db.Integer, default=25)
     current_members = db.Column(db.Integer, default=0)
@@ -21,27 +25,67 @@ class Group(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relations
-    members = db.relationship('User', secondary='group_members', lazy='dynamic')
+    # Pas de relation vers les membres : group_members peut être dans la base
+    # de l'organisation et users dans la base partagée (voir models/tenancy.py)
     transactions = db.relationship('Transaction', backref='group', lazy='dynamic')
     
     def can_accept_members(self):
         return self.current_members < self.max_members and self.status == 'active'
     
+    def member_ids(self):
+        return [user_id for (user_id,) in db.session.execute(
+            db.select(group_members.c.user_id).where(group_members.c.group_id == self.id)
+        )]
+    
+    def get_members(self):
+        """Membres du groupe, lus en deux requêtes (liens puis utilisateurs)"""
+        from .user import User
+        member_ids = self.member_ids()
+        if not member_ids:
+            return []
+        return User.query.filter(User.id.in_(member_ids)).order_by(User.last_name, User.first_name).all()
+    
+    def has_member(self, user):
+        return db.session.execute(
+            db.select(group_members.c.user_id)
+            .where(group_members.c.group_id == self.id, group_members.c.user_id == user.id)
+        ).first() is not None
+    
     def add_member(self, user):
         if self.can_accept_members():
-            if user not in self.members:
-                self.members.append(user)
+            if not self.has_member(user):
+                db.session.execute(group_members.insert().values(group_id=self.id, user_id=user.id))
                 self.current_members += 1
                 return True
         return False
     
     def remove_member(self, user):
-        if user in self.members:
-            self.members.remove(user)
+        if self.has_member(user):
+            db.session.execute(group_members.delete().where(
+                group_members.c.group_id == self.id, group_members.c.user_id == user.id
+            ))
             self.current_members -= 1
             return True
         return False
     
+    @staticmethod
+    def apply_balance_delta(group_id, **deltas):
+        """Applique des variations de soldes en un seul UPDATE atomique"""
+        # UPDATE groups SET total_savings = total_savings + :delta WHERE id = :id
+        values = {
+            getattr(Group, column): getattr(Group, column) + delta
+            for column, delta in deltas.items() if delta
+        }
+        if not values:
+            return
+        # Les objets Group chargés dans la session sont rafraîchis au commit
+        db.session.execute(
+            db.update(Group)
+            .where(Group.id == group_id)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+    
     def get_fill_percentage(self):
         if self.max_members > 0:
             return (self.current_members / self.max_members) * 100
@@ -1,5 +1,6 @@
 from datetime import datetime
 from . import db
+from .tenancy import dedicated_organization_ids, use_tenant
 
 class Organization(db.Model):
     __tablename__ = 'organizations'
@@ -20,29 +21,48 @@ class Organization(db.Model):
     users = db.relationship('User', backref='organization', lazy='dynamic')
     cycles = db.relationship('Cycle', backref='organization', lazy='dynamic')
     
-    def get_total_groups(self):
-        return sum(cycle.groups.count() for cycle in self.cycles.all())
+    @staticmethod
+    def _stats_query(organization_ids):
+        """Totaux groupés par organisation dans la base courante (deux requêtes)"""
+        from .cycle import Cycle
+        from .group import Group
+        stats = {
+            organization_id: {'cycles': 0, 'groups': 0, 'members': 0, 'savings': 0, 'loans': 0}
+            for organization_id in organization_ids
+        }
+        for organization_id, cycles in db.session.execute(
+            db.select(Cycle.organization_id, db.func.count(Cycle.id))
+            .where(Cycle.organization_id.in_(organization_ids))
+            .group_by(Cycle.organization_id)
+        ):
+            stats[organization_id]['cycles'] = cycles
+        for organization_id, groups, members, savings, loans in db.session.execute(
+            db.select(
+                Group.organization_id,
+                db.func.count(Group.id),
+                db.func.coalesce(db.func.sum(Group.current_members), 0),
+                db.func.coalesce(db.func.sum(Group.total_savings), 0),
+                db.func.coalesce(db.func.sum(Group.total_loans), 0)
+            )
+            .where(Group.organization_id.in_(organization_ids))
+            .group_by(Group.organization_id)
+        ):
+            stats[organization_id].update(groups=groups, members=members, savings=savings, loans=loans)
+        return stats
     
-    def get_total_members(self):
-        total = 0
-        for cycle in self.cycles.all():
-            for group in cycle.groups.all():
-                total += group.current_members
-        return total
+    @staticmethod
+    def stats_by_organization(organization_ids):
+        """Totaux de plusieurs organisations : une passe sur la base partagée, une par base dédiée"""
+        dedicated = set(dedicated_organization_ids(db)) & set(organization_ids)
+        with use_tenant(None):
+            stats = Organization._stats_query([i for i in organization_ids if i not in dedicated])
+        for organization_id in dedicated:
+            with use_tenant(organization_id):
+                stats.update(Organization._stats_query([organization_id]))
+        return stats
     
-    def get_total_savings(self):
-        total = 0
-        for cycle in self.cycles.all():
-            for group in cycle.groups.all():
-                total += group.total_savings
-        return total
-    
-    def get_total_loans(self):
-        total = 0
-        for cycle in self.cycles.all():
-            for group in cycle.groups.all():
-                total += group.total_loans
-        return total
+    def get_stats(self):
+        return Organization.stats_by_organization([self.id])[self.id]
     
     def __repr__(self):
         return f'<Organization {self.name}>' 
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""Cloisonnement des données par organisation.
+
+Les tables « tenant » (cycles, groupes, membres des groupes, transactions)
+portent toutes ``organization_id``. Par défaut elles vivent dans la base
+partagée ; une organisation volumineuse peut recevoir sa propre base,
+déclarée dans ``TENANT_DATABASES`` (« 12=postgresql://.../avec_org12;15=... »).
+``RoutingSession`` envoie alors les requêtes sur ces tables vers la base de
+l'organisation courante, si bien que la charge d'un gros partenaire ne
+ralentit plus les autres. Les utilisateurs et organisations restent dans la
+base partagée : une requête ne doit donc jamais joindre une table tenant à
+``users`` ou ``organizations``.
+
+Les routes passent toutes par ``scoped(Model)`` pour lire des données
+tenant : la requête est filtrée sur l'organisation de l'utilisateur.
+L'administrateur global lit la base partagée, ou la base dédiée d'une
+organisation choisie avec ``?org=<id>`` (voir ``init_app``).
+"""
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from sqlalchemy.sql.util import find_tables
+from flask import abort, g, has_app_context, request, session
+from flask_login import current_user
+from flask_sqlalchemy.session import Session
+
+TENANT_TABLES = ('cycles', 'groups', 'group_members', 'transactions')
+
+# Paramètre de requête par lequel l'administrateur global choisit une base dédiée
+TENANT_ARG = 'org'
+
+
+def tenant_bind_key(organization_id):
+    return f'tenant_{organization_id}'
+
+
+def parse_tenant_databases(value):
+    """« 12=url;15=url » -> {'tenant_12': url, 'tenant_15': url} pour SQLALCHEMY_BINDS"""
+    binds = {}
+    for entry in filter(None, (part.strip() for part in (value or '').split(';'))):
+        organization_id, url = entry.split('=', 1)
+        binds[tenant_bind_key(int(organization_id))] = url.strip()
+    return binds
+
+
+def dedicated_organization_ids(db):
+    """Organisations qui disposent de leur propre base"""
+    return sorted(
+        int(key[len('tenant_'):]) for key in db.engines
+        if isinstance(key, str) and key.startswith('tenant_')
+    )
+
+
+def current_tenant_id():
+    """Organisation dont les données sont lues (None : base partagée)"""
+    if not has_app_context():
+        return None
+    return g.get('tenant_id')
+
+
+@contextmanager
+def use_tenant(organization_id):
+    """Route temporairement les tables tenant vers la base de ``organization_id``"""
+    previous = g.get('tenant_id')
+    g.tenant_id = organization_id
+    try:
+        yield
+    finally:
+        g.tenant_id = previous
+
+
+class RoutingSession(Session):
+    """Session qui choisit la base de l'organisation courante pour les tables tenant"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            key = self._tenant_bind(mapper, clause)
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _tenant_bind(self, mapper, clause):
+        organization_id = current_tenant_id()
+        if organization_id is None:
+            return None
+        key = tenant_bind_key(organization_id)
+        if key not in self._db.engines:
+            return None
+
+        if mapper is not None:
+            tables = [sa.inspect(mapper).persist_selectable]
+        elif isinstance(clause, sa.Table):
+            tables = [clause]
+        elif clause is not None:
+            tables = find_tables(clause, include_crud=True)
+        else:
+            return None
+        if any(getattr(table, 'name', None) in TENANT_TABLES for table in tables):
+            return key
+        return None
+
+
+def scoped(model):
+    """Requête sur ``model`` limitée à l'organisation de l'utilisateur connecté.
+
+    L'administrateur global voit toute la base courante ; un utilisateur
+    sans organisation ne voit rien.
+    """
+    query = model.query
+    if current_user.is_authenticated and current_user.role == 'admin':
+        return query
+    organization_id = current_user.organization_id if current_user.is_authenticated else None
+    if organization_id is None:
+        return query.filter(sa.false())
+    return query.filter(model.organization_id == organization_id)
+
+
+def get_scoped_or_404(model, id):
+    """Équivalent de ``Model.query.get_or_404`` restreint à l'organisation"""
+    instance = scoped(model).filter(model.id == id).first()
+    if instance is None:
+        abort(404)
+    return instance
+
+
+def init_app(app):
+    """Fixe l'organisation courante au début de chaque requête.
+
+    L'administrateur global reste sur la base choisie par son dernier
+    ``?org=<id>`` (conservé en session) ; un ``?org=`` vide ou désignant une
+    organisation sans base dédiée le ramène à la base partagée.
+    """
+    @app.before_request
+    def select_tenant():
+        if not current_user.is_authenticated:
+            g.tenant_id = None
+        elif current_user.role != 'admin':
+            g.tenant_id = current_user.organization_id
+        else:
+            if TENANT_ARG in request.args:
+                organization_id = request.args.get(TENANT_ARG, type=int)
+                dedicated = dedicated_organization_ids(app.extensions['sqlalchemy'])
+                session['tenant_id'] = organization_id if organization_id in dedicated else None
+            g.tenant_id = session.get('tenant_id')
@@ -1,11 +1,17 @@
 from datetime import datetime
 from . import db
+from .group import Group
 
 class Transaction(db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        db.Index('ix_transactions_organization_created', 'organization_id', 'created_at'),
+        db.Index('ix_transactions_organization_status', 'organization_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'))  # recopié du groupe
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     type = db.Column(db.String(20), nullable=False)  # savings, loan, repayment
     amount = db.Column(db.Numeric(10, 2), nullable=False)
@@ -42,11 +48,11 @@ class Transaction(db.Model):
         self.approved_by = approver_user.id
         self.approved_at = datetime.utcnow()
         
-        # Mettre à jour les totaux du groupe
+        # Mettre à jour les totaux du groupe (UPDATE atomique)
         if self.is_savings():
-            self.group.total_savings += self.amount
+            Group.apply_balance_delta(self.group_id, total_savings=self.amount)
         elif self.is_loan():
-            self.group.total_loans += self.amount
+            Group.apply_balance_delta(self.group_id, total_loans=self.amount)
             self.remaining_balance = self.amount
     
     def reject(self):
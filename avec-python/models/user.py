@@ -20,7 +20,7 @@ class User(UserMixin, db.Model):
     
     # Relations
     groups = db.relationship('Group', backref='creator', lazy='dynamic')
-    transactions = db.relationship('Transaction', backref='user', lazy='dynamic')
+    transactions = db.relationship('Transaction', backref='user', lazy='dynamic', foreign_keys='Transaction.user_id')
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
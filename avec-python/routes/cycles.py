@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import db, Cycle, Group
+from models.tenancy import scoped, get_scoped_or_404
 from datetime import datetime
 
 bp = Blueprint('cycles', __name__, url_prefix='/cycles')
@@ -11,7 +12,7 @@ def index():
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', '')
     
-    query = Cycle.query
+    query = scoped(Cycle)
     
     if status_filter:
         query = query.filter_by(status=status_filter)
@@ -45,7 +46,8 @@ def create():
             interest_rate=interest_rate,
             meeting_frequency=meeting_frequency,
             meeting_day=meeting_day,
-            start_date=start_date
+            start_date=start_date,
+            organization_id=current_user.organization_id
         )
         
         db.session.add(cycle)
@@ -59,14 +61,14 @@ def create():
 @bp.route('/<int:id>')
 @login_required
 def show(id):
-    cycle = Cycle.query.get_or_404(id)
+    cycle = get_scoped_or_404(Cycle, id)
     groups = cycle.groups.all()
     return render_template('cycles/show.html', cycle=cycle, groups=groups)
 
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit(id):
-    cycle = Cycle.query.get_or_404(id)
+    cycle = get_scoped_or_404(Cycle, id)
     
     if request.method == 'POST':
         cycle.name = request.form.get('name')
@@ -89,7 +91,7 @@ def edit(id):
 @bp.route('/<int:id>/delete', methods=['POST'])
 @login_required
 def delete(id):
-    cycle = Cycle.query.get_or_404(id)
+    cycle = get_scoped_or_404(Cycle, id)
     db.session.delete(cycle)
     db.session.commit()
     flash('Cycle supprimé avec succès !', 'success')
@@ -98,7 +100,7 @@ def delete(id):
 @bp.route('/<int:id>/next-phase', methods=['POST'])
 @login_required
 def next_phase(id):
-    cycle = Cycle.query.get_or_404(id)
+    cycle = get_scoped_or_404(Cycle, id)
     if cycle.next_phase():
         db.session.commit()
         flash('Phase du cycle avancée avec succès !', 'success')
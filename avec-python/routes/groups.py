@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import db, Group, Cycle, User
+from models.group import group_members
+from models.tenancy import scoped, get_scoped_or_404
 from datetime import datetime
 
 bp = Blueprint('groups', __name__, url_prefix='/groups')
@@ -12,7 +14,7 @@ def index():
     status_filter = request.args.get('status', '')
     cycle_filter = request.args.get('cycle_id', '', type=int)
     
-    query = Group.query
+    query = scoped(Group)
     
     if status_filter:
         query = query.filter_by(status=status_filter)
@@ -23,7 +25,7 @@ def index():
     groups = query.order_by(Group.created_at.desc()).paginate(
         page=page, per_page=10, error_out=False)
     
-    cycles = Cycle.query.all()
+    cycles = scoped(Cycle).all()
     
     return render_template('groups/index.html', 
                          groups=groups, 
@@ -34,12 +36,12 @@ def index():
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
 def create():
-    cycles = Cycle.query.filter_by(status='active').all()
+    cycles = scoped(Cycle).filter_by(status='active').all()
     
     if request.method == 'POST':
         name = request.form.get('name')
         description = request.form.get('description')
-        cycle_id = request.form.get('cycle_id', type=int)
+        cycle = scoped(Cycle).filter_by(id=request.form.get('cycle_id', type=int)).first()
         max_members = request.form.get('max_members', 25, type=int)
         contribution_amount = request.form.get('contribution_amount', 0, type=float)
         meeting_location = request.form.get('meeting_location')
@@ -50,10 +52,15 @@ def create():
         else:
             meeting_time = None
         
+        if not cycle:
+            flash('Cycle introuvable.', 'error')
+            return render_template('groups/create.html', cycles=cycles)
+        
         group = Group(
             name=name,
             description=description,
-            cycle_id=cycle_id,
+            cycle_id=cycle.id,
+            organization_id=cycle.organization_id,
             creator_id=current_user.id,
             max_members=max_members,
             contribution_amount=contribution_amount,
@@ -72,8 +79,8 @@ def create():
 @bp.route('/<int:id>')
 @login_required
 def show(id):
-    group = Group.query.get_or_404(id)
-    members = group.members.all()
+    group = get_scoped_or_404(Group, id)
+    members = group.get_members()
     recent_transactions = group.transactions.order_by(
         db.desc('created_at')).limit(10).all()
     return render_template('groups/show.html', 
@@ -84,13 +91,19 @@ def show(id):
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit(id):
-    group = Group.query.get_or_404(id)
-    cycles = Cycle.query.all()
+    group = get_scoped_or_404(Group, id)
+    cycles = scoped(Cycle).all()
     
     if request.method == 'POST':
+        cycle = scoped(Cycle).filter_by(id=request.form.get('cycle_id', type=int)).first()
+        if not cycle:
+            flash('Cycle introuvable.', 'error')
+            return render_template('groups/edit.html', group=group, cycles=cycles)
+        
         group.name = request.form.get('name')
         group.description = request.form.get('description')
-        group.cycle_id = request.form.get('cycle_id', type=int)
+        group.cycle_id = cycle.id
+        group.organization_id = cycle.organization_id
         group.max_members = request.form.get('max_members', 25, type=int)
         group.contribution_amount = request.form.get('contribution_amount', 0, type=float)
         group.meeting_location = request.form.get('meeting_location')
@@ -108,7 +121,9 @@ def edit(id):
 @bp.route('/<int:id>/delete', methods=['POST'])
 @login_required
 def delete(id):
-    group = Group.query.get_or_404(id)
+    group = get_scoped_or_404(Group, id)
+    # Sans relation vers les membres, les liens du groupe sont supprimés explicitement
+    db.session.execute(group_members.delete().where(group_members.c.group_id == group.id))
     db.session.delete(group)
     db.session.commit()
     flash('Groupe supprimé avec succès !', 'success')
@@ -117,7 +132,7 @@ def delete(id):
 @bp.route('/<int:id>/add-member', methods=['GET', 'POST'])
 @login_required
 def add_member(id):
-    group = Group.query.get_or_404(id)
+    group = get_scoped_or_404(Group, id)
     
     if request.method == 'POST':
         user_id = request.form.get('user_id', type=int)
@@ -132,10 +147,13 @@ def add_member(id):
         return redirect(url_for('groups.show', id=group.id))
     
     # Utilisateurs disponibles (pas encore dans le groupe)
-    group_member_ids = [member.id for member in group.members.all()]
+    group_member_ids = group.member_ids()
     available_users = User.query.filter(
         ~User.id.in_(group_member_ids) if group_member_ids else True
-    ).all()
+    )
+    if group.organization_id:
+        available_users = available_users.filter(User.organization_id == group.organization_id)
+    available_users = available_users.all()
     
     return render_template('groups/add_member.html', 
                          group=group, 
@@ -144,7 +162,7 @@ def add_member(id):
 @bp.route('/<int:id>/remove-member/<int:user_id>', methods=['POST'])
 @login_required
 def remove_member(id, user_id):
-    group = Group.query.get_or_404(id)
+    group = get_scoped_or_404(Group, id)
     user = User.query.get_or_404(user_id)
     
     if group.remove_member(user):
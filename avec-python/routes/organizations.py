@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import db, Organization, User, Cycle, Group, Transaction
+from models.tenancy import use_tenant
 from datetime import datetime
 
 bp = Blueprint('organizations', __name__, url_prefix='/organizations')
@@ -13,7 +14,10 @@ def index():
     else:
         organizations = [current_user.organization] if current_user.organization else []
     
-    return render_template('organizations/index.html', organizations=organizations)
+    organization_stats = Organization.stats_by_organization([organization.id for organization in organizations])
+    return render_template('organizations/index.html',
+                         organizations=organizations,
+                         organization_stats=organization_stats)
 
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -57,31 +61,25 @@ def show(id):
         flash('Accès non autorisé.', 'error')
         return redirect(url_for('organizations.index'))
     
-    # Statistiques de l'organisation
-    total_cycles = organization.cycles.count()
-    total_groups = organization.get_total_groups()
-    total_members = organization.get_total_members()
-    total_savings = organization.get_total_savings()
-    total_loans = organization.get_total_loans()
-    
-    # Cycles récents
-    recent_cycles = organization.cycles.order_by(Cycle.created_at.desc()).limit(5).all()
-    
-    # Groupes récents
-    recent_groups = []
-    for cycle in organization.cycles.all():
-        recent_groups.extend(cycle.groups.order_by(Group.created_at.desc()).limit(3).all())
-    recent_groups = sorted(recent_groups, key=lambda x: x.created_at, reverse=True)[:5]
-    
-    return render_template('organizations/show.html',
-                         organization=organization,
-                         total_cycles=total_cycles,
-                         total_groups=total_groups,
-                         total_members=total_members,
-                         total_savings=total_savings,
-                         total_loans=total_loans,
-                         recent_cycles=recent_cycles,
-                         recent_groups=recent_groups)
+    # Lecture (et rendu, pour les chargements paresseux) dans la base de l'organisation
+    with use_tenant(organization.id):
+        # Statistiques de l'organisation
+        stats = organization.get_stats()
+        
+        # Cycles et groupes récents
+        recent_cycles = organization.cycles.order_by(Cycle.created_at.desc()).limit(5).all()
+        recent_groups = Group.query.filter_by(organization_id=organization.id).order_by(
+            Group.created_at.desc()).limit(5).all()
+        
+        return render_template('organizations/show.html',
+                             organization=organization,
+                             total_cycles=stats['cycles'],
+                             total_groups=stats['groups'],
+                             total_members=stats['members'],
+                             total_savings=stats['savings'],
+                             total_loans=stats['loans'],
+                             recent_cycles=recent_cycles,
+                             recent_groups=recent_groups)
 
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -130,18 +128,33 @@ def reports(id):
         flash('Accès non autorisé.', 'error')
         return redirect(url_for('organizations.index'))
     
-    # Générer les rapports
-    cycles_data = []
-    for cycle in organization.cycles.all():
-        cycle_data = {
-            'cycle': cycle,
-            'groups_count': cycle.groups.count(),
-            'total_members': sum(group.current_members for group in cycle.groups.all()),
-            'total_savings': sum(group.total_savings for group in cycle.groups.all()),
-            'total_loans': sum(group.total_loans for group in cycle.groups.all())
+    with use_tenant(organization.id):
+        # Générer les rapports : une requête groupée par cycle pour les totaux des groupes
+        totals = {
+            row.cycle_id: row for row in db.session.execute(
+                db.select(
+                    Group.cycle_id,
+                    db.func.count(Group.id).label('groups_count'),
+                    db.func.coalesce(db.func.sum(Group.current_members), 0).label('total_members'),
+                    db.func.coalesce(db.func.sum(Group.total_savings), 0).label('total_savings'),
+                    db.func.coalesce(db.func.sum(Group.total_loans), 0).label('total_loans')
+                )
+                .where(Group.organization_id == organization.id)
+                .group_by(Group.cycle_id)
+            )
         }
-        cycles_data.append(cycle_data)
-    
-    return render_template('organizations/reports.html', 
-                         organization=organization,
-                         cycles_data=cycles_data) 
\ No newline at end of file
+        cycles_data = []
+        for cycle in organization.cycles.all():
+            row = totals.get(cycle.id)
+            cycle_data = {
+                'cycle': cycle,
+                'groups_count': row.groups_count if row else 0,
+                'total_members': row.total_members if row else 0,
+                'total_savings': row.total_savings if row else 0,
+                'total_loans': row.total_loans if row else 0
+            }
+            cycles_data.append(cycle_data)
+        
+        return render_template('organizations/reports.html', 
+                             organization=organization,
+                             cycles_data=cycles_data) 
\ No newline at end of file
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import db, Transaction, Group, User
+from models.tenancy import scoped, get_scoped_or_404
 from datetime import datetime
 
 bp = Blueprint('transactions', __name__, url_prefix='/transactions')
@@ -13,7 +14,7 @@ def index():
     type_filter = request.args.get('type', '')
     group_filter = request.args.get('group_id', '', type=int)
     
-    query = Transaction.query
+    query = scoped(Transaction)
     
     if status_filter:
         query = query.filter_by(status=status_filter)
@@ -27,7 +28,7 @@ def index():
     transactions = query.order_by(Transaction.created_at.desc()).paginate(
         page=page, per_page=10, error_out=False)
     
-    groups = Group.query.all()
+    groups = scoped(Group).all()
     
     return render_template('transactions/index.html', 
                          transactions=transactions,
@@ -39,10 +40,10 @@ def index():
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
 def create():
-    groups = Group.query.filter_by(status='active').all()
+    groups = scoped(Group).filter_by(status='active').all()
     
     if request.method == 'POST':
-        group_id = request.form.get('group_id', type=int)
+        group = scoped(Group).filter_by(id=request.form.get('group_id', type=int)).first()
         type_transaction = request.form.get('type')
         amount = request.form.get('amount', 0, type=float)
         description = request.form.get('description')
@@ -55,8 +56,13 @@ def create():
         else:
             due_date = None
         
+        if not group:
+            flash('Groupe introuvable.', 'error')
+            return render_template('transactions/create.html', groups=groups)
+        
         transaction = Transaction(
-            group_id=group_id,
+            group_id=group.id,
+            organization_id=group.organization_id,
             user_id=current_user.id,
             type=type_transaction,
             amount=amount,
@@ -77,13 +83,13 @@ def create():
 @bp.route('/<int:id>')
 @login_required
 def show(id):
-    transaction = Transaction.query.get_or_404(id)
+    transaction = get_scoped_or_404(Transaction, id)
     return render_template('transactions/show.html', transaction=transaction)
 
 @bp.route('/<int:id>/approve', methods=['POST'])
 @login_required
 def approve(id):
-    transaction = Transaction.query.get_or_404(id)
+    transaction = get_scoped_or_404(Transaction, id)
     
     if transaction.status == 'pending':
         transaction.approve(current_user)
@@ -97,7 +103,7 @@ def approve(id):
 @bp.route('/<int:id>/reject', methods=['POST'])
 @login_required
 def reject(id):
-    transaction = Transaction.query.get_or_404(id)
+    transaction = get_scoped_or_404(Transaction, id)
     
     if transaction.status == 'pending':
         transaction.reject()
@@ -111,7 +117,7 @@ def reject(id):
 @bp.route('/<int:id>/complete', methods=['POST'])
 @login_required
 def complete(id):
-    transaction = Transaction.query.get_or_404(id)
+    transaction = get_scoped_or_404(Transaction, id)
     
     if transaction.status == 'approved':
         transaction.complete()
@@ -126,21 +132,20 @@ def complete(id):
 @login_required
 def stats():
     # Statistiques des transactions
-    total_transactions = Transaction.query.count()
-    pending_transactions = Transaction.query.filter_by(status='pending').count()
-    approved_transactions = Transaction.query.filter_by(status='approved').count()
-    completed_transactions = Transaction.query.filter_by(status='completed').count()
+    transactions = scoped(Transaction)
+    total_transactions = transactions.count()
+    pending_transactions = transactions.filter_by(status='pending').count()
+    approved_transactions = transactions.filter_by(status='approved').count()
+    completed_transactions = transactions.filter_by(status='completed').count()
     
     # Montants par type
-    total_savings = db.session.query(db.func.sum(Transaction.amount)).filter_by(
-        type='savings', status='approved').scalar() or 0
-    total_loans = db.session.query(db.func.sum(Transaction.amount)).filter_by(
-        type='loan', status='approved').scalar() or 0
-    total_repayments = db.session.query(db.func.sum(Transaction.amount)).filter_by(
-        type='repayment', status='completed').scalar() or 0
+    amounts = transactions.with_entities(db.func.sum(Transaction.amount))
+    total_savings = amounts.filter(Transaction.type == 'savings', Transaction.status == 'approved').scalar() or 0
+    total_loans = amounts.filter(Transaction.type == 'loan', Transaction.status == 'approved').scalar() or 0
+    total_repayments = amounts.filter(Transaction.type == 'repayment', Transaction.status == 'completed').scalar() or 0
     
     # Transactions récentes
-    recent_transactions = Transaction.query.order_by(
+    recent_transactions = transactions.order_by(
         Transaction.created_at.desc()).limit(10).all()
     
     return render_template('transactions/stats.html',
@@ -0,0 +1,40 @@
+"""Commandes ``flask`` de l'application.
+
+Les modules de commandes (et ce qu'ils importent : générateur de données,
+tâches, migrations) ne sont chargés que lorsque la CLI en a besoin ; un
+worker web n'en importe aucun.
+"""
+from importlib import import_module
+
+from flask.cli import AppGroup
+
+COMMAND_MODULES = (
+    'schema', 'seed', 'slow_queries', 'search', 'cycles', 'jobs', 'formation', 'evaluations', 'assets',
+    'sms', 'archive', 'snapshots', 'ledger', 'loans', 'interest',
+)
+
+
+class LazyCommands(AppGroup):
+    """Groupe de commandes de l'application, importées au premier accès"""
+
+    def __init__(self, name=None, modules=COMMAND_MODULES):
+        super().__init__(name)
+        self._modules = modules
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        # Tous les modules sont importés ensemble : ``flask schema upgrade``
+        # a besoin des migrations de données déclarées dans chacun d'eux
+        for module in self._modules:
+            self.add_command(import_module(f'commands.{module}').cli)
+
+    def list_commands(self, ctx):
+        self._load()
+        return super().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        self._load()
+        return super().get_command(ctx, name)
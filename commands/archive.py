@@ -0,0 +1,42 @@
+"""Archivage des cycles clôturés.
+
+Utilisation (cron, par exemple chaque nuit) :
+    flask archive run                   # cycles partagés depuis plus de 30 jours
+    flask archive run --min-age-days 0  # tous les cycles partagés
+    flask archive run --cycle 12        # un seul cycle
+"""
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+
+from jobs.archive import archive_completed_cycles, archive_cycle
+from models import db, Cycle
+
+cli = AppGroup('archive', help='Archivage des cycles clôturés.')
+
+
+def _echo_moved(name, moved):
+    details = ', '.join(f'{count} {table}' for table, count in moved.items() if count)
+    click.echo(f'  {name:30} {details or "aucune ligne"}')
+
+
+@cli.command('run')
+@click.option('--min-age-days', default=30, show_default=True, help='Jours écoulés depuis le partage.')
+@click.option('--batch-size', default=1000, show_default=True, help='Lignes déplacées par transaction.')
+@click.option('--cycle', 'cycle_id', type=int, help='Archive ce cycle clôturé, quel que soit son âge.')
+def run(min_age_days, batch_size, cycle_id):
+    """Déplace les lignes des cycles clôturés dans les tables d'archive."""
+    started = time.perf_counter()
+    if cycle_id is not None:
+        cycle = db.session.get(Cycle, cycle_id)
+        if cycle is None or not cycle.is_cycle_completed:
+            raise click.ClickException(f'Cycle {cycle_id} introuvable ou non clôturé')
+        archived = [(cycle, archive_cycle(cycle.id, batch_size=batch_size))]
+    else:
+        archived = archive_completed_cycles(
+            min_age=timedelta(days=min_age_days), batch_size=batch_size, now=datetime.utcnow())
+    for cycle, moved in archived:
+        _echo_moved(cycle.name, moved)
+    click.echo(f'✅ {len(archived)} cycle(s) archivé(s) en {time.perf_counter() - started:.1f} s')
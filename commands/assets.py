@@ -0,0 +1,40 @@
+"""Ressources statiques.
+
+Utilisation (au déploiement, avant de démarrer les workers) :
+    flask assets vendor   # copie locale de Bootstrap, Bootstrap Icons et Chart.js
+    flask assets build    # fichiers avec empreinte et variantes compressées dans static/dist
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from assets import pipeline
+
+cli = AppGroup('assets', help='Ressources statiques (copies locales, empreintes, compression).')
+
+
+@cli.command('vendor')
+@click.option('--force', is_flag=True, help='Télécharge à nouveau les fichiers déjà présents.')
+def vendor(force):
+    """Télécharge les ressources tierces dans static/vendor."""
+    try:
+        copied = pipeline.vendor(current_app.static_folder, force=force)
+    except OSError as exc:
+        raise click.ClickException(f'Téléchargement impossible : {exc}')
+    for path in copied:
+        click.echo(f'  + {path}')
+    click.echo(f'✅ {len(copied)} ressource(s) copiée(s)')
+
+
+@cli.command('build')
+def build():
+    """Construit static/dist : empreintes, gzip et brotli (si installé)."""
+    manifest = pipeline.build(current_app.static_folder)
+    for path, name in sorted(manifest.items()):
+        click.echo(f'  {path:40} {name}')
+    if pipeline.brotli is None:
+        click.echo('  (module brotli absent : variantes gzip seulement)')
+    missing = [path for path in pipeline.VENDOR if path not in manifest]
+    if missing:
+        click.echo(f'  (servies par le CDN, lancer flask assets vendor : {", ".join(missing)})')
+    click.echo(f'✅ {len(manifest)} ressource(s) construite(s)')
@@ -0,0 +1,88 @@
+"""Planification des phases de cycle.
+
+Utilisation (cron, par exemple toutes les heures) :
+    flask cycles advance
+ou en tâche de fond :
+    flask cycles advance --loop --interval 3600
+
+Contrôle des compteurs dénormalisés (épargne, groupes, membres) :
+    flask cycles reconcile
+"""
+import time
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+
+from commands.schema import data_migration
+from jobs.cycles import PHASE_LABELS, advance_due_cycles
+from models import db, Cycle
+
+cli = AppGroup('cycles', help='Planification des phases de cycle.')
+
+
+@cli.command('advance')
+@click.option('--batch-size', default=1000, show_default=True, help='Cycles traités par transaction.')
+@click.option('--loop', is_flag=True, help='Tourne en continu au lieu d\'un seul passage.')
+@click.option('--interval', default=3600, show_default=True, help='Secondes entre deux passages (--loop).')
+def advance(batch_size, loop, interval):
+    """Fait avancer les cycles échus et met en file notifications et aperçus de partage."""
+    while True:
+        started = time.perf_counter()
+        summary = advance_due_cycles(batch_size=batch_size)
+        for phase, count in summary.items():
+            click.echo(f'  {PHASE_LABELS.get(phase, phase):12} {count}')
+        click.echo(f'✅ {sum(summary.values())} cycle(s) avancé(s) en {time.perf_counter() - started:.1f} s')
+        if not loop:
+            break
+        time.sleep(interval)
+
+
+@cli.command('reconcile')
+@click.option('--batch-size', default=1000, show_default=True, help='Cycles recalculés par transaction.')
+def reconcile(batch_size):
+    """Recalcule current_amount, group_count et member_count à partir des groupes."""
+    fixed = reconcile_counters(batch_size)
+    click.echo(f'✅ {fixed} cycle(s) corrigé(s)')
+
+
+def reconcile_counters(batch_size=1000):
+    last_id, fixed = 0, 0
+    while True:
+        cycle_ids = [cycle_id for (cycle_id,) in db.session.execute(
+            db.select(Cycle.id).where(Cycle.id > last_id).order_by(Cycle.id).limit(batch_size)
+        )]
+        if not cycle_ids:
+            return fixed
+        fixed += Cycle.refresh_counters(cycle_ids)
+        db.session.commit()
+        last_id = cycle_ids[-1]
+
+
+@data_migration
+def cycle_counters():
+    """Initialise les compteurs dénormalisés des cycles"""
+    reconcile_counters()
+
+
+@data_migration
+def schedule_existing_cycles():
+    """Calcule next_transition_at des cycles actifs qui n'en ont pas"""
+    now = datetime.utcnow()
+    cycles = Cycle.__table__
+    rows = db.session.execute(
+        db.select(Cycle.id, Cycle.start_date, Cycle.end_date, Cycle.phase)
+        .where(Cycle.status == 'active', Cycle.next_transition_at.is_(None))
+    ).all()
+    # Les cycles sans date de fin restent sans transition une fois en supervision
+    updates = [
+        {'b_id': row.id, 'b_next_transition_at': Cycle.schedule(row.start_date, row.end_date, row.phase, now)[1]}
+        for row in rows
+    ]
+    if updates:
+        db.session.execute(
+            cycles.update().where(cycles.c.id == db.bindparam('b_id'))
+            .values(next_transition_at=db.bindparam('b_next_transition_at')),
+            updates
+        )
+    db.session.commit()
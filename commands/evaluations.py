@@ -0,0 +1,52 @@
+"""Registre des évaluations de communautés.
+
+Utilisation :
+    flask evaluations reconcile   # recalcule les agrégats par région
+
+Les agrégats (``region_evaluation_summaries``) sont tenus à jour à chaque
+évaluation enregistrée ; la commande les reconstruit après un import ou une
+correction faite directement en base.
+"""
+import click
+from flask.cli import AppGroup
+
+from commands.schema import data_migration
+from models import db, CommunityEvaluation, RegionEvaluationSummary
+
+cli = AppGroup('evaluations', help='Registre des évaluations de communautés.')
+
+
+@cli.command('reconcile')
+def reconcile():
+    """Recalcule les agrégats par région à partir des évaluations."""
+    regions = RegionEvaluationSummary.refresh()
+    db.session.commit()
+    click.echo(f'✅ {regions} région(s) recalculée(s)')
+
+
+@data_migration
+def evaluation_geo_cells():
+    """Calcule la maille géographique des évaluations localisées qui n'en ont pas"""
+    evaluations = CommunityEvaluation.__table__
+    rows = db.session.execute(
+        db.select(CommunityEvaluation.id, CommunityEvaluation.latitude, CommunityEvaluation.longitude).where(
+            CommunityEvaluation.geo_cell.is_(None),
+            CommunityEvaluation.latitude.isnot(None),
+            CommunityEvaluation.longitude.isnot(None)
+        )
+    ).all()
+    if rows:
+        db.session.execute(
+            evaluations.update().where(evaluations.c.id == db.bindparam('b_id'))
+            .values(geo_cell=db.bindparam('b_geo_cell')),
+            [{'b_id': row.id, 'b_geo_cell': CommunityEvaluation.cell_for(row.latitude, row.longitude)} for row in rows]
+        )
+    db.session.commit()
+
+
+@data_migration
+def region_evaluation_summaries():
+    """Initialise les agrégats des évaluations par région"""
+    if not RegionEvaluationSummary.query.first():
+        RegionEvaluationSummary.refresh()
+        db.session.commit()
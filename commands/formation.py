@@ -0,0 +1,123 @@
+"""Catalogue partagé des modules de formation.
+
+Utilisation :
+    flask formation sync     # publie les modules standards (nouvelle version si le contenu change)
+    flask formation enroll   # inscrit les groupes aux modules actifs qui leur manquent
+
+Le contenu d'un module est stocké une seule fois dans ``formation_catalog`` ;
+chaque groupe n'a qu'une ligne d'avancement par module
+(``group_formation_progress``). Une nouvelle version remplace l'ancienne pour
+les groupes inscrits ensuite, les groupes déjà inscrits gardent la leur.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+
+from commands.schema import data_migration
+from models import db, FormationModule, GroupFormationProgress
+
+cli = AppGroup('formation', help='Catalogue des modules de formation.')
+
+# (code, nom, description, contenu) des 7 modules de la méthodologie AVEC
+STANDARD_MODULES = [
+    ('groupe', 'Formation du groupe',
+     'Critères d\'adhésion, rôle des membres et principes de fonctionnement d\'une AVEC.',
+     'Un groupe réunit 15 à 30 membres qui se connaissent et se font confiance.\n'
+     'Chaque membre épargne en achetant des parts et peut emprunter sur l\'épargne commune.\n'
+     'Les décisions sont prises ensemble, en réunion, devant tous les membres.'),
+    ('comite', 'Élection du comité',
+     'Rôles du président, du secrétaire, du trésorier et des compteurs ; déroulement du vote.',
+     'Le comité compte un président, un secrétaire, un trésorier et deux compteurs.\n'
+     'Il est élu à bulletin secret pour un cycle ; aucun membre n\'est candidat d\'office.\n'
+     'Le trésorier garde la caisse, les trois clés sont confiées à trois autres membres.'),
+    ('reglement', 'Règlement intérieur',
+     'Fixation de la valeur de la part, du taux d\'intérêt, des amendes et des règles de la caisse de solidarité.',
+     'Le groupe fixe la valeur de la part, de 1 à 5 parts par réunion et par membre.\n'
+     'Il fixe le taux d\'intérêt mensuel des prêts et les amendes (retard, absence).\n'
+     'Il fixe la contribution à la caisse de solidarité et les cas d\'aide.'),
+    ('premiere_epargne', 'Première réunion d\'épargne',
+     'Achat de parts, tenue des carnets individuels et procédure d\'ouverture de la caisse.',
+     'La caisse est ouverte devant tous, les soldes de la réunion précédente sont annoncés.\n'
+     'Chaque membre achète ses parts, le secrétaire les tamponne dans son carnet.\n'
+     'Les compteurs annoncent le total, la caisse est refermée devant tous.'),
+    ('premier_pret', 'Premier octroi de prêts',
+     'Demandes de prêt, plafond de trois fois l\'épargne, calcul des intérêts et enregistrement.',
+     'Un membre peut emprunter jusqu\'à trois fois son épargne, pour trois mois au plus.\n'
+     'Les demandes sont présentées en réunion et accordées selon l\'argent disponible.\n'
+     'Le montant, l\'échéance et les intérêts sont inscrits dans le carnet de l\'emprunteur.'),
+    ('remboursement', 'Premier remboursement',
+     'Remboursement des prêts, suivi des retards et contrôle des soldes en fin de réunion.',
+     'Les intérêts sont payés chaque mois, le capital au plus tard à l\'échéance.\n'
+     'Un retard est signalé au comité et traité selon le règlement intérieur.\n'
+     'En fin de réunion, le solde de la caisse doit correspondre aux carnets.'),
+    ('partage', 'Partage et fin de cycle',
+     'Calcul de la valeur finale des parts, partage des bénéfices et préparation du cycle suivant.',
+     'Tous les prêts sont remboursés avant le partage.\n'
+     'La valeur finale d\'une part est le total de la caisse divisé par le nombre de parts.\n'
+     'Chaque membre reçoit la valeur de ses parts ; le groupe décide du cycle suivant.'),
+]
+
+
+@cli.command('sync')
+def sync():
+    """Publie les modules standards dans le catalogue et inscrit les groupes."""
+    for order, (code, name, description, content) in enumerate(STANDARD_MODULES, start=1):
+        module = FormationModule.publish(code, name, description, content, order)
+        if module.id is None:
+            click.echo(f'  + {code} v{module.version}')
+    db.session.flush()
+    enrolled = GroupFormationProgress.enroll_groups()
+    db.session.commit()
+    click.echo(f'✅ Catalogue à jour, {enrolled} inscription(s) ajoutée(s)')
+
+
+@cli.command('enroll')
+def enroll():
+    """Inscrit tous les groupes aux modules actifs du catalogue."""
+    enrolled = GroupFormationProgress.enroll_groups()
+    db.session.commit()
+    click.echo(f'✅ {enrolled} inscription(s) ajoutée(s)')
+
+
+@data_migration
+def formation_modules_to_catalog():
+    """Regroupe les anciens modules par groupe (formation_modules) dans le catalogue.
+
+    Les copies identiques (même nom, description et contenu) ne font plus qu'un
+    module ; un texte modifié par un groupe devient une autre version du même
+    code, suivie par ce groupe. L'ancienne table est renommée
+    ``formation_modules_legacy``, pas supprimée.
+    """
+    if not inspect(db.engine).has_table('formation_modules'):
+        return
+    with db.engine.begin() as conn:
+        legacy = db.Table('formation_modules', db.MetaData(), autoload_with=conn)
+        rows = conn.execute(db.select(legacy).order_by(legacy.c.id)).mappings().all()
+
+        codes, catalog, progress = {}, {}, {}
+        for row in rows:
+            key = (row['name'], row['description'], row['content'])
+            if key not in catalog:
+                code = codes.setdefault(row['name'], {'code': f'ancien_{len(codes) + 1}', 'version': 0})
+                code['version'] += 1
+                catalog[key] = conn.execute(FormationModule.__table__.insert().values(
+                    code=code['code'], version=code['version'], name=row['name'],
+                    description=row['description'], content=row['content'],
+                    order=row['order'] or 0, is_active=False
+                )).inserted_primary_key[0]
+            # Deux copies du même texte dans un groupe : l'achèvement l'emporte
+            previous = progress.get((row['group_id'], catalog[key]))
+            if previous and previous['is_completed']:
+                continue
+            progress[(row['group_id'], catalog[key])] = {
+                'group_id': row['group_id'],
+                'module_id': catalog[key],
+                'is_completed': bool(row['is_completed']),
+                'completed_at': row['completed_at'],
+                'completed_by': row['completed_by'],
+            }
+        if progress:
+            conn.execute(GroupFormationProgress.__table__.insert(), list(progress.values()))
+        conn.exec_driver_sql('ALTER TABLE formation_modules RENAME TO formation_modules_legacy')
+    click.echo(f'  ~ {len(rows)} module(s) de groupe migré(s) vers {len(catalog)} version(s) du catalogue '
+               '(ancienne table conservée : formation_modules_legacy)')
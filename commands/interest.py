@@ -0,0 +1,30 @@
+"""Intérêts courus sur les prêts en cours.
+
+Utilisation (cron, par exemple le 1er de chaque mois) :
+    flask interest accrue                   # mois courant
+    flask interest accrue --period 2025-03  # uniquement pendant mars 2025
+
+Un mois passé est refusé : le restant dû de l'époque n'est plus connu.
+"""
+import time
+
+import click
+from flask.cli import AppGroup
+
+from jobs.interest import accrue_interest
+
+cli = AppGroup('interest', help='Intérêts courus sur les prêts.')
+
+
+@cli.command('accrue')
+@click.option('--period', default=None, help='Période AAAA-MM, le mois courant (par défaut) uniquement.')
+@click.option('--batch-size', default=500, show_default=True, help='Groupes traités par transaction.')
+def accrue(period, batch_size):
+    """Écrit les intérêts de la période sur chaque prêt en cours, une seule fois."""
+    started = time.perf_counter()
+    try:
+        summary = accrue_interest(period=period, batch_size=batch_size)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='--period')
+    click.echo(f'✅ {summary["amount"]} FCFA d\'intérêts sur {summary["loans"]} prêt(s) '
+               f'de {summary["groups"]} groupe(s) en {time.perf_counter() - started:.1f} s')
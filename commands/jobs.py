@@ -0,0 +1,39 @@
+"""Exécution des travaux différés (table jobs).
+
+Utilisation :
+    flask jobs work            # vide la file puis s'arrête
+    flask jobs work --loop     # worker permanent
+"""
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from jobs import queue
+# Enregistre les gestionnaires de travaux
+from jobs import cycles  # noqa: F401
+
+cli = AppGroup('jobs', help='Travaux différés.')
+
+
+@cli.command('work')
+@click.option('--batch-size', default=500, show_default=True, help='Travaux traités par lot et par type.')
+@click.option('--loop', is_flag=True, help='Attend les nouveaux travaux au lieu de s\'arrêter.')
+@click.option('--interval', default=10, show_default=True, help='Secondes d\'attente quand la file est vide (--loop).')
+def work(batch_size, loop, interval):
+    """Exécute les travaux échus, par lots regroupés par type."""
+    done = failed = 0
+    # Contexte de requête factice : les gestionnaires construisent des liens avec url_for
+    with current_app.test_request_context():
+        while True:
+            results = queue.run_pending(batch_size=batch_size)
+            for kind, (succeeded, errors) in results.items():
+                click.echo(f'  {kind:28} {succeeded} ok, {errors} en échec')
+                done += succeeded
+                failed += errors
+            if not results:
+                if not loop:
+                    break
+                time.sleep(interval)
+    click.echo(f'✅ {done} travail(aux) exécuté(s), {failed} en échec')
@@ -0,0 +1,50 @@
+"""Rapprochement des soldes des groupes et des compteurs des cycles avec le grand livre.
+
+Utilisation (cron, par exemple chaque nuit) :
+    flask ledger reconcile                          # rapport des écarts
+    flask ledger reconcile --repair --workers 4     # correction, 4 processus
+    flask ledger reconcile --partition organization # une partition par animateur
+"""
+import time
+
+import click
+from flask.cli import AppGroup
+
+from jobs.ledger import PARTITIONS, reconcile as reconcile_ledger
+
+cli = AppGroup('ledger', help='Rapprochement des soldes avec le grand livre.')
+
+
+@cli.command('reconcile')
+@click.option('--repair', is_flag=True, help='Corrige les écarts trouvés.')
+@click.option('--workers', default=1, show_default=True, help='Processus en parallèle.')
+@click.option('--partition', type=click.Choice(PARTITIONS), default='cycle', show_default=True,
+              help='Découpage du travail entre les processus.')
+@click.option('--cycles-per-task', default=50, show_default=True, help='Cycles par partition (--partition cycle).')
+@click.option('--limit', default=20, show_default=True, help='Écarts détaillés affichés.')
+def reconcile(repair, workers, partition, cycles_per_task, limit):
+    """Recalcule soldes et effectifs à partir des transactions et des inscriptions."""
+    started = time.perf_counter()
+    totals, drifts = reconcile_ledger(
+        repair=repair, workers=workers, partition=partition, cycles_per_task=cycles_per_task)
+
+    by_column = {}
+    for _, _, column, stored, expected in drifts:
+        count, amount = by_column.get(column, (0, 0))
+        by_column[column] = (count + 1, amount + (expected - (stored or 0)))
+    for column, (count, amount) in sorted(by_column.items()):
+        click.echo(f'  {column:20} {count} groupe(s), écart cumulé {amount:+}')
+    largest = sorted(drifts, key=lambda drift: abs(drift[4] - (drift[3] or 0)), reverse=True)
+    for group_id, cycle_id, column, stored, expected in largest[:limit]:
+        click.echo(f'    groupe {group_id} (cycle {cycle_id}) {column}: {stored} -> {expected}')
+
+    click.echo(
+        f'{totals["groups"]} groupe(s) de {totals["cycles"]} cycle(s) contrôlé(s) '
+        f'en {totals["partitions"]} partition(s) : {totals["drifted_groups"]} groupe(s) '
+        f'et {totals["drifted_cycles"]} cycle(s) en écart avec leurs groupes')
+    if repair:
+        click.echo(f'✅ {totals["repaired_groups"]} groupe(s) et {totals["repaired_cycles"]} cycle(s) corrigé(s) '
+                   f'en {time.perf_counter() - started:.1f} s')
+    else:
+        click.echo(f'✅ Contrôle terminé en {time.perf_counter() - started:.1f} s'
+                   + (' (relancer avec --repair pour corriger)' if drifts or totals['drifted_cycles'] else ''))
@@ -0,0 +1,56 @@
+"""Exposition des membres (épargne, prêts en cours, garanties) utilisée pour l'éligibilité aux prêts.
+
+Utilisation :
+    flask loans exposure            # recalcule l'exposition de tous les membres
+    flask loans exposure --group 12 # un seul groupe
+"""
+import click
+from flask.cli import AppGroup
+
+from commands.schema import data_migration
+from models import db, Cycle, Group, Transaction, user_groups, EXPOSURE_COLUMNS, EXPOSURE_EFFECTS, APPLIED_STATUSES
+
+cli = AppGroup('loans', help='Éligibilité aux prêts.')
+
+
+def refresh_exposure(group_ids, batch_size=200):
+    """Recalcule l'exposition des membres par lots de groupes ; un commit par lot"""
+    refreshed = 0
+    for start in range(0, len(group_ids), batch_size):
+        refreshed += Group.refresh_member_exposure(group_ids[start:start + batch_size])
+        db.session.commit()
+    return refreshed
+
+
+@cli.command('exposure')
+@click.option('--group', 'group_id', type=int, help='Limite le calcul à ce groupe.')
+@click.option('--batch-size', default=200, show_default=True, help='Groupes recalculés par transaction.')
+def exposure(group_id, batch_size):
+    """Recalcule l'exposition des membres à partir des transactions appliquées."""
+    query = db.select(Group.id).order_by(Group.id)
+    if group_id is not None:
+        query = query.where(Group.id == group_id)
+    group_ids = db.session.execute(query).scalars().all()
+    members = refresh_exposure(group_ids, batch_size)
+    click.echo(f'✅ Exposition recalculée : {members} membre(s) de {len(group_ids)} groupe(s)')
+
+
+@data_migration
+def member_exposure():
+    """Calcule l'exposition des membres des groupes en cours qui n'en ont pas encore"""
+    exposed = db.or_(*(user_groups.c[column] != 0 for column in EXPOSURE_COLUMNS))
+    group_ids = db.session.execute(
+        db.select(Group.id)
+        .join(Cycle, Cycle.id == Group.cycle_id)
+        .where(
+            Cycle.archived_at.is_(None),
+            db.exists().where(
+                Transaction.group_id == Group.id,
+                Transaction.type.in_(EXPOSURE_EFFECTS),
+                Transaction.status.in_(APPLIED_STATUSES)
+            ),
+            ~db.exists().where(user_groups.c.group_id == Group.id, exposed)
+        )
+        .order_by(Group.id)
+    ).scalars().all()
+    refresh_exposure(group_ids)
@@ -0,0 +1,124 @@
+"""Mise à niveau du schéma sans outil de migration.
+
+Utilisation :
+    flask schema upgrade
+
+Crée les tables manquantes, ajoute les colonnes manquantes (avec leur valeur
+par défaut côté serveur) et les index déclarés sur les modèles. Les étapes
+de migration de données enregistrées avec ``data_migration`` sont ensuite
+exécutées ; chacune doit être idempotente.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateColumn
+
+from models import db
+from models.money import Money
+
+cli = AppGroup('schema', help='Mise à niveau du schéma de la base.')
+
+_data_migrations = []
+
+
+def data_migration(func):
+    """Enregistre une étape de migration de données exécutée après les DDL."""
+    _data_migrations.append(func)
+    return func
+
+
+def _add_missing_columns(conn, table, existing_columns):
+    added = []
+    for column in table.columns:
+        if column.name in existing_columns:
+            continue
+        if not column.nullable and column.server_default is None:
+            raise click.ClickException(
+                f'{table.name}.{column.name} est NOT NULL sans server_default : '
+                'impossible de l\'ajouter à une table existante')
+        ddl = CreateColumn(column).compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+        added.append(column.name)
+    return added
+
+
+def _existing_index_names(conn, inspector, table_name):
+    # L'inspecteur ignore les index sur expression (lower(...)) : on lit le catalogue
+    if conn.dialect.name == 'sqlite':
+        return {name for (name,) in conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table_name,))}
+    if conn.dialect.name == 'postgresql':
+        return {name for (name,) in conn.exec_driver_sql(
+            'SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s',
+            (table_name,))}
+    return {index['name'] for index in inspector.get_indexes(table_name)}
+
+
+@data_migration
+def money_columns_to_integer():
+    """Convertit les montants (anciennes colonnes NUMERIC) en entiers FCFA"""
+    dialect = db.engine.dialect.name
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            existing = {column['name']: column['type'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if not isinstance(column.type, Money) or column.name not in existing:
+                    continue
+                if dialect == 'postgresql':
+                    if existing[column.name].python_type is int:
+                        continue
+                    conn.exec_driver_sql(
+                        f'ALTER TABLE {table.name} ALTER COLUMN {column.name} '
+                        f'TYPE BIGINT USING round({column.name})::bigint')
+                    click.echo(f'  ~ {table.name}.{column.name} en BIGINT')
+                elif dialect == 'sqlite':
+                    # SQLite ne modifie pas le type déclaré : l'affinité NUMERIC
+                    # conserve les entiers tels quels, seules les valeurs
+                    # flottantes restantes sont arrondies au franc.
+                    result = conn.exec_driver_sql(
+                        f'UPDATE {table.name} SET {column.name} = CAST(ROUND({column.name}) AS INTEGER) '
+                        f"WHERE typeof({column.name}) = 'real'")
+                    if result.rowcount:
+                        click.echo(f'  ~ {table.name}.{column.name} : {result.rowcount} valeur(s) arrondie(s)')
+
+
+@data_migration
+def widen_transaction_type():
+    """Élargit transactions.type (VARCHAR(30)) pour 'solidarity_disbursement'"""
+    # SQLite n'impose pas la longueur des VARCHAR : rien à faire
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        length = conn.exec_driver_sql(
+            "SELECT character_maximum_length FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'transactions' AND column_name = 'type'"
+        ).scalar()
+        if length is not None and length < 30:
+            conn.exec_driver_sql('ALTER TABLE transactions ALTER COLUMN type TYPE VARCHAR(30)')
+            click.echo('  ~ transactions.type en VARCHAR(30)')
+
+
+@cli.command('upgrade')
+def upgrade():
+    """Aligne le schéma de la base sur les modèles."""
+    db.create_all()
+
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in db.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for name in _add_missing_columns(conn, table, existing_columns):
+                click.echo(f'  + colonne {table.name}.{name}')
+
+            existing_indexes = _existing_index_names(conn, inspector, table.name)
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(conn)
+                    click.echo(f'  + index {index.name}')
+
+    for migration in _data_migrations:
+        click.echo(f'  > {migration.__doc__ or migration.__name__}')
+        migration()
+
+    click.echo('✅ Schéma à jour')
@@ -0,0 +1,32 @@
+"""Maintenance de l'index de recherche plein texte.
+
+Utilisation :
+    flask search rebuild
+"""
+import time
+
+import click
+from flask.cli import AppGroup
+
+from commands.schema import data_migration
+from search import index as search_index
+
+cli = AppGroup('search', help="Index de recherche plein texte.")
+
+
+@cli.command('rebuild')
+@click.option('--batch-size', default=1000, show_default=True, help='Lignes insérées par lot.')
+def rebuild(batch_size):
+    """Recrée l'index à partir des groupes, cycles, membres et évaluations."""
+    started = time.perf_counter()
+    counts = search_index.rebuild(batch_size=batch_size)
+    for kind, count in counts.items():
+        click.echo(f'  {kind:8} {count}')
+    click.echo(f'✅ Index reconstruit en {time.perf_counter() - started:.1f} s')
+
+
+@data_migration
+def search_index_entries():
+    """Reconstruit l'index de recherche s'il lui manque des entrées"""
+    if search_index.enabled() and search_index.missing_entries():
+        search_index.rebuild()
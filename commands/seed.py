@@ -0,0 +1,412 @@
+"""Générateur de données synthétiques pour les tests de charge.
+
+Utilisation :
+    flask seed generate --organizations 10 --years 3 --groups 20 --seed 42
+
+Les lignes sont insérées par lots avec des INSERT « core » (executemany)
+plutôt qu'avec des boucles ``db.session.add()`` / ``commit()``. Les clés
+primaires sont attribuées côté client pour pouvoir relier réunions,
+membres et transactions sans relire la base.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, select, text
+from werkzeug.security import generate_password_hash
+
+from models import db, User, Cycle, Group, Transaction, Meeting, GroupFormationProgress, user_groups
+from search import index as search_index
+
+cli = AppGroup('seed', help='Génération de données synthétiques.')
+
+VILLAGES = [
+    'Bouaké', 'Korhogo', 'Daloa', 'Man', 'Gagnoa', 'Séguéla', 'Odienné',
+    'Bondoukou', 'Katiola', 'Ferkessédougou', 'Dabakala', 'Tingréla',
+]
+FIRST_NAMES = [
+    'Awa', 'Fatou', 'Mariam', 'Aminata', 'Kadiatou', 'Adjoua', 'Affoué',
+    'Yao', 'Koffi', 'Kouassi', 'Moussa', 'Issa', 'Seydou', 'Salimata',
+]
+LAST_NAMES = [
+    'Koné', 'Traoré', 'Ouattara', 'Coulibaly', 'Diabaté', 'Konan',
+    'Kouamé', 'Yao', 'Bamba', 'Soro', 'Touré', 'Silué',
+]
+SHARE_VALUES = [200, 250, 500, 1000]
+SOLIDARITY_AMOUNTS = [50, 100, 200]
+MEETING_DAYS = ['lundi', 'mardi', 'mercredi', 'jeudi', 'vendredi', 'samedi']
+
+
+class BatchWriter:
+    """Accumule des lignes par table et les insère par lots."""
+
+    # Ordre d'insertion respectant les clés étrangères
+    TABLES = [
+        User.__table__,
+        Cycle.__table__,
+        Group.__table__,
+        user_groups,
+        Meeting.__table__,
+        Transaction.__table__,
+    ]
+
+    def __init__(self, engine, batch_size):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.buffers = {table.name: [] for table in self.TABLES}
+        self.pending = 0
+        self.counts = {table.name: 0 for table in self.TABLES}
+        self.next_ids = {}
+
+        with engine.connect() as conn:
+            for table in self.TABLES:
+                if 'id' in table.c:
+                    max_id = conn.execute(select(func.max(table.c.id))).scalar()
+                    self.next_ids[table.name] = (max_id or 0) + 1
+
+    def allocate_id(self, table_name):
+        value = self.next_ids[table_name]
+        self.next_ids[table_name] += 1
+        return value
+
+    def add(self, table_name, row):
+        self.buffers[table_name].append(row)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql('PRAGMA synchronous = OFF')
+            for table in self.TABLES:
+                rows = self.buffers[table.name]
+                if rows:
+                    conn.execute(table.insert(), rows)
+                    self.counts[table.name] += len(rows)
+                    self.buffers[table.name] = []
+        self.pending = 0
+
+    def reset_sequences(self):
+        """Recale les séquences PostgreSQL après des insertions à id explicite."""
+        with self.engine.begin() as conn:
+            if conn.dialect.name != 'postgresql':
+                return
+            for table_name in self.next_ids:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table_name}), 1))"
+                ))
+
+
+class GroupSimulator:
+    """Simule un cycle de réunions hebdomadaires pour un groupe AVEC."""
+
+    def __init__(self, rng, writer, group_id, member_ids, creator_id,
+                 share_value, interest_rate, solidarity_amount):
+        self.rng = rng
+        self.writer = writer
+        self.group_id = group_id
+        self.member_ids = member_ids
+        self.creator_id = creator_id
+        self.share_value = share_value
+        self.interest_rate = interest_rate
+        self.solidarity_amount = solidarity_amount
+
+        # Lignes conservées jusqu'à la fin du cycle : les soldes des prêts
+        # évoluent encore et le groupe doit être inséré avant ses réunions.
+        self.meetings = []
+        self.transactions = []
+        self.total_savings = 0
+        self.solidarity_fund = 0
+        self.savings_by_member = {member_id: 0 for member_id in member_ids}
+        # Prêts en cours : member_id -> [loan_row, principal restant, échéances restantes]
+        self.open_loans = {}
+        # Propension individuelle à acheter des parts (1 à 5 parts par réunion)
+        self.share_appetite = {
+            member_id: rng.choice([1, 1, 2, 2, 2, 3, 3, 4, 5]) for member_id in member_ids
+        }
+
+    def _transaction(self, meeting_id, meeting_date, member_id, type_, amount, **extra):
+        row = {
+            'id': self.writer.allocate_id('transactions'),
+            'type': type_,
+            'amount': amount,
+            'description': None,
+            'status': 'completed',
+            'due_date': None,
+            'interest_rate': 0,
+            'loan_term': None,
+            'remaining_balance': 0,
+            'group_id': self.group_id,
+            'user_id': member_id,
+            'approved_by': self.creator_id,
+            'approved_at': meeting_date,
+            'created_at': meeting_date,
+            'loan_purpose': None,
+            'guarantors': None,
+            'witnesses': None,
+            'meeting_date': meeting_date,
+            'meeting_id': meeting_id,
+        }
+        row.update(extra)
+        return row
+
+    def run_meeting(self, meeting_date, allow_loans):
+        rng = self.rng
+        meeting_id = self.writer.allocate_id('meetings')
+        attendance = rng.uniform(0.75, 0.98)
+        present = [m for m in self.member_ids if rng.random() < attendance]
+
+        self.meetings.append({
+            'id': meeting_id,
+            'group_id': self.group_id,
+            'meeting_date': meeting_date,
+            'meeting_type': 'regular',
+            'attendees_count': len(present),
+            'agenda': None,
+            'decisions': None,
+            'created_by': self.creator_id,
+            'created_at': meeting_date,
+        })
+
+        for member_id in present:
+            # Achat de parts : le plus souvent la propension habituelle du membre
+            shares = max(1, min(5, self.share_appetite[member_id] + rng.choice([-1, 0, 0, 0, 1])))
+            amount = shares * self.share_value
+            self.total_savings += amount
+            self.savings_by_member[member_id] += amount
+            self.transactions.append(self._transaction(
+                meeting_id, meeting_date, member_id, 'shares_purchase', amount))
+
+            # Caisse de solidarité : montant fixe par présent
+            self.solidarity_fund += self.solidarity_amount
+            self.transactions.append(self._transaction(
+                meeting_id, meeting_date, member_id, 'solidarity', self.solidarity_amount))
+
+            loan = self.open_loans.get(member_id)
+            if loan is not None:
+                self._repay(loan, meeting_id, meeting_date, member_id)
+            elif allow_loans and rng.random() < 0.04:
+                self._grant_loan(meeting_id, meeting_date, member_id)
+
+    def _grant_loan(self, meeting_id, meeting_date, member_id):
+        rng = self.rng
+        # Règle AVEC : au plus trois fois l'épargne du membre, dans la limite de la caisse
+        ceiling = min(3 * self.savings_by_member[member_id], self.total_savings // 2)
+        amount = int(rng.uniform(0.3, 1.0) * ceiling) // self.share_value * self.share_value
+        if amount <= 0:
+            return
+        term_months = rng.choice([1, 2, 3])
+        row = self._transaction(
+            meeting_id, meeting_date, member_id, 'loan', amount,
+            status='approved',
+            interest_rate=self.interest_rate,
+            loan_term=term_months,
+            due_date=meeting_date + timedelta(days=30 * term_months),
+            remaining_balance=amount,
+        )
+        self.transactions.append(row)
+        # Remboursement par mensualités (une réunion sur quatre)
+        self.open_loans[member_id] = [row, amount, term_months * 4]
+
+    def _repay(self, loan, meeting_id, meeting_date, member_id):
+        row, outstanding, meetings_left = loan
+        meetings_left -= 1
+        if meetings_left % 4 and meetings_left > 0:
+            loan[2] = meetings_left
+            return
+        installments = max(1, meetings_left // 4 + 1)
+        principal = outstanding if meetings_left <= 0 else outstanding // installments
+        interest = int(outstanding * self.interest_rate / 100)
+        outstanding -= principal
+        self.transactions.append(self._transaction(
+            meeting_id, meeting_date, member_id, 'loan_repayment', principal))
+        if interest:
+            self.total_savings += interest
+            self.transactions.append(self._transaction(
+                meeting_id, meeting_date, member_id, 'interest', interest))
+        row['remaining_balance'] = outstanding
+        if outstanding <= 0:
+            row['status'] = 'completed'
+            del self.open_loans[member_id]
+        else:
+            loan[1] = outstanding
+            loan[2] = meetings_left
+
+    @property
+    def total_loans(self):
+        return sum(loan[1] for loan in self.open_loans.values())
+
+
+def _person(rng, writer, role, village, password_hash, now):
+    user_id = writer.allocate_id('users')
+    writer.add('users', {
+        'id': user_id,
+        'first_name': rng.choice(FIRST_NAMES),
+        'last_name': rng.choice(LAST_NAMES),
+        'email': f'{role}{user_id}@synthetique.avec',
+        'phone': f'+225 07{rng.randrange(10**8):08d}',
+        'password_hash': password_hash,
+        'role': role,
+        'status': 'active',
+        'village': village,
+        'literacy_level': rng.choices(['basic', 'intermediate', 'advanced'], [6, 3, 1])[0],
+        'last_login': None,
+        'created_at': now,
+    })
+    return user_id
+
+
+@cli.command('generate')
+@click.option('--organizations', default=5, show_default=True,
+              help="Nombre d'organisations (un animateur par organisation).")
+@click.option('--years', default=3, show_default=True, help="Nombre d'années de cycles.")
+@click.option('--groups', default=20, show_default=True, help='Groupes par cycle.')
+@click.option('--seed', default=42, show_default=True, help='Graine du générateur aléatoire.')
+@click.option('--batch-size', default=20000, show_default=True, help='Lignes par lot inséré.')
+@click.option('--password', default='avec1234', show_default=True,
+              help='Mot de passe commun aux comptes synthétiques.')
+def generate(organizations, years, groups, seed, batch_size, password):
+    """Génère organisations, cycles, groupes, réunions et transactions."""
+    rng = random.Random(seed)
+    db.create_all()
+    writer = BatchWriter(db.engine, batch_size)
+    # Un seul hachage partagé : PBKDF2 par utilisateur prendrait des heures
+    password_hash = generate_password_hash(password)
+    now = datetime.utcnow()
+    started = time.perf_counter()
+
+    for org_index in range(organizations):
+        home_village = rng.choice(VILLAGES)
+        animator_id = _person(rng, writer, 'animateur', home_village, password_hash, now)
+
+        # Les membres restent dans le même groupe d'une année sur l'autre
+        lineages = []
+        for group_index in range(groups):
+            village = rng.choice(VILLAGES)
+            size = rng.randint(15, 30)
+            members = [_person(rng, writer, 'member', village, password_hash, now)
+                       for _ in range(size)]
+            lineages.append((f'AVEC {village} {org_index + 1}-{group_index + 1}', village, members))
+
+        for year in range(1, years + 1):
+            start = datetime(now.year - years + year, 1, 1) + timedelta(days=rng.randint(0, 20))
+            end = start + timedelta(weeks=52)
+            completed = end <= now
+            cycle_id = writer.allocate_id('cycles')
+            cycle_savings = 0
+            # Le cycle doit précéder ses groupes, qui précèdent leurs réunions :
+            # on simule d'abord, puis on émet les lignes dans l'ordre des clés étrangères.
+            group_rows, membership_rows, simulators = [], [], []
+
+            for name, village, members in lineages:
+                group_id = writer.allocate_id('groups')
+                share_value = rng.choice(SHARE_VALUES)
+                interest_rate = rng.choice([5, 10, 10, 10])
+                simulator = GroupSimulator(
+                    rng, writer, group_id, members, animator_id,
+                    share_value, interest_rate, rng.choice(SOLIDARITY_AMOUNTS))
+
+                for week in range(52):
+                    meeting_date = start + timedelta(weeks=week, hours=rng.choice([8, 9, 15, 16]))
+                    if meeting_date > now:
+                        break
+                    # Pas de nouveaux prêts sur les deux derniers mois du cycle
+                    simulator.run_meeting(meeting_date, allow_loans=week < 44)
+
+                cycle_savings += simulator.total_savings
+                simulators.append(simulator)
+                group_rows.append({
+                    'id': group_id,
+                    'name': name,
+                    'description': None,
+                    'village': village,
+                    'max_members': 30,
+                    'current_members': len(members),
+                    'status': 'completed' if completed else 'active',
+                    'meeting_location': f'Place du marché de {village}',
+                    'meeting_time': rng.choice(['08:00', '09:00', '15:00', '16:00']),
+                    'share_value': share_value,
+                    'contribution_amount': 0,
+                    'total_savings': simulator.total_savings,
+                    'total_loans': simulator.total_loans,
+                    'solidarity_fund': simulator.solidarity_fund,
+                    'cycle_id': cycle_id,
+                    'created_by': animator_id,
+                    'created_at': start,
+                    'president_id': members[0],
+                    'secretary_id': members[1],
+                    'treasurer_id': members[2],
+                    'loan_interest_rate': interest_rate,
+                    'max_loan_amount': 0,
+                    'loan_duration_months': 3,
+                    'solidarity_contribution_rate': 5,
+                })
+                for position, member_id in enumerate(members):
+                    open_loan = simulator.open_loans.get(member_id)
+                    membership_rows.append({
+                        'user_id': member_id,
+                        'group_id': group_id,
+                        'joined_at': start,
+                        'role_in_group': ['president', 'secretary', 'treasurer'][position]
+                        if position < 3 else 'member',
+                        'savings_balance': simulator.savings_by_member[member_id],
+                        'loan_outstanding': open_loan[1] if open_loan else 0,
+                        'guarantee_outstanding': 0,
+                    })
+
+            writer.add('cycles', {
+                'id': cycle_id,
+                'name': f'Cycle {start.year} - Organisation {org_index + 1}',
+                'description': None,
+                'start_date': start,
+                'end_date': end,
+                'phase': 'completed' if completed else 'supervision',
+                'status': 'completed' if completed else 'active',
+                'target_amount': int(cycle_savings * rng.uniform(0.9, 1.3)) // 1000 * 1000,
+                'current_amount': cycle_savings,
+                'group_count': len(group_rows),
+                'member_count': sum(row['current_members'] for row in group_rows),
+                'interest_rate': 10,
+                'meeting_frequency': 'weekly',
+                'meeting_day': rng.choice(MEETING_DAYS),
+                'created_by': animator_id,
+                'created_at': start,
+                'cycle_year': year,
+                'is_cycle_completed': completed,
+                'profit_sharing_date': end if completed else None,
+                # Cycle en cours, déjà en supervision : prochaine étape, la clôture
+                'next_transition_at': None if completed else end,
+            })
+            for row in group_rows:
+                writer.add('groups', row)
+            for row in membership_rows:
+                writer.add('user_groups', row)
+            for simulator in simulators:
+                for row in simulator.meetings:
+                    writer.add('meetings', row)
+                for row in simulator.transactions:
+                    writer.add('transactions', row)
+
+        click.echo(f'Organisation {org_index + 1}/{organizations} générée')
+
+    writer.flush()
+    writer.reset_sequences()
+    # Inscription des nouveaux groupes au catalogue de formation (un seul INSERT ... SELECT)
+    GroupFormationProgress.enroll_groups()
+    db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    total = sum(writer.counts.values())
+    for table_name, count in writer.counts.items():
+        click.echo(f'  {table_name:<15} {count:>12,}')
+    # Les INSERT « core » ne passent pas par la mise à jour de l'index au flush
+    if search_index.enabled():
+        indexed = sum(search_index.rebuild(batch_size=batch_size).values())
+        click.echo(f'  {"search_index":<15} {indexed:>12,}')
+    click.echo(f'✅ {total:,} lignes insérées en {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} lignes/s)')
@@ -0,0 +1,95 @@
+"""Analyse hors ligne du journal des requêtes SQL lentes.
+
+Utilisation :
+    flask slow-queries analyze --log-dir logs --top 20
+"""
+import glob
+import json
+import os
+from collections import defaultdict
+
+import click
+from flask.cli import AppGroup
+
+from monitoring.perf import percentile
+from monitoring.slow_queries import LOG_FILENAME, fingerprint
+
+cli = AppGroup('slow-queries', help='Analyse des requêtes SQL lentes.')
+
+
+def load_records(log_dir):
+    """Lit le journal courant et ses rotations (slow_queries.jsonl, .1, .2...)."""
+    paths = sorted(glob.glob(os.path.join(log_dir, LOG_FILENAME + '*')))
+    for path in paths:
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def group_by_fingerprint(records):
+    groups = defaultdict(lambda: {
+        'durations': [], 'endpoints': defaultdict(int), 'frames': defaultdict(int),
+        'slowest': -1, 'plan': None,
+    })
+    for record in records:
+        # Recalculé pour regrouper aussi les journaux produits par une version antérieure
+        key = fingerprint(record['statement'])
+        entry = groups[key]
+        entry['durations'].append(record['duration_ms'])
+        entry['endpoints'][record.get('endpoint') or '-'] += 1
+        entry['frames'][record.get('frame') or '-'] += 1
+        # Le plan affiché est celui de l'exécution la plus lente
+        if record['duration_ms'] > entry['slowest']:
+            entry['slowest'] = record['duration_ms']
+            entry['plan'] = record.get('plan')
+
+    summary = []
+    for key, entry in groups.items():
+        durations = sorted(entry['durations'])
+        summary.append({
+            'fingerprint': key,
+            'count': len(durations),
+            'total_ms': sum(durations),
+            'p50_ms': percentile(durations, 50),
+            'p95_ms': percentile(durations, 95),
+            'max_ms': durations[-1],
+            'endpoints': dict(entry['endpoints']),
+            'frames': dict(entry['frames']),
+            'plan': entry['plan'],
+        })
+    summary.sort(key=lambda item: item['total_ms'], reverse=True)
+    return summary
+
+
+@cli.command('analyze')
+@click.option('--log-dir', default='logs', show_default=True, help='Répertoire des journaux.')
+@click.option('--top', default=20, show_default=True, help="Nombre d'empreintes affichées.")
+@click.option('--as-json', is_flag=True, help='Sortie JSON plutôt que texte.')
+def analyze(log_dir, top, as_json):
+    """Regroupe les requêtes lentes par empreinte, triées par temps cumulé."""
+    summary = group_by_fingerprint(load_records(log_dir))[:top]
+
+    if as_json:
+        click.echo(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+    if not summary:
+        click.echo(f'Aucune requête lente dans {log_dir}/{LOG_FILENAME}')
+        return
+
+    for rank, item in enumerate(summary, 1):
+        click.echo(f"#{rank}  {item['count']} exécution(s), cumul {item['total_ms']:.0f} ms, "
+                   f"p50 {item['p50_ms']:.0f} ms, p95 {item['p95_ms']:.0f} ms, max {item['max_ms']:.0f} ms")
+        click.echo(f"    {item['fingerprint'][:300]}")
+        for endpoint, count in sorted(item['endpoints'].items(), key=lambda kv: -kv[1]):
+            click.echo(f'    endpoint {endpoint} ({count})')
+        for frame, count in sorted(item['frames'].items(), key=lambda kv: -kv[1])[:3]:
+            click.echo(f'    origine  {frame} ({count})')
+        for line in item['plan'] or []:
+            click.echo(f'    plan     {line}')
+        click.echo('')
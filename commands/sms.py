@@ -0,0 +1,49 @@
+"""SMS sortants (table sms_outbox).
+
+Utilisation :
+    flask sms schedule         # rappels de réunion, retards de prêt, fins de cycle
+    flask sms send             # vide la file puis s'arrête
+    flask sms send --loop      # expéditeur permanent
+"""
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from jobs import sms
+
+cli = AppGroup('sms', help='SMS sortants.')
+
+
+@cli.command('schedule')
+def schedule():
+    """Met en file les SMS échus, une seule fois par destinataire."""
+    summary = sms.schedule_due_sms()
+    for kind, count in summary.items():
+        click.echo(f'  {kind:20} {count} SMS')
+    click.echo(f'✅ {sum(summary.values())} SMS mis en file')
+
+
+@cli.command('send')
+@click.option('--batch-size', default=500, show_default=True, help='Messages lus par lot.')
+@click.option('--gateway', default=None, help='Passerelle (file:chemin ou URL), par défaut SMS_GATEWAY.')
+@click.option('--loop', is_flag=True, help='Attend les nouveaux messages au lieu de s\'arrêter.')
+@click.option('--interval', default=30, show_default=True, help='Secondes d\'attente quand la file est vide (--loop).')
+def send(batch_size, gateway, loop, interval):
+    """Envoie les SMS en attente, regroupés par numéro et au débit autorisé."""
+    spec = gateway or current_app.config['SMS_GATEWAY']
+    limiter = sms.RateLimiter(current_app.config['SMS_RATE_PER_SECOND'])
+    gateway = sms.get_gateway(spec)
+    sent = failed = outgoing = 0
+    while True:
+        batch_sent, batch_failed, batch_outgoing = sms.send_pending(
+            gateway, batch_size=batch_size, limiter=limiter)
+        sent += batch_sent
+        failed += batch_failed
+        outgoing += batch_outgoing
+        if not batch_outgoing:
+            if not loop:
+                break
+            time.sleep(interval)
+    click.echo(f'✅ {sent} message(s) envoyé(s) en {outgoing} SMS via {spec}, {failed} en échec')
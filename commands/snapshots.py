@@ -0,0 +1,44 @@
+"""Instantanés des soldes à la clôture des réunions.
+
+Utilisation (après un import en masse, flask seed generate...) :
+    flask snapshots rebuild
+    flask snapshots rebuild --group 12
+"""
+import click
+from flask.cli import AppGroup
+
+from commands.schema import data_migration
+from models import db, Group, Meeting, MeetingSnapshot
+
+cli = AppGroup('snapshots', help='Instantanés des soldes par réunion.')
+
+
+def _rebuild(groups):
+    meetings = 0
+    for group in groups:
+        meetings += MeetingSnapshot.rebuild(group)
+        # Un commit par groupe : la reprise d'une grosse base avance par étapes
+        db.session.commit()
+    return meetings
+
+
+@cli.command('rebuild')
+@click.option('--group', 'group_id', type=int, help='Ne recalcule que ce groupe.')
+def rebuild(group_id):
+    """Recalcule les instantanés de toutes les réunions à partir des registres."""
+    query = Group.query.order_by(Group.id)
+    if group_id is not None:
+        query = query.filter(Group.id == group_id)
+    groups = query.all()
+    meetings = _rebuild(groups)
+    click.echo(f'✅ {meetings} instantané(s) pour {len(groups)} groupe(s)')
+
+
+@data_migration
+def meeting_snapshots():
+    """Calcule les instantanés des groupes qui ont des réunions mais aucun instantané"""
+    missing = Group.query.filter(
+        db.exists().where(Meeting.group_id == Group.id),
+        ~db.exists().where(MeetingSnapshot.group_id == Group.id)
+    ).order_by(Group.id).all()
+    _rebuild(missing)
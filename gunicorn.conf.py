@@ -0,0 +1,73 @@
+"""Configuration gunicorn (chargée automatiquement depuis le répertoire courant).
+
+Profil de production : workers « gthread », chacun servant plusieurs
+requêtes à la fois dans des threads. Une requête qui attend la base (ou
+l'interrogation périodique ``/notifications/api/unread-count``) n'immobilise
+plus tout un processus : à mémoire égale (même nombre de processus), le
+débit sur les pages liées aux entrées-sorties augmente.
+
+L'application est sûre sous ce profil : ``db.session`` est propre au
+contexte d'application, donc à chaque requête et à chaque thread ; l'état
+global des modules (seuils, journaux, échantillons de ``/debug/perf`` sous
+verrou, métriques Prometheus) est fixé au démarrage ou protégé ; les routes
+n'ont pas d'état de module. Le pool SQLAlchemy est dimensionné sur le
+nombre de threads (``DB_POOL_SIZE``, par défaut ``GUNICORN_THREADS``).
+"""
+import gc
+import os
+import shutil
+import time
+
+from prometheus_client import multiprocess
+
+# L'application est construite une fois dans le maître puis héritée par
+# chaque worker (copie sur écriture) : un worker relancé ou ajouté ne
+# réimporte ni Flask, ni SQLAlchemy, ni les modèles et routes.
+# GUNICORN_PRELOAD=0 pour revenir au chargement par worker (rechargement à chaud).
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+# Les connexions persistantes des navigateurs qui interrogent périodiquement
+# restent ouvertes sans occuper de thread
+keepalive = 5
+timeout = 30
+graceful_timeout = 30
+# Recyclage progressif des workers (fuites mémoire), sans redémarrage simultané
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = 200
+
+
+def on_starting(server):
+    # Repartir d'un répertoire de métriques vide à chaque démarrage du maître
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    app = getattr(server.app, 'callable', None)
+    startup_ms = getattr(app, 'config', {}).get('STARTUP_MS')
+    if startup_ms is not None:
+        server.log.info('Application préchargée en %.0f ms', startup_ms)
+    if server.cfg.preload_app:
+        # Les objets déjà créés ne sont plus parcourus par le ramasse-miettes :
+        # il ne touche plus aux pages partagées, qui restent communes aux workers
+        gc.freeze()
+
+
+def pre_fork(server, worker):
+    worker.fork_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    # perf_counter est monotone pour tout le système : comparable après le fork
+    worker.log.info('Worker %s prêt en %.0f ms', worker.pid,
+                    (time.perf_counter() - worker.fork_started) * 1000)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,100 @@
+"""Archivage des cycles clôturés.
+
+Les transactions, réunions, présences et l'avancement de formation des
+groupes d'un cycle partagé (``is_cycle_completed``) sont déplacés par lots
+dans les tables ``*_archive`` : chaque lot est copié puis supprimé de la table
+courante dans la même transaction, une ligne n'est donc jamais perdue ni
+présente deux fois. Les groupes, les cycles et leurs soldes et compteurs
+restent en place ; ``Group.ledger()`` et ``Model.history()`` relisent
+l'archive pour le carnet de comptes et les rapports.
+
+``Cycle.archived_at`` est posé et validé avant le premier lot : pendant le
+déplacement, les lecteurs lisent déjà ``history()`` (tables courantes et
+archive). Si l'archivage s'interrompt, le cycle reste archivable tant que
+des lignes de ses groupes sont encore dans les tables courantes.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from models import db, Cycle, Group, Transaction, Meeting, MeetingAttendance, GroupFormationProgress
+
+# Délai après le partage pendant lequel un cycle reste dans les tables courantes
+# (corrections, réclamations)
+DEFAULT_MIN_AGE = timedelta(days=30)
+
+
+def _has_current_rows(cycle_id):
+    """Condition : des lignes des groupes du cycle sont encore dans les tables courantes"""
+    return db.or_(*(
+        db.exists().where(model.group_id == Group.id, Group.cycle_id == cycle_id)
+        for model in (Transaction, Meeting, GroupFormationProgress)
+    ))
+
+
+def archivable_cycles(now, min_age=DEFAULT_MIN_AGE):
+    """Cycles partagés depuis au moins ``min_age`` pas encore archivés, ou dont l'archivage est inachevé"""
+    return db.session.execute(
+        db.select(Cycle.id, Cycle.name)
+        .where(
+            Cycle.is_cycle_completed.is_(True),
+            db.or_(Cycle.archived_at.is_(None), _has_current_rows(Cycle.id)),
+            db.or_(Cycle.profit_sharing_date.is_(None), Cycle.profit_sharing_date <= now - min_age)
+        )
+        .order_by(Cycle.id)
+    ).all()
+
+
+def _move(model, condition):
+    """Copie dans l'archive puis supprime les lignes de ``model`` vérifiant ``condition``"""
+    table, archive = model.__table__, model.__archive__
+    db.session.execute(archive.insert().from_select(
+        [column.name for column in table.columns], db.select(table).where(condition)))
+    return db.session.execute(table.delete().where(condition)).rowcount
+
+
+def _move_in_batches(model, key, scope, batch_size):
+    """Déplace par lots de ``batch_size`` valeurs de ``key`` les lignes de ``scope`` ; un commit par lot"""
+    moved = 0
+    while True:
+        keys = db.session.execute(
+            db.select(key).where(scope).distinct().order_by(key).limit(batch_size)
+        ).scalars().all()
+        if not keys:
+            return moved
+        moved += _move(model, key.in_(keys))
+        db.session.commit()
+
+
+def archive_cycle(cycle_id, batch_size=1000, now=None):
+    """Archive les lignes des groupes d'un cycle ; retourne {table: lignes déplacées}"""
+    groups = db.select(Group.id).where(Group.cycle_id == cycle_id).scalar_subquery()
+    meetings = db.select(Meeting.id).where(Meeting.group_id.in_(groups)).scalar_subquery()
+
+    # Les lecteurs passent sur history() avant que la première ligne ne change de table
+    db.session.execute(
+        db.update(Cycle).where(Cycle.id == cycle_id, Cycle.archived_at.is_(None))
+        .values(archived_at=now or datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    moved = Counter()
+    # Les lignes qui référencent une réunion partent avant elle
+    moved['transactions'] = _move_in_batches(
+        Transaction, Transaction.id, Transaction.group_id.in_(groups), batch_size)
+    moved['meeting_attendances'] = _move_in_batches(
+        MeetingAttendance, MeetingAttendance.meeting_id, MeetingAttendance.meeting_id.in_(meetings),
+        max(1, batch_size // 25))
+    moved['meetings'] = _move_in_batches(
+        Meeting, Meeting.id, Meeting.group_id.in_(groups), batch_size)
+    moved['group_formation_progress'] = _move_in_batches(
+        GroupFormationProgress, GroupFormationProgress.group_id, GroupFormationProgress.group_id.in_(groups),
+        max(1, batch_size // 10))
+    return moved
+
+
+def archive_completed_cycles(min_age=DEFAULT_MIN_AGE, batch_size=1000, now=None):
+    """Archive tous les cycles archivables ; retourne [(cycle, {table: lignes})]"""
+    now = now or datetime.utcnow()
+    return [(cycle, archive_cycle(cycle.id, batch_size=batch_size, now=now))
+            for cycle in archivable_cycles(now, min_age)]
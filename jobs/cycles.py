@@ -0,0 +1,153 @@
+"""Planificateur des phases de cycle et travaux qui en découlent.
+
+``advance_due_cycles`` lit les cycles actifs dont ``next_transition_at`` est
+échue (index ``ix_cycles_status_next_transition``), calcule leur nouvelle
+phase à partir des dates, les met à jour en un seul UPDATE par lot et met en
+file les suites : notification du changement de phase et, pour les cycles
+clôturés, aperçu du partage des bénéfices pour le comité de chaque groupe.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from flask import url_for
+
+from jobs.queue import enqueue_many, handler
+from models import db, Cycle, Group, Transaction, Notification
+
+PHASE_LABELS = {
+    'preparation': 'Préparation',
+    'formation': 'Formation',
+    'supervision': 'Supervision',
+    'completed': 'Terminé',
+}
+
+
+def advance_due_cycles(now=None, batch_size=1000):
+    """Fait avancer tous les cycles échus ; retourne le nombre de passages par phase atteinte."""
+    now = now or datetime.utcnow()
+    cycles = Cycle.__table__
+    # UPDATE ... WHERE phase = ancienne phase : une modification manuelle
+    # concurrente n'est pas écrasée, le cycle sera réévalué au lot suivant
+    advance = cycles.update().where(
+        cycles.c.id == db.bindparam('b_id'),
+        cycles.c.phase == db.bindparam('b_old_phase')
+    ).values(
+        phase=db.bindparam('b_phase'),
+        status=db.bindparam('b_status'),
+        next_transition_at=db.bindparam('b_next_transition_at')
+    )
+
+    summary = Counter()
+    while True:
+        # Chaque lot validé sort de la sélection : next_transition_at passe dans le futur
+        due = db.session.execute(
+            db.select(Cycle.id, Cycle.start_date, Cycle.end_date, Cycle.phase)
+            .where(Cycle.status == 'active', Cycle.next_transition_at <= now)
+            .order_by(Cycle.next_transition_at)
+            .limit(batch_size)
+        ).all()
+        if not due:
+            break
+
+        updates, changed, closed = [], [], []
+        for row in due:
+            phase, next_transition_at = Cycle.schedule(row.start_date, row.end_date, row.phase, now)
+            updates.append({
+                'b_id': row.id,
+                'b_old_phase': row.phase,
+                'b_phase': phase,
+                'b_status': 'completed' if phase == 'completed' else 'active',
+                'b_next_transition_at': next_transition_at,
+            })
+            if phase != row.phase:
+                changed.append({'cycle_id': row.id, 'from': row.phase, 'to': phase})
+                summary[phase] += 1
+                if phase == 'completed':
+                    closed.append({'cycle_id': row.id})
+
+        db.session.execute(advance, updates)
+        enqueue_many('cycle_phase_changed', changed)
+        enqueue_many('cycle_sharing_preview', closed)
+        db.session.commit()
+
+    return summary
+
+
+def _notify(rows):
+    if rows:
+        db.session.execute(Notification.__table__.insert(), rows)
+
+
+@handler('cycle_phase_changed')
+def notify_phase_changes(payloads):
+    """Prévient le créateur du cycle et les animateurs de ses groupes."""
+    cycle_ids = [payload['cycle_id'] for payload in payloads]
+    names = dict(db.session.execute(
+        db.select(Cycle.id, Cycle.name).where(Cycle.id.in_(cycle_ids))
+    ).all())
+
+    recipients = defaultdict(set)
+    for cycle_id, user_id in db.session.execute(
+        db.select(Cycle.id, Cycle.created_by).where(Cycle.id.in_(cycle_ids))
+        .union(db.select(Group.cycle_id, Group.created_by).where(Group.cycle_id.in_(cycle_ids)))
+    ):
+        recipients[cycle_id].add(user_id)
+
+    now = datetime.utcnow()
+    rows = []
+    for payload in payloads:
+        cycle_id = payload['cycle_id']
+        if cycle_id not in names:
+            continue
+        closed = payload['to'] == 'completed'
+        for user_id in recipients[cycle_id]:
+            rows.append({
+                'user_id': user_id,
+                'type': 'success' if closed else 'info',
+                'title': f'Cycle "{names[cycle_id]}" : phase {PHASE_LABELS.get(payload["to"], payload["to"])}',
+                'message': 'Le cycle est clôturé, le partage des bénéfices peut être préparé.' if closed
+                           else f'Le cycle passe de la phase {PHASE_LABELS.get(payload["from"], payload["from"])} '
+                                f'à la phase {PHASE_LABELS.get(payload["to"], payload["to"])}.',
+                'url': url_for('cycles.show', id=cycle_id),
+                'created_at': now,
+            })
+    _notify(rows)
+
+
+@handler('cycle_sharing_preview')
+def preview_sharing(payloads):
+    """Calcule l'aperçu du partage de chaque groupe des cycles clôturés et l'envoie au comité."""
+    cycle_ids = [payload['cycle_id'] for payload in payloads]
+    groups = Group.query.options(db.load_only(
+        Group.id, Group.name, Group.share_value, Group.total_savings, Group.total_loans,
+        Group.president_id, Group.treasurer_id, Group.created_by
+    )).filter(Group.cycle_id.in_(cycle_ids)).all()
+
+    # Même règle que la page de partage : parts achetées et complétées
+    shares_amounts = dict(db.session.execute(
+        db.select(Transaction.group_id, db.func.sum(Transaction.amount))
+        .where(
+            Transaction.group_id.in_(db.select(Group.id).where(Group.cycle_id.in_(cycle_ids))),
+            Transaction.type == 'shares_purchase',
+            Transaction.status == 'completed'
+        )
+        .group_by(Transaction.group_id)
+    ).all())
+
+    now = datetime.utcnow()
+    rows = []
+    for group in groups:
+        total_capital = group.sharing_capital()
+        shares_amount = shares_amounts.get(group.id) or 0
+        total_shares = shares_amount // group.share_value if group.share_value else 0
+        committee = {group.president_id, group.treasurer_id, group.created_by} - {None}
+        for user_id in committee:
+            rows.append({
+                'user_id': user_id,
+                'type': 'success',
+                'title': f'Partage des bénéfices à préparer - {group.name}',
+                'message': f'Capital à partager : {total_capital:,.0f} FCFA pour {total_shares:,.0f} parts.'.replace(',', ' '),
+                'url': url_for('avec.cycle_sharing', group_id=group.id),
+                'created_at': now,
+            })
+    _notify(rows)
@@ -0,0 +1,157 @@
+"""Intérêts courus sur les prêts en cours.
+
+Une fois par période (mois civil), chaque prêt appliqué dont il reste du
+capital et accordé avant le début de la période porte intérêt sur ce restant
+dû, au taux du prêt ou, à défaut, au taux de prêt du groupe. Le montant est
+calculé par la base et écrit par INSERT ... SELECT, deux lignes par prêt :
+``interest_charge`` (dû par l'emprunteur : prêts en cours du groupe et du
+membre) et ``interest`` (revenu du groupe : épargne). La caisse disponible ne
+change donc pas ; le membre règle ces intérêts par un remboursement.
+
+Le ``remaining_balance`` d'une ligne ``interest_charge`` est la part de ces
+intérêts encore due : un remboursement règle d'abord les intérêts d'un prêt,
+puis son capital (``Transaction._settle_loans``). L'intérêt est donc simple,
+calculé sur le seul capital restant dû.
+
+Les soldes des groupes sont ensuite mis à jour par un seul UPDATE exécuté
+avec un jeu de paramètres par groupe, de même que l'épargne des cycles et
+l'exposition des membres. L'index unique (loan_id, accrual_period, type) et
+la condition NOT EXISTS rendent le calcul idempotent : relancer une période
+déjà courue n'écrit rien.
+
+Seul le mois courant peut être couru : le calcul utilise le capital restant
+dû au moment de l'exécution, pas celui du début d'une période passée.
+"""
+from collections import Counter
+from datetime import datetime
+
+from models import db, Cycle, Group, Transaction, APPLIED_STATUSES, applied_at
+
+ACCRUAL_TYPES = ('interest_charge', 'interest')
+
+
+def period_start(period):
+    """Début de la période « AAAA-MM » ; ValueError si elle est mal formée"""
+    try:
+        return datetime.strptime(period, '%Y-%m')
+    except ValueError:
+        raise ValueError(f'Période invalide : {period} (format AAAA-MM)')
+
+
+def _accruing_loans(start):
+    """Prêts portant intérêt pour une période commençant à ``start``"""
+    return db.and_(
+        Transaction.type == 'loan',
+        Transaction.status.in_(APPLIED_STATUSES),
+        Transaction.remaining_balance > 0,
+        applied_at(Transaction) < start,
+        Cycle.is_cycle_completed.isnot(True)
+    )
+
+
+def _accrue_groups(group_ids, period, start, now):
+    """Intérêts de la période pour les prêts des groupes donnés ; retourne un résumé"""
+    rate = db.func.coalesce(db.func.nullif(Transaction.interest_rate, 0), Group.loan_interest_rate, 0)
+    amount = db.cast(db.func.round(Transaction.remaining_balance * rate / 100), db.BigInteger)
+    for type_ in ACCRUAL_TYPES:
+        accrued = db.aliased(Transaction)
+        due = (
+            db.select(
+                db.literal(type_), amount, db.literal(f'Intérêts courus {period}'),
+                Transaction.group_id, Transaction.user_id, db.literal('approved'),
+                db.literal(now, db.DateTime), db.literal(now, db.DateTime),
+                Transaction.id, db.literal(period),
+                # Intérêts encore dus : toute la charge, rien pour le revenu du groupe
+                amount if type_ == 'interest_charge' else db.literal(0, db.BigInteger)
+            )
+            .join(Group, Group.id == Transaction.group_id)
+            .join(Cycle, Cycle.id == Group.cycle_id)
+            .where(
+                Transaction.group_id.in_(group_ids),
+                _accruing_loans(start),
+                amount > 0,
+                ~db.exists().where(
+                    accrued.loan_id == Transaction.id,
+                    accrued.accrual_period == period,
+                    accrued.type == type_
+                )
+            )
+        )
+        db.session.execute(Transaction.__table__.insert().from_select(
+            ['type', 'amount', 'description', 'group_id', 'user_id', 'status',
+             'approved_at', 'created_at', 'loan_id', 'accrual_period', 'remaining_balance'],
+            due
+        ))
+
+    # Lignes écrites ci-dessus (même transaction SQL), par membre
+    rows = db.session.execute(
+        db.select(Transaction.group_id, Transaction.user_id, Transaction.type,
+                  db.func.count().label('loans'), db.func.sum(Transaction.amount).label('amount'))
+        .where(
+            Transaction.group_id.in_(group_ids),
+            Transaction.accrual_period == period,
+            Transaction.type.in_(ACCRUAL_TYPES),
+            Transaction.approved_at == now
+        )
+        .group_by(Transaction.group_id, Transaction.user_id, Transaction.type)
+    ).all()
+    summary = Counter()
+    by_group = Counter()
+    for row in rows:
+        if row.type == 'interest':
+            by_group[row.group_id] += row.amount
+            summary['loans'] += row.loans
+            summary['amount'] += row.amount
+    if not by_group:
+        return summary
+    summary['groups'] = len(by_group)
+
+    groups = Group.__table__
+    db.session.execute(
+        groups.update().where(groups.c.id == db.bindparam('b_id')).values(
+            total_savings=groups.c.total_savings + db.bindparam('b_interest'),
+            total_loans=groups.c.total_loans + db.bindparam('b_interest')
+        ),
+        [{'b_id': group_id, 'b_interest': interest} for group_id, interest in by_group.items()]
+    )
+    # L'épargne des groupes alimente la progression de leur cycle
+    by_cycle = Counter()
+    for group_id, cycle_id in db.session.execute(
+            db.select(Group.id, Group.cycle_id).where(Group.id.in_(list(by_group)))):
+        by_cycle[cycle_id] += by_group[group_id]
+    cycles = Cycle.__table__
+    db.session.execute(
+        cycles.update().where(cycles.c.id == db.bindparam('b_id')).values(
+            current_amount=cycles.c.current_amount + db.bindparam('b_interest')
+        ),
+        [{'b_id': cycle_id, 'b_interest': interest} for cycle_id, interest in by_cycle.items()]
+    )
+    Transaction.apply_exposure(rows)
+    return summary
+
+
+def accrue_interest(period=None, now=None, batch_size=500):
+    """Court les intérêts de la période (mois courant par défaut) ; un commit par lot de groupes"""
+    now = now or datetime.utcnow()
+    period = period or now.strftime('%Y-%m')
+    start = period_start(period)
+    if start > now:
+        raise ValueError(f'Période future : {period}')
+    # Le calcul part du capital restant dû aujourd'hui : une période passée
+    # serait courue sur un restant dû qui n'était pas le sien
+    if start < period_start(now.strftime('%Y-%m')):
+        raise ValueError(f'Période passée : {period} (seul le mois courant peut être couru)')
+
+    group_ids = db.session.execute(
+        db.select(Transaction.group_id)
+        .join(Group, Group.id == Transaction.group_id)
+        .join(Cycle, Cycle.id == Group.cycle_id)
+        .where(_accruing_loans(start))
+        .distinct()
+        .order_by(Transaction.group_id)
+    ).scalars().all()
+    summary = Counter()
+    for index in range(0, len(group_ids), batch_size):
+        summary.update(_accrue_groups(group_ids[index:index + batch_size], period, start, now))
+        db.session.commit()
+    return summary
@@ -0,0 +1,195 @@
+"""Rapprochement des soldes et compteurs avec le grand livre.
+
+``Group.total_savings``, ``total_loans``, ``solidarity_fund`` et
+``current_members`` sont des compteurs tenus à jour par incréments ; ils sont
+ici recalculés à partir de ``transactions`` (transactions appliquées, voir
+``BALANCE_EFFECTS``) et de ``user_groups``, puis comparés aux valeurs stockées.
+
+Le travail est découpé en partitions de cycles (par paquets de cycles ou par
+organisation, c'est-à-dire par animateur créateur du cycle). Chaque partition
+est traitée par une seule requête d'agrégation GROUP BY sur ses groupes, qui
+ne renvoie que les écarts ; avec ``workers > 1`` les partitions sont réparties
+sur un pool de processus, chacun avec sa propre connexion. Les cycles archivés
+sont lus dans ``Transaction.history()``.
+
+La correction est elle aussi ensembliste : un UPDATE des seuls groupes en
+écart dont chaque colonne est recalculée par sous-requête corrélée (un
+mouvement validé entre le contrôle et la correction est donc pris en compte),
+puis ``Cycle.refresh_counters`` pour les cycles de la partition.
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, repeat
+
+from flask import current_app
+
+from models import (db, Cycle, Group, Transaction, user_groups, signed_sum,
+                    BALANCE_COLUMNS, BALANCE_EFFECTS, APPLIED_STATUSES)
+
+PARTITIONS = ('cycle', 'organization')
+MEMBER_COLUMN = 'current_members'
+
+
+def plan_partitions(partition='cycle', cycles_per_task=50):
+    """Découpe les cycles en partitions : [(archivé, [cycle_id, ...])]"""
+    rows = db.session.execute(
+        db.select(Cycle.id, Cycle.created_by, Cycle.archived_at.isnot(None).label('archived'))
+        .order_by(Cycle.archived_at.isnot(None), Cycle.created_by, Cycle.id)
+    ).all()
+    partitions = []
+    for archived, cycles in groupby(rows, key=lambda row: bool(row.archived)):
+        cycles = list(cycles)
+        if partition == 'organization':
+            partitions.extend(
+                (archived, [row.id for row in organization])
+                for _, organization in groupby(cycles, key=lambda row: row.created_by)
+            )
+        else:
+            ids = sorted(row.id for row in cycles)
+            partitions.extend(
+                (archived, ids[start:start + cycles_per_task])
+                for start in range(0, len(ids), cycles_per_task)
+            )
+    return partitions
+
+
+def _balance_sums(ledger):
+    """Somme signée de chaque colonne de solde : {colonne: expression SUM}"""
+    return {column: signed_sum(ledger, BALANCE_EFFECTS, column) for column in BALANCE_COLUMNS}
+
+
+def _applied(ledger):
+    return db.and_(ledger.type.in_(BALANCE_EFFECTS), ledger.status.in_(APPLIED_STATUSES))
+
+
+def find_drift(cycle_ids, archived=False):
+    """Groupes des cycles dont un compteur diffère du grand livre.
+
+    Retourne (groupes contrôlés, [(group_id, cycle_id, colonne, stocké, attendu)]).
+    """
+    ledger = Transaction.history() if archived else Transaction
+    groups = db.select(Group.id).where(Group.cycle_id.in_(cycle_ids)).scalar_subquery()
+    sums = _balance_sums(ledger)
+    balances = (
+        db.select(ledger.group_id.label('group_id'), *(sums[column].label(column) for column in BALANCE_COLUMNS))
+        .where(ledger.group_id.in_(groups), _applied(ledger))
+        .group_by(ledger.group_id)
+        .subquery('balances')
+    )
+    members = (
+        db.select(user_groups.c.group_id, db.func.count().label(MEMBER_COLUMN))
+        .where(user_groups.c.group_id.in_(groups))
+        .group_by(user_groups.c.group_id)
+        .subquery('members')
+    )
+    expected = {column: db.func.coalesce(balances.c[column], 0) for column in BALANCE_COLUMNS}
+    expected[MEMBER_COLUMN] = db.func.coalesce(members.c[MEMBER_COLUMN], 0)
+
+    checked = db.session.execute(
+        db.select(db.func.count(Group.id)).where(Group.cycle_id.in_(cycle_ids))
+    ).scalar()
+    rows = db.session.execute(
+        db.select(
+            Group.id, Group.cycle_id,
+            *(getattr(Group, column) for column in expected),
+            *(value.label(f'expected_{column}') for column, value in expected.items())
+        )
+        .outerjoin(balances, balances.c.group_id == Group.id)
+        .outerjoin(members, members.c.group_id == Group.id)
+        .where(
+            Group.cycle_id.in_(cycle_ids),
+            db.or_(*(
+                db.or_(getattr(Group, column).is_(None), getattr(Group, column) != value)
+                for column, value in expected.items()
+            ))
+        )
+        .order_by(Group.id)
+    ).all()
+
+    drifts = []
+    for row in rows:
+        mapping = row._mapping
+        for column in expected:
+            stored, wanted = mapping[column], mapping[f'expected_{column}']
+            if stored != wanted:
+                drifts.append((row.id, row.cycle_id, column, stored, wanted))
+    return checked, drifts
+
+
+def repair_groups(group_ids, archived=False):
+    """Recalcule en un seul UPDATE les soldes et l'effectif des groupes donnés"""
+    ledger = Transaction.history() if archived else Transaction
+    sums = _balance_sums(ledger)
+    values = {
+        column: db.select(sums[column])
+        .where(ledger.group_id == Group.id, _applied(ledger))
+        .scalar_subquery()
+        for column in BALANCE_COLUMNS
+    }
+    count = db.select(db.func.count()).select_from(user_groups).where(
+        user_groups.c.group_id == Group.id
+    ).scalar_subquery()
+    values.update(Group.member_count_values(count))
+    return db.session.execute(
+        db.update(Group)
+        .where(Group.id.in_(group_ids))
+        .values(values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def reconcile_partition(archived, cycle_ids, repair=False):
+    """Contrôle (et corrige si ``repair``) une partition ; retourne un résumé"""
+    checked, drifts = find_drift(cycle_ids, archived=archived)
+    summary = {
+        'cycles': len(cycle_ids),
+        'groups': checked,
+        'drifts': drifts,
+        'repaired_groups': 0,
+        'repaired_cycles': 0,
+    }
+    if repair:
+        drifted = sorted({group_id for group_id, *_ in drifts})
+        if drifted:
+            summary['repaired_groups'] = repair_groups(drifted, archived=archived)
+        # Les compteurs de cycle suivent les soldes de groupe éventuellement corrigés
+        summary['repaired_cycles'] = Cycle.refresh_counters(cycle_ids)
+        summary['drifted_cycles'] = summary['repaired_cycles']
+        db.session.commit()
+    else:
+        summary['drifted_cycles'] = Cycle.count_drifted_counters(cycle_ids)
+        db.session.rollback()
+    return summary
+
+
+def _init_worker(config):
+    """Initialise un processus du pool : application et contexte propres"""
+    from app_simple import create_app
+    app = create_app(config)
+    app.app_context().push()
+
+
+def _run_partition(partition, repair):
+    archived, cycle_ids = partition
+    return reconcile_partition(archived, cycle_ids, repair=repair)
+
+
+def reconcile(repair=False, workers=1, partition='cycle', cycles_per_task=50):
+    """Rapproche tous les groupes et cycles ; retourne le résumé cumulé des partitions"""
+    partitions = plan_partitions(partition, cycles_per_task)
+    if workers > 1 and len(partitions) > 1:
+        # Les connexions héritées ne sont pas partagées avec les processus du pool
+        db.session.remove()
+        config = {'SQLALCHEMY_DATABASE_URI': current_app.config['SQLALCHEMY_DATABASE_URI']}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+            results = list(pool.map(_run_partition, partitions, repeat(repair)))
+    else:
+        results = [_run_partition(item, repair) for item in partitions]
+
+    totals = Counter(partitions=len(partitions))
+    drifts = []
+    for result in results:
+        drifts.extend(result.pop('drifts'))
+        totals.update(result)
+    totals['drifted_groups'] = len({group_id for group_id, *_ in drifts})
+    return totals, drifts
@@ -0,0 +1,128 @@
+"""File de travaux différés stockée dans la table ``jobs``.
+
+Les producteurs (planificateur de cycles...) insèrent leurs travaux en masse
+avec ``enqueue_many`` dans leur propre transaction. ``flask jobs work`` les
+exécute ensuite par lots regroupés par type : le gestionnaire enregistré avec
+``@handler('type')`` reçoit la liste des payloads du lot. Si le gestionnaire
+lève une exception, le lot entier est annulé puis retenté plus tard.
+
+``claim`` et ``retry_state`` servent aussi aux autres files construites sur
+le même schéma de colonnes (status, attempts, run_after), comme les SMS
+sortants de ``jobs.sms``.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from models import db, Job
+
+logger = logging.getLogger('avec.jobs')
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=5)
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Enregistre le gestionnaire d'un type de travail."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue_many(kind, payloads, run_after=None):
+    """Insère un travail par payload en un seul INSERT ; la validation reste à l'appelant."""
+    if not payloads:
+        return 0
+    now = datetime.utcnow()
+    db.session.execute(Job.__table__.insert(), [{
+        'kind': kind,
+        'payload': payload,
+        'status': 'pending',
+        'attempts': 0,
+        'run_after': run_after or now,
+        'created_at': now,
+    } for payload in payloads])
+    return len(payloads)
+
+
+def claim(model, batch_size, now, *criteria, columns=None, lease=None):
+    """Réserve un lot de lignes échues de ``model`` (pending, run_after dépassé), les plus anciennes d'abord.
+
+    Retourne les objets du modèle, ou les lignes ``columns`` si elles sont
+    données. Les lignes restent verrouillées jusqu'au commit de l'appelant ;
+    avec ``lease``, elles sont aussitôt repoussées de ce délai et validées,
+    ce qui les masque aux autres workers pendant un traitement hors
+    transaction (appels réseau).
+    """
+    query = db.select(*columns) if columns else db.select(model)
+    query = query.where(
+        model.status == 'pending', model.run_after <= now, *criteria
+    ).order_by(model.run_after, model.id).limit(batch_size)
+    if db.engine.dialect.name == 'postgresql':
+        # Plusieurs workers peuvent tourner : chacun saute les lignes déjà prises
+        query = query.with_for_update(skip_locked=True)
+    result = db.session.execute(query)
+    rows = result.all() if columns else result.scalars().all()
+    if rows and lease is not None:
+        db.session.execute(
+            db.update(model)
+            .where(model.id.in_([row.id for row in rows]))
+            .values(run_after=now + lease)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+    return rows
+
+
+def retry_state(attempts, now, max_attempts=MAX_ATTEMPTS, delay=RETRY_DELAY):
+    """(statut, prochain essai) après ``attempts`` essais infructueux : délai croissant, puis abandon"""
+    return ('failed' if attempts >= max_attempts else 'pending'), now + delay * attempts
+
+
+def _due(now):
+    return Job.query.filter(Job.status == 'pending', Job.run_after <= now)
+
+
+def _claim(kind, batch_size, now):
+    return claim(Job, batch_size, now, Job.kind == kind)
+
+
+def _record_failure(job_ids, error, now):
+    for job in Job.query.filter(Job.id.in_(job_ids)):
+        job.attempts += 1
+        job.last_error = error
+        job.status, job.run_after = retry_state(job.attempts, now)
+
+
+def run_pending(batch_size=500, now=None):
+    """Exécute un lot de travaux échus par type ; retourne {type: (réussis, en échec)}."""
+    now = now or datetime.utcnow()
+    kinds = [kind for (kind,) in _due(now).with_entities(Job.kind).distinct()]
+
+    results = {}
+    for kind in kinds:
+        # Les lignes du lot restent verrouillées jusqu'au commit qui les marque
+        jobs = _claim(kind, batch_size, now)
+        if not jobs:
+            continue
+        job_ids = [job.id for job in jobs]
+        try:
+            if kind not in HANDLERS:
+                raise LookupError(f'Aucun gestionnaire pour le type {kind}')
+            HANDLERS[kind]([job.payload for job in jobs])
+            for job in jobs:
+                job.attempts += 1
+                job.status = 'done'
+                job.processed_at = now
+            db.session.commit()
+            results[kind] = (len(jobs), 0)
+        except Exception as exc:
+            # Annule aussi les écritures partielles du gestionnaire
+            db.session.rollback()
+            logger.exception('Échec du lot %s (%d travaux)', kind, len(jobs))
+            _record_failure(job_ids, str(exc), now)
+            db.session.commit()
+            results[kind] = (0, len(jobs))
+    return results
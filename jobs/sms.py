@@ -0,0 +1,384 @@
+"""File des SMS sortants stockée dans la table ``sms_outbox``.
+
+Aucun SMS n'est envoyé pendant une requête : les pages et les travaux ne font
+qu'insérer des lignes avec ``enqueue_sms`` (une seule fois par destinataire et
+par clé de déduplication). ``flask sms schedule`` ajoute les rappels de
+réunion, les retards de remboursement et les fins de cycle ; ``flask sms
+send`` vide la file par lots : les messages d'un même numéro sont regroupés
+en un seul SMS, le débit est limité à ``SMS_RATE_PER_SECOND`` et les échecs
+sont retentés plus tard, message par message.
+
+La passerelle est choisie par ``SMS_GATEWAY`` : ``file:chemin`` écrit les SMS
+dans un fichier JSON Lines (développement, démonstrations hors connexion), une
+URL ``http(s)://`` les envoie au fournisseur par lots JSON.
+
+La réservation des lots et le calcul des nouvelles tentatives sont ceux de la
+file de travaux (``jobs.queue.claim`` et ``retry_state``).
+"""
+import json
+import logging
+import os
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from jobs.queue import claim, retry_state
+from models import db, User, Group, Cycle, Meeting, Transaction, SmsMessage, user_groups
+
+logger = logging.getLogger('avec.sms')
+
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=10)
+# Trois segments de 153 caractères : au-delà, les messages d'un numéro partent en plusieurs SMS
+MAX_SMS_LENGTH = 459
+SEPARATOR = '\n'
+
+MEETING_REMINDER_WINDOW = timedelta(hours=24)
+CYCLE_END_WINDOW = timedelta(days=7)
+# Un prêt en retard est rappelé au plus une fois par période
+OVERDUE_REMINDER_PERIOD_DAYS = 7
+# Un lot pris par un expéditeur est masqué aux autres pendant ce délai ;
+# s'il s'arrête en cours d'envoi, les messages non marqués reviennent ensuite
+CLAIM_LEASE = timedelta(minutes=15)
+
+# INSERT qui ignore les doublons (user_id, dedup_key) déjà en file
+CONFLICT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+class Gateway(ABC):
+    """Passerelle d'envoi : ``send`` reçoit au plus ``max_batch`` SMS.
+
+    Chaque SMS est un dict ``{'ref', 'to', 'body'}`` ; ``send`` retourne pour
+    chacun ``(True, identifiant du fournisseur)`` ou ``(False, erreur)``. Une
+    exception marque tout le lot en échec.
+    """
+    max_batch = 100
+
+    @abstractmethod
+    def send(self, messages):
+        """Envoie les SMS ; retourne un résultat par SMS, dans l'ordre"""
+
+
+class FileGateway(Gateway):
+    """Écrit les SMS dans un fichier JSON Lines au lieu de les envoyer"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, messages):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        now = datetime.utcnow().isoformat()
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            for message in messages:
+                handle.write(json.dumps(dict(message, sent_at=now), ensure_ascii=False) + '\n')
+        return [(True, f'file-{message["ref"]}') for message in messages]
+
+
+class HttpGateway(Gateway):
+    """POST JSON ``{"messages": [...]}`` ; réponse attendue ``{"results": [{"ok", "id"|"error"}]}``"""
+
+    def __init__(self, url, token=None, timeout=15):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'messages': messages}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        if self.token:
+            request.add_header('Authorization', f'Bearer {self.token}')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            results = json.load(response).get('results', [])
+        if len(results) != len(messages):
+            raise ValueError(f'{len(results)} résultat(s) pour {len(messages)} SMS')
+        return [(True, str(result.get('id', ''))) if result.get('ok')
+                else (False, str(result.get('error', 'refusé')))
+                for result in results]
+
+
+def get_gateway(spec):
+    """Construit la passerelle décrite par SMS_GATEWAY"""
+    if spec.startswith(('http://', 'https://')):
+        return HttpGateway(spec, token=os.getenv('SMS_GATEWAY_TOKEN'))
+    if spec.startswith('file:'):
+        return FileGateway(spec[len('file:'):])
+    raise ValueError(f'Passerelle SMS inconnue : {spec}')
+
+
+class RateLimiter:
+    """Seau à jetons : au plus ``rate`` SMS par seconde, rafales comprises"""
+
+    def __init__(self, rate, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = rate
+        self.updated = clock()
+
+    def acquire(self, count):
+        if not self.rate:
+            return
+        while True:
+            now = self.clock()
+            self.tokens = min(max(self.rate, count), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= count:
+                self.tokens -= count
+                return
+            self.sleep((count - self.tokens) / self.rate)
+
+
+def enqueue_sms(rows):
+    """Met en file les SMS absents de la file pour (user_id, dedup_key) ; retourne le nombre ajouté.
+
+    Chaque ligne contient user_id, phone, kind, body et dedup_key. La
+    validation reste à l'appelant.
+    """
+    unique = OrderedDict()
+    for row in rows:
+        if row.get('phone'):
+            unique.setdefault((row['user_id'], row['dedup_key']), row)
+    if not unique:
+        return 0
+
+    existing = set()
+    user_ids = {user_id for user_id, _ in unique}
+    keys = {key for _, key in unique}
+    for pair in db.session.execute(
+        db.select(SmsMessage.user_id, SmsMessage.dedup_key)
+        .where(SmsMessage.user_id.in_(user_ids), SmsMessage.dedup_key.in_(keys))
+    ):
+        existing.add(tuple(pair))
+
+    now = datetime.utcnow()
+    # La lecture ci-dessus écarte l'essentiel des doublons ; un envoi concurrent
+    # (deux flask sms schedule) peut encore insérer les mêmes clés entre-temps
+    missing = [{
+        'user_id': row['user_id'],
+        'phone': row['phone'],
+        'kind': row['kind'],
+        'body': row['body'][:480],
+        'dedup_key': row['dedup_key'],
+        'status': 'pending',
+        'attempts': 0,
+        'run_after': now,
+        'created_at': now,
+    } for pair, row in unique.items() if pair not in existing]
+    if not missing:
+        return 0
+    outbox = SmsMessage.__table__
+    insert = CONFLICT_INSERTS.get(db.engine.dialect.name)
+    if insert is not None:
+        result = db.session.execute(
+            insert(outbox).on_conflict_do_nothing(index_elements=['user_id', 'dedup_key']), missing)
+        # rowcount n'est pas garanti pour un executemany selon le pilote
+        return result.rowcount if result.rowcount >= 0 else len(missing)
+    # Autres bases : un point de sauvegarde par ligne, un doublon n'annule que sa ligne
+    added = 0
+    for row in missing:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(outbox.insert(), row)
+            added += 1
+        except IntegrityError:
+            pass
+    return added
+
+
+def _members_with_phone(group_ids):
+    """{group_id: [(user_id, phone)]} des membres actifs joignables par SMS"""
+    members = {}
+    for group_id, user_id, phone in db.session.execute(
+        db.select(user_groups.c.group_id, User.id, User.phone)
+        .join(User, User.id == user_groups.c.user_id)
+        .where(user_groups.c.group_id.in_(group_ids), User.status == 'active', User.phone.isnot(None), User.phone != '')
+    ):
+        members.setdefault(group_id, []).append((user_id, phone))
+    return members
+
+
+def meeting_reminders(now):
+    """Rappel aux membres des réunions des prochaines 24 heures"""
+    meetings = db.session.execute(
+        db.select(Meeting.id, Meeting.group_id, Meeting.meeting_date, Group.name)
+        .join(Group, Group.id == Meeting.group_id)
+        .where(Meeting.meeting_date > now, Meeting.meeting_date <= now + MEETING_REMINDER_WINDOW,
+               Group.status == 'active')
+    ).all()
+    members = _members_with_phone({meeting.group_id for meeting in meetings})
+    return [{
+        'user_id': user_id,
+        'phone': phone,
+        'kind': 'meeting_reminder',
+        'body': f'AVEC {meeting.name} : réunion le {meeting.meeting_date.strftime("%d/%m à %H:%M")}.',
+        'dedup_key': f'meeting:{meeting.id}',
+    } for meeting in meetings for user_id, phone in members.get(meeting.group_id, [])]
+
+
+def overdue_loans(now):
+    """Avertit les emprunteurs dont le prêt a dépassé son échéance"""
+    loans = db.session.execute(
+        db.select(Transaction.id, Transaction.user_id, Transaction.remaining_balance,
+                  Transaction.due_date, User.phone, Group.name)
+        .join(User, User.id == Transaction.user_id)
+        .join(Group, Group.id == Transaction.group_id)
+        .where(Transaction.type == 'loan', Transaction.status == 'approved',
+               Transaction.remaining_balance > 0, Transaction.due_date < now,
+               User.phone.isnot(None), User.phone != '')
+    ).all()
+    rows = []
+    for loan in loans:
+        days = (now - loan.due_date).days
+        rows.append({
+            'user_id': loan.user_id,
+            'phone': loan.phone,
+            'kind': 'overdue_loan',
+            'body': f'AVEC {loan.name} : votre prêt ({int(loan.remaining_balance)} FCFA restants) '
+                    f'est en retard de {days} jour(s).',
+            'dedup_key': f'loan:{loan.id}:{days // OVERDUE_REMINDER_PERIOD_DAYS}',
+        })
+    return rows
+
+
+def cycle_end_notices(now):
+    """Prévient les membres des groupes dont le cycle se termine dans les 7 jours"""
+    groups = db.session.execute(
+        db.select(Group.id, Cycle.id.label('cycle_id'), Cycle.name, Cycle.end_date)
+        .join(Cycle, Cycle.id == Group.cycle_id)
+        .where(Cycle.status == 'active', Cycle.end_date > now, Cycle.end_date <= now + CYCLE_END_WINDOW)
+    ).all()
+    members = _members_with_phone({group.id for group in groups})
+    return [{
+        'user_id': user_id,
+        'phone': phone,
+        'kind': 'cycle_end',
+        'body': f'AVEC : le cycle {group.name} se termine le {group.end_date.strftime("%d/%m")}. '
+                f'Préparez le partage.',
+        'dedup_key': f'cycle_end:{group.cycle_id}',
+    } for group in groups for user_id, phone in members.get(group.id, [])]
+
+
+def schedule_due_sms(now=None):
+    """Met en file les SMS échus ; retourne {type: nombre ajouté}"""
+    now = now or datetime.utcnow()
+    summary = {}
+    for kind, producer in (('meeting_reminder', meeting_reminders),
+                           ('overdue_loan', overdue_loans),
+                           ('cycle_end', cycle_end_notices)):
+        summary[kind] = enqueue_sms(producer(now))
+    db.session.commit()
+    return summary
+
+
+def _claim(batch_size, now):
+    """Réserve un lot de messages échus (bail CLAIM_LEASE) et le retourne"""
+    return claim(
+        SmsMessage, batch_size, now,
+        columns=(SmsMessage.id, SmsMessage.phone, SmsMessage.body, SmsMessage.attempts),
+        lease=CLAIM_LEASE
+    )
+
+
+def combine(messages):
+    """Regroupe les messages par numéro : [(numéro, texte, [messages])]
+
+    Les textes identiques ne sont envoyés qu'une fois ; un regroupement trop
+    long pour un SMS de MAX_SMS_LENGTH caractères est coupé en plusieurs.
+    """
+    by_phone = OrderedDict()
+    for message in messages:
+        by_phone.setdefault(message.phone, []).append(message)
+
+    outgoing = []
+    for phone, group in by_phone.items():
+        texts, covered, length = [], [], 0
+        for message in group:
+            if message.body in texts:
+                covered.append(message)
+                continue
+            added = len(message.body) + (len(SEPARATOR) if texts else 0)
+            if texts and length + added > MAX_SMS_LENGTH:
+                outgoing.append((phone, SEPARATOR.join(texts), covered))
+                texts, covered, added = [], [], len(message.body)
+                length = 0
+            texts.append(message.body)
+            covered.append(message)
+            length += added
+        outgoing.append((phone, SEPARATOR.join(texts), covered))
+    return outgoing
+
+
+def _record(results, now):
+    """Enregistre le résultat de chaque message en un UPDATE groupé"""
+    outbox = SmsMessage.__table__
+    db.session.execute(
+        outbox.update().where(outbox.c.id == db.bindparam('b_id')).values(
+            status=db.bindparam('b_status'),
+            attempts=db.bindparam('b_attempts'),
+            run_after=db.bindparam('b_run_after'),
+            provider_id=db.bindparam('b_provider_id'),
+            last_error=db.bindparam('b_last_error'),
+            sent_at=db.bindparam('b_sent_at'),
+        ),
+        results
+    )
+    db.session.commit()
+
+
+def send_pending(gateway, batch_size=500, rate=None, now=None, limiter=None):
+    """Envoie un lot de SMS échus ; retourne (messages envoyés, messages en échec, SMS émis)"""
+    now = now or datetime.utcnow()
+    messages = _claim(batch_size, now)
+    if not messages:
+        return 0, 0, 0
+    outgoing = combine(messages)
+    limiter = limiter or RateLimiter(rate)
+
+    sent = failed = 0
+    for start in range(0, len(outgoing), gateway.max_batch):
+        chunk = outgoing[start:start + gateway.max_batch]
+        payload = [{'ref': covered[0].id, 'to': phone, 'body': body} for phone, body, covered in chunk]
+        limiter.acquire(len(payload))
+        try:
+            outcomes = gateway.send(payload)
+        except Exception as exc:
+            logger.exception('Échec de la passerelle SMS (%d SMS)', len(payload))
+            outcomes = [(False, str(exc))] * len(payload)
+
+        results = []
+        for (phone, body, covered), (ok, detail) in zip(chunk, outcomes):
+            for message in covered:
+                attempts = message.attempts + 1
+                if ok:
+                    sent += 1
+                    status, run_after, sent_at, error, provider_id = 'sent', now, now, None, detail
+                else:
+                    failed += 1
+                    status, run_after = retry_state(attempts, now, MAX_ATTEMPTS, RETRY_DELAY)
+                    sent_at, error, provider_id = None, detail, None
+                results.append({
+                    'b_id': message.id,
+                    'b_status': status,
+                    'b_attempts': attempts,
+                    'b_run_after': run_after,
+                    'b_provider_id': provider_id,
+                    'b_last_error': error,
+                    'b_sent_at': sent_at,
+                })
+        # Validé paquet par paquet : un arrêt en cours de lot ne renvoie pas les SMS déjà partis
+        _record(results, now)
+    return sent, failed, len(outgoing)
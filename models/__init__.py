@@ -1,7 +1,15 @@
+import logging
+import math
+from collections import Counter, defaultdict
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
+from models.money import Money, allocate
+
+logger = logging.getLogger('avec.loans')
 
 db = SQLAlchemy()
 
@@ -21,6 +29,13 @@ class User(UserMixin, db.Model):
     last_login = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Index sur lower(...) : recherche par préfixe et tri du sélecteur de membres
+    __table_args__ = (
+        db.Index('ix_users_last_name_lower', db.func.lower(last_name)),
+        db.Index('ix_users_first_name_lower', db.func.lower(first_name)),
+        db.Index('ix_users_village_lower', db.func.lower(village)),
+    )
+    
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
@@ -33,6 +48,37 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.email}>'
 
+def starts_with(expression, prefix):
+    """Filtre par préfixe sous forme d'intervalle, utilisable par un index B-tree"""
+    # expression >= 'dia' AND expression < 'dib' : contrairement à LIKE, ce
+    # filtre passe par l'index sur SQLite comme sur PostgreSQL
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(expression >= prefix, expression < upper_bound)
+
+def archive_table(table, *indexed):
+    """Table ``<table>_archive`` : mêmes colonnes, sans clés étrangères ni valeurs par défaut"""
+    # Hors clé primaire, les colonnes acceptent NULL : flask schema upgrade
+    # peut y reporter sans valeur par défaut les colonnes ajoutées à la table courante
+    name = f'{table.name}_archive'
+    columns = [
+        db.Column(column.name, column.type, primary_key=column.primary_key, autoincrement=False)
+        for column in table.columns
+    ]
+    indexes = [db.Index(f'ix_{name}_{column}', column) for column in indexed]
+    return db.Table(name, db.metadata, *columns, *indexes)
+
+class Archived:
+    """Modèle dont les lignes des cycles clôturés sont déplacées dans ``__archive__`` (flask archive run)"""
+    __archive__ = None
+    
+    @classmethod
+    def history(cls):
+        """Entité en lecture seule sur les lignes courantes et archivées"""
+        rows = db.union_all(
+            db.select(cls.__table__), db.select(cls.__archive__)
+        ).subquery(f'{cls.__tablename__}_history')
+        return db.aliased(cls, rows)
+
 class Cycle(db.Model):
     __tablename__ = 'cycles'
     
@@ -41,10 +87,10 @@ class Cycle(db.Model):
     description = db.Column(db.Text)
     start_date = db.Column(db.DateTime, nullable=False)
     end_date = db.Column(db.DateTime)
-    phase = db.Column(db.String(20), default='preparation')  # preparation, intensive, supervision
+    phase = db.Column(db.String(20), default='preparation')  # preparation, formation, supervision, completed
     status = db.Column(db.String(20), default='active')
-    target_amount = db.Column(db.Numeric(15, 2), default=0)  # Montant en FCFA
-    current_amount = db.Column(db.Numeric(15, 2), default=0)
+    target_amount = db.Column(Money, default=0)  # Montant en FCFA
+    current_amount = db.Column(Money, default=0)  # Épargne cumulée des groupes du cycle
     interest_rate = db.Column(db.Numeric(5, 2), default=0)
     meeting_frequency = db.Column(db.String(20), default='weekly')
     meeting_day = db.Column(db.String(20))
@@ -56,12 +102,127 @@ class Cycle(db.Model):
     is_cycle_completed = db.Column(db.Boolean, default=False)  # Cycle terminé
     profit_sharing_date = db.Column(db.DateTime)  # Date de partage des bénéfices
     
+    # Date du prochain changement de phase (NULL : aucun prévu), lue par flask cycles advance
+    next_transition_at = db.Column(db.DateTime)
+    # Transactions, réunions et formation des groupes déplacées dans les tables *_archive
+    archived_at = db.Column(db.DateTime)
+    
+    # Compteurs dénormalisés pour les listes, tenus à jour par les écritures
+    # sur les groupes et les transactions (voir apply_counter_delta)
+    group_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    attendance_present = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    attendance_expected = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_cycles_status_next_transition', 'status', 'next_transition_at'),
+    )
+    
+    PHASES = ['preparation', 'formation', 'supervision', 'completed']
+    # Début de chaque phase en semaines après start_date ; 'completed' commence à end_date
+    PHASE_START_WEEKS = {'formation': 4, 'supervision': 16}
+    
     groups = db.relationship('Group', backref='cycle', lazy='dynamic')
     
+    @classmethod
+    def phase_starts(cls, start_date, end_date):
+        """Date de début de chaque phase, bornée par la date de fin du cycle"""
+        starts = {'preparation': start_date}
+        for phase, weeks in cls.PHASE_START_WEEKS.items():
+            starts[phase] = start_date + timedelta(weeks=weeks)
+            if end_date and starts[phase] > end_date:
+                starts[phase] = end_date
+        if end_date:
+            starts['completed'] = end_date
+        return starts
+    
+    @classmethod
+    def schedule(cls, start_date, end_date, phase, now):
+        """Retourne (phase due à ``now``, date de la transition suivante ou None)"""
+        # Prend des valeurs simples pour servir aussi aux traitements en masse.
+        # Une phase avancée à la main n'est jamais ramenée en arrière.
+        starts = cls.phase_starts(start_date, end_date)
+        current = cls.PHASES.index(phase) if phase in cls.PHASES else 0
+        due = max(index for index, name in enumerate(cls.PHASES)
+                  if name in starts and starts[name] <= now) if start_date <= now else 0
+        index = max(current, due)
+        
+        next_transition_at = None
+        for name in cls.PHASES[index + 1:]:
+            if name in starts:
+                next_transition_at = starts[name]
+                break
+        return cls.PHASES[index], next_transition_at
+    
+    def reschedule(self, now=None):
+        """Recalcule next_transition_at après une modification des dates ou de la phase"""
+        self.next_transition_at = self.schedule(
+            self.start_date, self.end_date, self.phase, now or datetime.utcnow())[1]
+    
+    @staticmethod
+    def apply_counter_delta(cycle_id, **deltas):
+        """Applique des variations aux compteurs du cycle en un seul UPDATE atomique"""
+        # cycle_id peut être une sous-requête (cycle d'un groupe) : aucune lecture préalable
+        values = {
+            getattr(Cycle, column): getattr(Cycle, column) + delta
+            for column, delta in deltas.items() if delta
+        }
+        if not values:
+            return
+        db.session.execute(
+            db.update(Cycle)
+            .where(Cycle.id == cycle_id)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+    
+    @staticmethod
+    def _counter_sources():
+        """Valeur attendue de chaque compteur (sous-requêtes corrélées) et condition d'écart"""
+        def aggregate(expression):
+            return db.select(expression).where(Group.cycle_id == Cycle.id).scalar_subquery()
+        
+        expected = {
+            'current_amount': aggregate(db.func.coalesce(db.func.sum(Group.total_savings), 0)),
+            'group_count': aggregate(db.func.count(Group.id)),
+            'member_count': aggregate(db.func.coalesce(db.func.sum(Group.current_members), 0)),
+        }
+        drifted = db.or_(
+            Cycle.current_amount.is_(None),
+            *(getattr(Cycle, column) != value for column, value in expected.items())
+        )
+        return expected, drifted
+    
+    @staticmethod
+    def count_drifted_counters(cycle_ids=None):
+        """Nombre de cycles dont les compteurs ne correspondent plus à leurs groupes"""
+        _, drifted = Cycle._counter_sources()
+        statement = db.select(db.func.count(Cycle.id)).where(drifted)
+        if cycle_ids is not None:
+            statement = statement.where(Cycle.id.in_(cycle_ids))
+        return db.session.execute(statement).scalar()
+    
+    @staticmethod
+    def refresh_counters(cycle_ids=None):
+        """Recalcule les compteurs à partir des groupes ; retourne le nombre de cycles corrigés"""
+        expected, drifted = Cycle._counter_sources()
+        statement = db.update(Cycle).where(drifted)
+        if cycle_ids is not None:
+            statement = statement.where(Cycle.id.in_(cycle_ids))
+        return db.session.execute(
+            statement.values(expected).execution_options(synchronize_session=False)
+        ).rowcount
+    
     def get_progress_percentage(self):
         if not self.target_amount or self.target_amount == 0:
             return 0
-        return min((self.current_amount / self.target_amount) * 100, 100)
+        return min(((self.current_amount or 0) / self.target_amount) * 100, 100)
+    
+    def get_attendance_rate(self):
+        """Taux de présence aux réunions pointées du cycle (None si aucune)"""
+        if not self.attendance_expected:
+            return None
+        return self.attendance_present * 100 / self.attendance_expected
     
     def is_cycle_ready_for_sharing(self):
         """Vérifie si le cycle est prêt pour le partage des bénéfices"""
@@ -74,6 +235,9 @@ class Cycle(db.Model):
 
 class Group(db.Model):
     __tablename__ = 'groups'
+    __table_args__ = (
+        db.Index('ix_groups_cycle', 'cycle_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -84,11 +248,11 @@ class Group(db.Model):
     status = db.Column(db.String(20), default='active')
     meeting_location = db.Column(db.String(200))
     meeting_time = db.Column(db.String(10))  # Format "HH:MM"
-    share_value = db.Column(db.Numeric(10, 2), default=0)  # Valeur d'une part en FCFA
-    contribution_amount = db.Column(db.Numeric(10, 2), default=0)  # Contribution mensuelle
-    total_savings = db.Column(db.Numeric(15, 2), default=0)
-    total_loans = db.Column(db.Numeric(15, 2), default=0)
-    solidarity_fund = db.Column(db.Numeric(15, 2), default=0)  # Caisse de solidarité
+    share_value = db.Column(Money, default=0)  # Valeur d'une part en FCFA
+    contribution_amount = db.Column(Money, default=0)  # Contribution mensuelle
+    total_savings = db.Column(Money, default=0)
+    total_loans = db.Column(Money, default=0)
+    solidarity_fund = db.Column(Money, default=0)  # Caisse de solidarité
     cycle_id = db.Column(db.Integer, db.ForeignKey('cycles.id'), nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -100,10 +264,22 @@ class Group(db.Model):
     
     # Règles du groupe AVEC
     loan_interest_rate = db.Column(db.Numeric(5, 2), default=0)  # Taux d'intérêt pour les prêts
-    max_loan_amount = db.Column(db.Numeric(15, 2), default=0)  # Montant maximum de prêt
+    max_loan_amount = db.Column(Money, default=0)  # Montant maximum de prêt
     loan_duration_months = db.Column(db.Integer, default=6)  # Durée maximale de prêt
     solidarity_contribution_rate = db.Column(db.Numeric(5, 2), default=5)  # % pour la solidarité
     
+    # Présences cumulées sur les réunions pointées, et taux sur les plus récentes
+    attendance_present = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    attendance_expected = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    attendance_recent_rate = db.Column(db.Numeric(5, 2))
+    
+    # Verrouillage optimiste : chaque UPDATE ORM vérifie puis incrémente la version
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Nombre de réunions pointées prises en compte dans attendance_recent_rate
+    RECENT_MEETINGS = 4
+    
     members = db.relationship('User', secondary='user_groups', backref=db.backref('groups', lazy='dynamic'))
     transactions = db.relationship('Transaction', backref='group', lazy='dynamic')
     
@@ -119,24 +295,347 @@ class Group(db.Model):
     def get_treasurer(self):
         return User.query.get(self.treasurer_id)
     
+    def is_archived(self):
+        return self.cycle.archived_at is not None
+    
+    def ledger(self):
+        """Entité des transactions du groupe : table courante, et archive si son cycle est archivé"""
+        return Transaction.history() if self.is_archived() else Transaction
+    
+    def meeting_history(self):
+        """Entité des réunions du groupe, archivées comprises si son cycle est archivé"""
+        return Meeting.history() if self.is_archived() else Meeting
+    
+    def _shares_purchases(self, ledger):
+        return db.session.query(ledger).filter(
+            ledger.group_id == self.id,
+            ledger.type == 'shares_purchase',
+            ledger.status == 'completed'
+        )
+    
     def get_total_shares(self):
         """Calcule le nombre total de parts achetées"""
-        shares_transactions = Transaction.query.filter_by(
-            group_id=self.id,
-            type='shares_purchase',
-            status='completed'
+        if not self.share_value:
+            return 0
+        ledger = self.ledger()
+        total = self._shares_purchases(ledger).with_entities(
+            db.func.coalesce(db.func.sum(ledger.amount), 0)).scalar()
+        return total // self.share_value
+    
+    def get_shares_by_member(self):
+        """Nombre de parts de chaque membre en une seule requête : {user_id: parts}"""
+        if not self.share_value:
+            return {}
+        ledger = self.ledger()
+        rows = self._shares_purchases(ledger).with_entities(
+            ledger.user_id, db.func.sum(ledger.amount)
+        ).group_by(ledger.user_id)
+        return {user_id: amount // self.share_value for user_id, amount in rows}
+    
+    @staticmethod
+    def apply_balance_delta(group_id, **deltas):
+        """Applique des variations de soldes en un seul UPDATE atomique"""
+        # UPDATE groups SET total_savings = total_savings + :delta WHERE id = :id
+        # L'addition est faite par la base : deux workers ne peuvent plus
+        # écraser mutuellement leurs mises à jour. Les incréments commutent,
+        # ils ne changent donc pas la version du groupe.
+        values = {
+            getattr(Group, column): getattr(Group, column) + delta
+            for column, delta in deltas.items() if delta
+        }
+        if not values:
+            return
+        # Les objets Group chargés dans la session sont rafraîchis au commit
+        db.session.execute(
+            db.update(Group)
+            .where(Group.id == group_id)
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        # L'épargne du groupe alimente la progression de son cycle
+        Cycle.apply_counter_delta(
+            db.select(Group.cycle_id).where(Group.id == group_id).scalar_subquery(),
+            current_amount=deltas.get('total_savings')
+        )
+    
+    @staticmethod
+    def withdraw_solidarity(group_id, amount):
+        """Débite la caisse de solidarité si son solde suffit ; retourne False sinon"""
+        # Le contrôle du solde et le débit forment un seul UPDATE : deux
+        # décaissements simultanés ne peuvent pas rendre la caisse négative.
+        return db.session.execute(
+            db.update(Group)
+            .where(Group.id == group_id, Group.solidarity_fund >= amount)
+            .values(solidarity_fund=Group.solidarity_fund - amount)
+            .execution_options(synchronize_session=False)
+        ).rowcount == 1
+    
+    def member_exposures(self, user_ids):
+        """Exposition précalculée des membres dans ce groupe : {user_id: {colonne: montant}}"""
+        rows = db.session.execute(
+            db.select(user_groups.c.user_id, *(user_groups.c[column] for column in EXPOSURE_COLUMNS))
+            .where(user_groups.c.group_id == self.id, user_groups.c.user_id.in_(user_ids))
+        ).all()
+        return {row.user_id: {column: row._mapping[column] for column in EXPOSURE_COLUMNS} for row in rows}
+    
+    def available_cash(self):
+        """Caisse disponible pour de nouveaux prêts : l'épargne moins les prêts en cours"""
+        return (self.total_savings or 0) - (self.total_loans or 0)
+    
+    def sharing_capital(self):
+        """Capital partagé en fin de cycle : la caisse disponible plus ce que les membres doivent encore
+        
+        Revient à l'épargne totale (intérêts courus compris) : un prêt ou des
+        intérêts dus ne sont comptés qu'une fois.
+        """
+        return self.available_cash() + (self.total_loans or 0)
+    
+    def loan_decision(self, exposure, amount, cash=None):
+        """Décision sur un prêt de ``amount`` au vu de l'exposition du membre (None s'il n'est pas membre)"""
+        # Plafonds dans l'ordre où ils sont annoncés au membre
+        limits = []
+        if exposure is not None:
+            limits.append(('savings_limit', LOAN_SAVINGS_MULTIPLIER * exposure['savings_balance']
+                           - exposure['loan_outstanding'] - exposure['guarantee_outstanding']))
+        if self.max_loan_amount:
+            limits.append(('group_max', self.max_loan_amount))
+        limits.append(('cash', self.available_cash() if cash is None else cash))
+        limit = max(0, min(value for _, value in limits))
+        
+        if exposure is None:
+            reason, limit = 'not_member', 0
+        elif amount <= 0:
+            reason = 'invalid_amount'
+        elif exposure['savings_balance'] <= 0:
+            reason = 'no_savings'
+        else:
+            reason = next((name for name, value in limits if amount > value), 'eligible')
+        return {
+            'eligible': reason == 'eligible',
+            'reason': reason,
+            'message': LOAN_DECISIONS[reason],
+            'limit': limit,
+        }
+    
+    def amount_owed(self, user_id):
+        """Restant dû du membre (capital et intérêts courus) d'après son exposition précalculée"""
+        exposure = self.member_exposures([user_id]).get(user_id)
+        return exposure['loan_outstanding'] if exposure else 0
+    
+    def loan_eligibility(self, user_id, amount):
+        """Décision immédiate sur une demande de prêt : une lecture de l'exposition du membre"""
+        return self.loan_decision(self.member_exposures([user_id]).get(user_id), amount)
+    
+    @staticmethod
+    def refresh_member_exposure(group_ids):
+        """Recalcule l'exposition des membres des groupes à partir du registre ; retourne le nombre de membres"""
+        scope = user_groups.c.group_id.in_(group_ids)
+        exposures = defaultdict(Counter)
+        rows = db.session.execute(
+            db.select(
+                Transaction.group_id, Transaction.user_id,
+                *(signed_sum(Transaction, EXPOSURE_EFFECTS, column).label(column)
+                  for column in ('savings_balance', 'loan_outstanding'))
+            )
+            .where(Transaction.group_id.in_(group_ids), Transaction.status.in_(APPLIED_STATUSES),
+                   Transaction.type.in_(EXPOSURE_EFFECTS))
+            .group_by(Transaction.group_id, Transaction.user_id)
+        ).all()
+        for row in rows:
+            exposures[(row.group_id, row.user_id)].update(
+                savings_balance=row.savings_balance, loan_outstanding=row.loan_outstanding)
+        # Garanties : part de chaque garant dans le restant dû des prêts ouverts
+        loans = db.session.execute(
+            db.select(Transaction.group_id, Transaction.remaining_balance, Transaction.guarantors)
+            .where(Transaction.group_id.in_(group_ids), Transaction.type == 'loan',
+                   Transaction.status.in_(APPLIED_STATUSES), Transaction.remaining_balance > 0,
+                   Transaction.guarantors.isnot(None))
         ).all()
-        return sum(t.amount / self.share_value for t in shares_transactions)
+        for loan in loans:
+            Transaction._guarantee(exposures, loan.group_id, loan.guarantors, loan.remaining_balance)
+        
+        db.session.execute(
+            user_groups.update().where(scope).values(dict.fromkeys(EXPOSURE_COLUMNS, 0))
+        )
+        updates = [
+            {'b_group_id': group_id, 'b_user_id': user_id,
+             **{f'b_{column}': exposure[column] for column in EXPOSURE_COLUMNS}}
+            for (group_id, user_id), exposure in exposures.items() if any(exposure.values())
+        ]
+        if updates:
+            db.session.execute(
+                user_groups.update().where(
+                    user_groups.c.group_id == db.bindparam('b_group_id'),
+                    user_groups.c.user_id == db.bindparam('b_user_id')
+                ).values({column: db.bindparam(f'b_{column}') for column in EXPOSURE_COLUMNS}),
+                updates
+            )
+        return len(updates)
+    
+    def solidarity_ledger(self):
+        """Mouvements de la caisse, du plus récent au plus ancien, avec le solde après chacun"""
+        source = self.ledger()
+        signed_amount = db.case(
+            (source.type == 'solidarity_disbursement', -source.amount),
+            else_=source.amount
+        )
+        movements = db.and_(
+            source.group_id == self.id,
+            source.type.in_(SOLIDARITY_TYPES),
+            source.status.in_(APPLIED_STATUSES)
+        )
+        # Solde courant calculé par la base (fonction de fenêtre) sur tout
+        # l'historique ; seule la page demandée est ensuite lue.
+        ledger = db.select(
+            source.id,
+            db.func.sum(signed_amount).over(
+                order_by=(source.created_at, source.id),
+                rows=(None, 0)
+            ).label('balance')
+        ).where(movements).subquery()
+        total = db.select(db.func.coalesce(db.func.sum(signed_amount), 0)).where(movements)
+        query = (
+            db.session.query(source, ledger.c.balance)
+            .join(ledger, ledger.c.id == source.id)
+            .options(db.joinedload(source.user))
+            .order_by(source.created_at.desc(), source.id.desc())
+        )
+        return query, db.session.execute(total).scalar()
+    
+    def enroll_members(self, user_ids):
+        """Inscrit plusieurs utilisateurs en un seul INSERT ... SELECT"""
+        # Les comptes inactifs et les membres déjà inscrits sont écartés par
+        # la requête elle-même ; retourne le nombre de lignes insérées.
+        candidates = db.select(
+            User.id,
+            db.literal(self.id),
+            db.literal(datetime.utcnow(), db.DateTime),
+            db.literal('member')
+        ).where(
+            User.id.in_(user_ids),
+            User.status == 'active',
+            ~db.exists().where(
+                user_groups.c.user_id == User.id,
+                user_groups.c.group_id == self.id
+            )
+        )
+        inserted = db.session.execute(
+            user_groups.insert().from_select(
+                ['user_id', 'group_id', 'joined_at', 'role_in_group'], candidates)
+        ).rowcount
+        self.refresh_member_count()
+        Cycle.apply_counter_delta(self.cycle_id, member_count=inserted)
+        return inserted
+    
+    def remove_members(self, user_ids):
+        """Retire des membres en un seul DELETE, retourne le nombre de lignes supprimées"""
+        removed = db.session.execute(
+            user_groups.delete().where(
+                user_groups.c.group_id == self.id,
+                user_groups.c.user_id.in_(user_ids)
+            )
+        ).rowcount
+        self.refresh_member_count()
+        Cycle.apply_counter_delta(self.cycle_id, member_count=-removed)
+        return removed
+    
+    @staticmethod
+    def member_count_values(count):
+        """Valeurs d'UPDATE de current_members et du statut complet/actif pour l'effectif ``count``"""
+        return {
+            'current_members': count,
+            'status': db.case(
+                (db.and_(Group.status == 'active', count >= Group.max_members), 'full'),
+                (db.and_(Group.status == 'full', count < Group.max_members), 'active'),
+                else_=Group.status
+            ),
+        }
+    
+    def refresh_member_count(self):
+        """Recalcule current_members (et le statut complet/actif) à partir de user_groups"""
+        # Le compteur est dérivé de la table d'association dans le même UPDATE :
+        # il ne peut plus dériver, même avec des inscriptions concurrentes.
+        count = db.select(db.func.count()).select_from(user_groups).where(
+            user_groups.c.group_id == self.id
+        ).scalar_subquery()
+        db.session.execute(
+            db.update(Group)
+            .where(Group.id == self.id)
+            .values(Group.member_count_values(count))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.expire(self, ['current_members', 'status'])
+    
+    def get_attendance_rate(self):
+        """Taux de présence du groupe sur toutes ses réunions pointées (None si aucune)"""
+        if not self.attendance_expected:
+            return None
+        return self.attendance_present * 100 / self.attendance_expected
+    
+    @staticmethod
+    def refresh_attendance_trend(group_id):
+        """Recalcule attendance_recent_rate à partir des dernières réunions pointées"""
+        # Lit au plus RECENT_MEETINGS lignes via l'index (group_id, meeting_date)
+        recent = db.select(Meeting.present_count, Meeting.expected_count).where(
+            Meeting.group_id == group_id,
+            Meeting.expected_count > 0
+        ).order_by(Meeting.meeting_date.desc()).limit(Group.RECENT_MEETINGS).subquery()
+        present, expected = db.session.execute(
+            db.select(db.func.sum(recent.c.present_count), db.func.sum(recent.c.expected_count))
+        ).one()
+        db.session.execute(
+            db.update(Group)
+            .where(Group.id == group_id)
+            .values(attendance_recent_rate=round(present * 100 / expected, 2) if expected else None)
+            .execution_options(synchronize_session=False)
+        )
+    
+    def balances_as_of(self, when):
+        """Soldes du groupe et de chaque membre à ``when`` : ({colonne: FCFA}, {user_id: {colonne: FCFA}})
+        
+        Part du dernier instantané de réunion antérieur et n'y ajoute que les
+        mouvements appliqués depuis, sans rejouer tout le registre.
+        """
+        snapshot = MeetingSnapshot.latest(self.id, when)
+        totals, members, since = dict.fromkeys(BALANCE_COLUMNS, 0), {}, None
+        if snapshot:
+            totals, since = snapshot.balances(), snapshot.as_of
+            members = {row.user_id: row.balances() for row in snapshot.members}
+        
+        ledger = self.ledger()
+        member = member_movement(ledger).label('member')
+        movements = db.select(
+            ledger.user_id, ledger.type, member, db.func.sum(ledger.amount)
+        ).where(
+            ledger.group_id == self.id,
+            ledger.type.in_(BALANCE_EFFECTS),
+            ledger.status.in_(APPLIED_STATUSES),
+            applied_at(ledger) <= when
+        ).group_by(ledger.user_id, ledger.type, member)
+        if since is not None:
+            movements = movements.where(applied_at(ledger) > since)
+        for user_id, type_, is_member, amount in db.session.execute(movements):
+            column, sign = BALANCE_EFFECTS[type_]
+            totals[column] += sign * amount
+            if is_member:
+                members.setdefault(user_id, dict.fromkeys(BALANCE_COLUMNS, 0))[column] += sign * amount
+        return totals, members
+    
+    def balance_history(self, since=None):
+        """Instantanés du groupe par date de réunion, pour les courbes d'évolution"""
+        query = MeetingSnapshot.query.filter(MeetingSnapshot.group_id == self.id)
+        if since is not None:
+            query = query.filter(MeetingSnapshot.as_of >= since)
+        return query.order_by(MeetingSnapshot.as_of, MeetingSnapshot.meeting_id).all()
     
     def get_member_shares(self, user_id):
         """Calcule le nombre de parts d'un membre"""
-        shares_transactions = Transaction.query.filter_by(
-            group_id=self.id,
-            user_id=user_id,
-            type='shares_purchase',
-            status='completed'
-        ).all()
-        return sum(t.amount / self.share_value for t in shares_transactions)
+        if not self.share_value:
+            return 0
+        ledger = self.ledger()
+        total = self._shares_purchases(ledger).filter(ledger.user_id == user_id).with_entities(
+            db.func.coalesce(db.func.sum(ledger.amount), 0)).scalar()
+        return total // self.share_value
     
     def __repr__(self):
         return f'<Group {self.name}>'
@@ -145,21 +644,109 @@ user_groups = db.Table('user_groups',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
     db.Column('group_id', db.Integer, db.ForeignKey('groups.id'), primary_key=True),
     db.Column('joined_at', db.DateTime, default=datetime.utcnow),
-    db.Column('role_in_group', db.String(20), default='member')  # member, president, secretary, treasurer
+    db.Column('role_in_group', db.String(20), default='member'),  # member, president, secretary, treasurer
+    # Présences du membre dans ce groupe, tenues à jour par Meeting.record_attendance
+    db.Column('meetings_present', db.Integer, nullable=False, default=0, server_default='0'),
+    db.Column('meetings_recorded', db.Integer, nullable=False, default=0, server_default='0'),
+    # Exposition du membre dans ce groupe (éligibilité aux prêts), tenue à jour par Transaction.apply_exposure
+    db.Column('savings_balance', Money, nullable=False, default=0, server_default='0'),
+    db.Column('loan_outstanding', Money, nullable=False, default=0, server_default='0'),
+    db.Column('guarantee_outstanding', Money, nullable=False, default=0, server_default='0'),
+    # La clé primaire commence par user_id : cet index sert les recherches par groupe
+    db.Index('ix_user_groups_group_user', 'group_id', 'user_id')
 )
 
-class Transaction(db.Model):
+# Effet de chaque type de transaction sur les soldes du groupe : (colonne, signe)
+BALANCE_EFFECTS = {
+    'shares_purchase': ('total_savings', 1),
+    'savings': ('total_savings', 1),
+    'interest': ('total_savings', 1),
+    'loan': ('total_loans', 1),
+    # Intérêts courus (flask interest accrue) : dus par l'emprunteur, en contrepartie d'un 'interest'
+    'interest_charge': ('total_loans', 1),
+    'loan_repayment': ('total_loans', -1),
+    'repayment': ('total_loans', -1),
+    'solidarity': ('solidarity_fund', 1),
+    'solidarity_disbursement': ('solidarity_fund', -1),
+}
+
+# Mouvements de la caisse de solidarité, et statuts pour lesquels ils ont été appliqués au solde
+SOLIDARITY_TYPES = ('solidarity', 'solidarity_disbursement')
+APPLIED_STATUSES = ('approved', 'completed')
+
+# Soldes du groupe repris dans les instantanés de réunion (colonnes de BALANCE_EFFECTS)
+BALANCE_COLUMNS = ('total_savings', 'total_loans', 'solidarity_fund')
+
+# Effet de chaque type de transaction sur l'exposition du membre qui la porte (colonnes de user_groups)
+EXPOSURE_EFFECTS = {
+    'shares_purchase': ('savings_balance', 1),
+    'savings': ('savings_balance', 1),
+    'loan': ('loan_outstanding', 1),
+    'interest_charge': ('loan_outstanding', 1),
+    'loan_repayment': ('loan_outstanding', -1),
+    'repayment': ('loan_outstanding', -1),
+}
+EXPOSURE_COLUMNS = ('savings_balance', 'loan_outstanding', 'guarantee_outstanding')
+REPAYMENT_TYPES = ('loan_repayment', 'repayment')
+
+# Règle AVEC : un membre emprunte au plus trois fois son épargne, déduction
+# faite de ce qu'il doit encore et de ce qu'il garantit pour d'autres
+LOAN_SAVINGS_MULTIPLIER = 3
+LOAN_DECISIONS = {
+    'eligible': 'Prêt accordable',
+    'invalid_amount': 'Montant invalide',
+    'not_member': 'L\'emprunteur n\'est pas membre du groupe',
+    'no_savings': 'L\'emprunteur n\'a pas encore d\'épargne dans le groupe',
+    'savings_limit': f'Montant supérieur à {LOAN_SAVINGS_MULTIPLIER} fois l\'épargne du membre, '
+                     'déduction faite de ses prêts et garanties en cours',
+    'group_max': 'Montant supérieur au plafond de prêt du groupe',
+    'cash': 'Caisse du groupe insuffisante',
+}
+
+def signed_sum(entity, effects, column):
+    """SUM des montants de ``entity`` signés selon ``effects`` ({type: (colonne, signe)}) pour ``column``"""
+    credits = [type_ for type_, (target, sign) in effects.items() if target == column and sign > 0]
+    debits = [type_ for type_, (target, sign) in effects.items() if target == column and sign < 0]
+    return db.func.coalesce(db.func.sum(db.case(
+        (entity.type.in_(credits), entity.amount),
+        (entity.type.in_(debits), -entity.amount),
+        else_=0
+    )), 0)
+
+def parse_guarantors(text):
+    """Identifiants des garants enregistrés dans Transaction.guarantors (« 12,15 »)"""
+    return [int(part) for part in (text or '').split(',') if part.strip().isdigit()]
+
+def applied_at(entity):
+    """Moment où une transaction a modifié les soldes : son approbation, ou sa saisie si elle est créée complétée"""
+    return db.func.coalesce(entity.approved_at, entity.created_at)
+
+def member_movement(entity):
+    """Vrai si le mouvement compte aussi dans les soldes de son membre.
+    
+    Les intérêts courus (``interest`` rattaché à un prêt) sont un revenu du
+    groupe : ils portent l'emprunteur en ``user_id`` mais ne sont pas son épargne.
+    """
+    return db.or_(entity.type != 'interest', entity.loan_id.is_(None))
+
+class Transaction(Archived, db.Model):
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Historiques par groupe et par type (caisse de solidarité, parts...)
+        db.Index('ix_transactions_group_type_created', 'group_id', 'type', 'created_at'),
+        # Une seule écriture d'intérêts par prêt, par période et par type (flask interest accrue)
+        db.Index('uq_transactions_loan_accrual', 'loan_id', 'accrual_period', 'type', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    type = db.Column(db.String(20), nullable=False)  # shares_purchase, loan, loan_repayment, solidarity, interest
-    amount = db.Column(db.Numeric(15, 2), nullable=False)  # Montant en FCFA
+    type = db.Column(db.String(30), nullable=False)  # shares_purchase, loan, loan_repayment, solidarity, solidarity_disbursement, interest, interest_charge
+    amount = db.Column(Money, nullable=False)  # Montant en FCFA
     description = db.Column(db.Text)
     status = db.Column(db.String(20), default='pending')  # pending, approved, completed, rejected
     due_date = db.Column(db.DateTime)
     interest_rate = db.Column(db.Numeric(5, 2), default=0)
     loan_term = db.Column(db.Integer)  # Durée du prêt en mois
-    remaining_balance = db.Column(db.Numeric(15, 2), default=0)
+    remaining_balance = db.Column(Money, default=0)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -170,26 +757,161 @@ class Transaction(db.Model):
     loan_purpose = db.Column(db.String(200))  # Raison du prêt
     guarantors = db.Column(db.Text)  # Garants du prêt
     
+    # Intérêts courus : prêt concerné et période (AAAA-MM) ; sans clé étrangère,
+    # l'archivage déplace les lignes d'un cycle par lots indépendants
+    loan_id = db.Column(db.Integer)
+    accrual_period = db.Column(db.String(7))
+    
     # Transparence AVEC - témoins de la transaction
     witnesses = db.Column(db.Text)  # Membres présents lors de la transaction
     meeting_date = db.Column(db.DateTime)  # Date de la réunion
     meeting_id = db.Column(db.Integer, db.ForeignKey('meetings.id'))  # Réunion associée
     
+    # Verrouillage optimiste : un UPDATE sur une version périmée lève StaleDataError
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+    
     # Relations
     user = db.relationship('User', foreign_keys=[user_id], backref='transactions')
     approved_by_user = db.relationship('User', foreign_keys=[approved_by], backref='approved_transactions')
     
+    def balance_delta(self):
+        """Variations de soldes du groupe induites par cette transaction"""
+        effect = BALANCE_EFFECTS.get(self.type)
+        if not effect:
+            return {}
+        column, sign = effect
+        return {column: sign * self.amount}
+    
+    @staticmethod
+    def _guarantee(exposures, group_id, guarantors, amount, sign=1):
+        """Répartit ``amount`` à parts égales sur les garants d'un prêt"""
+        guarantor_ids = parse_guarantors(guarantors)
+        for guarantor_id, share in zip(guarantor_ids, allocate(amount, [1] * len(guarantor_ids))):
+            exposures[(group_id, guarantor_id)]['guarantee_outstanding'] += sign * share
+    
+    @staticmethod
+    def _settle_loans(group_id, user_id, amount, exposures):
+        """Impute un remboursement sur les dettes ouvertes du membre ; retourne la part non imputée
+        
+        Les prêts sont réglés du plus ancien au plus récent ; pour chacun, les
+        intérêts courus encore dus (``remaining_balance`` de ses lignes
+        ``interest_charge``, par période) passent avant le capital. Les
+        garants ne couvrent que le capital.
+        """
+        charges = defaultdict(list)
+        for charge in db.session.execute(
+            db.select(Transaction.id, Transaction.loan_id, Transaction.remaining_balance)
+            .where(Transaction.group_id == group_id, Transaction.user_id == user_id,
+                   Transaction.type == 'interest_charge', Transaction.status.in_(APPLIED_STATUSES),
+                   Transaction.remaining_balance > 0)
+            .order_by(Transaction.accrual_period, Transaction.id)
+        ):
+            charges[charge.loan_id].append(charge)
+        loans = db.session.execute(
+            db.select(Transaction.id, Transaction.remaining_balance, Transaction.guarantors)
+            .where(Transaction.group_id == group_id, Transaction.user_id == user_id,
+                   Transaction.type == 'loan', Transaction.status.in_(APPLIED_STATUSES),
+                   db.or_(Transaction.remaining_balance > 0, Transaction.id.in_(list(charges))))
+            .order_by(applied_at(Transaction), Transaction.id)
+        ).all()
+        updates = []
+        for loan in loans:
+            for charge in charges.get(loan.id, []):
+                if amount <= 0:
+                    break
+                paid = min(amount, charge.remaining_balance)
+                amount -= paid
+                updates.append({'b_id': charge.id, 'b_remaining_balance': charge.remaining_balance - paid})
+            if amount <= 0:
+                break
+            if not loan.remaining_balance:
+                continue
+            paid = min(amount, loan.remaining_balance)
+            amount -= paid
+            remaining = loan.remaining_balance - paid
+            # Les garants sont libérés de la différence entre leurs parts avant et après
+            Transaction._guarantee(exposures, group_id, loan.guarantors, loan.remaining_balance, -1)
+            Transaction._guarantee(exposures, group_id, loan.guarantors, remaining)
+            updates.append({'b_id': loan.id, 'b_remaining_balance': remaining})
+        if updates:
+            loans_table = Transaction.__table__
+            db.session.execute(
+                loans_table.update().where(loans_table.c.id == db.bindparam('b_id')).values(
+                    remaining_balance=db.bindparam('b_remaining_balance'),
+                    version=loans_table.c.version + 1
+                ),
+                updates
+            )
+        return amount
+    
+    @staticmethod
+    def apply_exposure(transactions):
+        """Répercute des transactions qui viennent d'être appliquées sur l'exposition des membres"""
+        # Comme Group.apply_balance_delta, les variations sont additionnées par
+        # la base (col = col + :delta) : deux approbations simultanées ne
+        # s'écrasent pas. Un prêt engage ses garants pour son restant dû ; un
+        # remboursement réduit le restant dû des prêts ouverts et libère
+        # d'autant leurs garants.
+        exposures = defaultdict(Counter)
+        repayments = Counter()
+        for transaction in transactions:
+            key = (transaction.group_id, transaction.user_id)
+            effect = EXPOSURE_EFFECTS.get(transaction.type)
+            if effect:
+                column, sign = effect
+                exposures[key][column] += sign * transaction.amount
+            if transaction.type == 'loan':
+                Transaction._guarantee(exposures, transaction.group_id, transaction.guarantors,
+                                       transaction.remaining_balance or 0)
+            elif transaction.type in REPAYMENT_TYPES:
+                repayments[key] += transaction.amount
+        for (group_id, user_id), amount in repayments.items():
+            surplus = Transaction._settle_loans(group_id, user_id, amount, exposures)
+            if surplus > 0:
+                # Les routes refusent un remboursement supérieur au restant dû
+                logger.warning('Remboursement non imputé : %s FCFA (groupe %s, membre %s)',
+                               surplus, group_id, user_id)
+        
+        updates = [
+            {'b_group_id': group_id, 'b_user_id': user_id,
+             **{f'b_{column}': deltas[column] for column in EXPOSURE_COLUMNS}}
+            for (group_id, user_id), deltas in exposures.items() if any(deltas.values())
+        ]
+        if updates:
+            db.session.execute(
+                user_groups.update().where(
+                    user_groups.c.group_id == db.bindparam('b_group_id'),
+                    user_groups.c.user_id == db.bindparam('b_user_id')
+                ).values({
+                    column: user_groups.c[column] + db.bindparam(f'b_{column}')
+                    for column in EXPOSURE_COLUMNS
+                }),
+                updates
+            )
+    
     def __repr__(self):
         return f'<Transaction {self.type} {self.amount} FCFA>'
 
-class Meeting(db.Model):
+Transaction.__archive__ = archive_table(Transaction.__table__, 'group_id', 'user_id')
+# Mouvements d'un groupe postérieurs à son dernier instantané (Group.balances_as_of)
+db.Index('ix_transactions_group_applied', Transaction.group_id, applied_at(Transaction))
+
+class Meeting(Archived, db.Model):
     __tablename__ = 'meetings'
+    __table_args__ = (
+        db.Index('ix_meetings_group_date', 'group_id', 'meeting_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
     meeting_date = db.Column(db.DateTime, nullable=False)
     meeting_type = db.Column(db.String(20), default='regular')  # regular, emergency, formation
     attendees_count = db.Column(db.Integer, default=0)
+    # Feuille de présence (meeting_attendances) agrégée à chaque enregistrement
+    present_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    late_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    expected_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     agenda = db.Column(db.Text)
     decisions = db.Column(db.Text)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -199,30 +921,357 @@ class Meeting(db.Model):
     transactions = db.relationship('Transaction', backref='meeting', lazy='dynamic', 
                                  foreign_keys='Transaction.meeting_id')
     
+    def record_attendance(self, member_ids, present_ids, late_ids):
+        """Enregistre la feuille de présence complète et répercute les écarts sur les taux"""
+        # La feuille est remplacée en bloc (un DELETE, un INSERT) ; seules les
+        # différences avec la feuille précédente sont appliquées aux compteurs
+        # du membre, du groupe et du cycle.
+        member_ids = set(member_ids)
+        present_ids = set(present_ids) & member_ids
+        late_ids = set(late_ids) & present_ids
+        attendances = MeetingAttendance.__table__
+        previous = dict(db.session.execute(
+            db.select(attendances.c.user_id, attendances.c.present)
+            .where(attendances.c.meeting_id == self.id)
+        ).all())
+        
+        now = datetime.utcnow()
+        db.session.execute(attendances.delete().where(attendances.c.meeting_id == self.id))
+        if member_ids:
+            db.session.execute(attendances.insert(), [{
+                'meeting_id': self.id,
+                'user_id': user_id,
+                'present': user_id in present_ids,
+                'late': user_id in late_ids,
+                'recorded_at': now,
+            } for user_id in member_ids])
+        
+        member_deltas = []
+        for user_id in member_ids | set(previous):
+            before = (int(previous[user_id]), 1) if user_id in previous else (0, 0)
+            after = (int(user_id in present_ids), 1) if user_id in member_ids else (0, 0)
+            if before != after:
+                member_deltas.append({
+                    'b_user_id': user_id,
+                    'b_present': after[0] - before[0],
+                    'b_recorded': after[1] - before[1],
+                })
+        if member_deltas:
+            db.session.execute(
+                user_groups.update().where(
+                    user_groups.c.group_id == self.group_id,
+                    user_groups.c.user_id == db.bindparam('b_user_id')
+                ).values(
+                    meetings_present=user_groups.c.meetings_present + db.bindparam('b_present'),
+                    meetings_recorded=user_groups.c.meetings_recorded + db.bindparam('b_recorded')
+                ),
+                member_deltas
+            )
+        
+        present_delta = len(present_ids) - (self.present_count or 0)
+        expected_delta = len(member_ids) - (self.expected_count or 0)
+        self.present_count = len(present_ids)
+        self.late_count = len(late_ids)
+        self.expected_count = len(member_ids)
+        self.attendees_count = len(present_ids)
+        
+        # Mêmes UPDATE atomiques que pour les soldes
+        Group.apply_balance_delta(self.group_id, attendance_present=present_delta,
+                                  attendance_expected=expected_delta)
+        Cycle.apply_counter_delta(
+            db.select(Group.cycle_id).where(Group.id == self.group_id).scalar_subquery(),
+            attendance_present=present_delta,
+            attendance_expected=expected_delta
+        )
+        db.session.flush()
+        Group.refresh_attendance_trend(self.group_id)
+    
+    def close(self, now=None):
+        """Clôture la réunion : instantané des soldes du groupe et de ses membres (remplacé si elle est reclôturée)"""
+        now = now or datetime.utcnow()
+        totals, members = db.session.get(Group, self.group_id).balances_as_of(now)
+        MeetingSnapshot.store(self.group_id, [(self.id, self.meeting_date, now, totals, members)])
+    
     def __repr__(self):
-        return f'<Meeting {self.group.name} - {self.meeting_date}>'
+        return f'<Meeting {self.group_id} - {self.meeting_date}>'
+
+Meeting.__archive__ = archive_table(Meeting.__table__, 'group_id')
+
+class MeetingAttendance(Archived, db.Model):
+    """Présence d'un membre à une réunion"""
+    __tablename__ = 'meeting_attendances'
+    __table_args__ = (
+        db.Index('ix_meeting_attendances_user', 'user_id'),
+    )
+    
+    meeting_id = db.Column(db.Integer, db.ForeignKey('meetings.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    present = db.Column(db.Boolean, nullable=False, default=False)
+    late = db.Column(db.Boolean, nullable=False, default=False)
+    recorded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<MeetingAttendance {self.meeting_id} {self.user_id}>'
+
+MeetingAttendance.__archive__ = archive_table(MeetingAttendance.__table__, 'user_id')
+
+class MeetingSnapshot(db.Model):
+    """Soldes d'un groupe à la clôture d'une réunion"""
+    __tablename__ = 'meeting_snapshots'
+    __table_args__ = (
+        db.Index('ix_meeting_snapshots_group_as_of', 'group_id', 'as_of'),
+    )
+    
+    # Sans clé étrangère : l'instantané reste en place quand la réunion est archivée
+    meeting_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
+    meeting_date = db.Column(db.DateTime, nullable=False)
+    # Mouvements appliqués jusqu'à cette date comprise (voir applied_at)
+    as_of = db.Column(db.DateTime, nullable=False)
+    total_savings = db.Column(Money, nullable=False, default=0)
+    total_loans = db.Column(Money, nullable=False, default=0)
+    solidarity_fund = db.Column(Money, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    members = db.relationship(
+        'MemberBalanceSnapshot', lazy='select', viewonly=True,
+        primaryjoin='MeetingSnapshot.meeting_id == foreign(MemberBalanceSnapshot.meeting_id)'
+    )
+    
+    def balances(self):
+        return {column: getattr(self, column) for column in BALANCE_COLUMNS}
+    
+    @staticmethod
+    def latest(group_id, when):
+        """Dernier instantané du groupe antérieur ou égal à ``when`` (une lecture d'index)"""
+        return MeetingSnapshot.query.filter(
+            MeetingSnapshot.group_id == group_id,
+            MeetingSnapshot.as_of <= when
+        ).order_by(MeetingSnapshot.as_of.desc(), MeetingSnapshot.meeting_id.desc()).first()
+    
+    @staticmethod
+    def delete_for_group(group_id, meeting_ids=None):
+        """Supprime les instantanés (groupe et membres) du groupe, ou de certaines de ses réunions"""
+        snapshots, members = MeetingSnapshot.__table__, MemberBalanceSnapshot.__table__
+        member_rows = members.c.group_id == group_id
+        snapshot_rows = snapshots.c.group_id == group_id
+        if meeting_ids is not None:
+            member_rows = db.and_(member_rows, members.c.meeting_id.in_(meeting_ids))
+            snapshot_rows = db.and_(snapshot_rows, snapshots.c.meeting_id.in_(meeting_ids))
+        db.session.execute(members.delete().where(member_rows))
+        db.session.execute(snapshots.delete().where(snapshot_rows))
+    
+    @staticmethod
+    def store(group_id, snapshots):
+        """Écrit des instantanés en deux INSERT groupés, en remplaçant ceux des mêmes réunions.
+        
+        ``snapshots`` : liste de (meeting_id, meeting_date, as_of, {colonne: FCFA},
+        {user_id: {colonne: FCFA}}).
+        """
+        if not snapshots:
+            return
+        MeetingSnapshot.delete_for_group(group_id, [snapshot[0] for snapshot in snapshots])
+        now = datetime.utcnow()
+        db.session.execute(MeetingSnapshot.__table__.insert(), [
+            dict(totals, meeting_id=meeting_id, group_id=group_id, meeting_date=meeting_date,
+                 as_of=as_of, created_at=now)
+            for meeting_id, meeting_date, as_of, totals, members in snapshots
+        ])
+        member_rows = [
+            dict(balances, meeting_id=meeting_id, group_id=group_id, user_id=user_id)
+            for meeting_id, meeting_date, as_of, totals, members in snapshots
+            for user_id, balances in members.items()
+        ]
+        if member_rows:
+            db.session.execute(MemberBalanceSnapshot.__table__.insert(), member_rows)
+    
+    @staticmethod
+    def rebuild(group):
+        """Recalcule les instantanés de toutes les réunions du groupe en un passage sur son registre"""
+        # Chaque réunion couvre ses propres mouvements, même approuvés après
+        # sa date, et tous les mouvements antérieurs
+        ledger, meetings = group.ledger(), group.meeting_history()
+        applied = db.and_(
+            ledger.group_id == group.id,
+            ledger.type.in_(BALANCE_EFFECTS),
+            ledger.status.in_(APPLIED_STATUSES)
+        )
+        last_movement = dict(db.session.execute(
+            db.select(ledger.meeting_id, db.func.max(applied_at(ledger)))
+            .where(applied, ledger.meeting_id.isnot(None))
+            .group_by(ledger.meeting_id)
+        ).all())
+        movements = db.session.execute(
+            db.select(ledger.user_id, ledger.type, ledger.amount, applied_at(ledger).label('applied_at'),
+                      member_movement(ledger).label('member'))
+            .where(applied)
+            .order_by(applied_at(ledger), ledger.id)
+        ).all()
+        
+        totals = dict.fromkeys(BALANCE_COLUMNS, 0)
+        members = {}
+        snapshots, position, as_of = [], 0, None
+        for meeting_id, meeting_date in db.session.execute(
+            db.select(meetings.id, meetings.meeting_date)
+            .where(meetings.group_id == group.id)
+            .order_by(meetings.meeting_date, meetings.id)
+        ):
+            as_of = max(value for value in (meeting_date, last_movement.get(meeting_id), as_of) if value)
+            while position < len(movements) and movements[position].applied_at <= as_of:
+                user_id, type_, amount, _, is_member = movements[position]
+                column, sign = BALANCE_EFFECTS[type_]
+                totals[column] += sign * amount
+                if is_member:
+                    members.setdefault(user_id, dict.fromkeys(BALANCE_COLUMNS, 0))[column] += sign * amount
+                position += 1
+            snapshots.append((meeting_id, meeting_date, as_of, dict(totals),
+                              {user_id: dict(balances) for user_id, balances in members.items()}))
+        
+        MeetingSnapshot.delete_for_group(group.id)
+        MeetingSnapshot.store(group.id, snapshots)
+        return len(snapshots)
+    
+    def __repr__(self):
+        return f'<MeetingSnapshot {self.group_id} {self.meeting_id}>'
+
+class MemberBalanceSnapshot(db.Model):
+    """Part d'un membre dans les soldes de son groupe à la clôture d'une réunion"""
+    __tablename__ = 'member_balance_snapshots'
+    __table_args__ = (
+        db.Index('ix_member_balance_snapshots_user', 'user_id', 'group_id'),
+        db.Index('ix_member_balance_snapshots_group', 'group_id'),
+    )
+    
+    meeting_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
+    # Épargne versée (parts, intérêts), prêts restant dus, contributions nettes à la caisse
+    total_savings = db.Column(Money, nullable=False, default=0)
+    total_loans = db.Column(Money, nullable=False, default=0)
+    solidarity_fund = db.Column(Money, nullable=False, default=0)
+    
+    def balances(self):
+        return {column: getattr(self, column) for column in BALANCE_COLUMNS}
+    
+    def __repr__(self):
+        return f'<MemberBalanceSnapshot {self.meeting_id} {self.user_id}>'
 
 class FormationModule(db.Model):
-    __tablename__ = 'formation_modules'
+    """Module du catalogue de formation, partagé par tous les groupes et versionné"""
+    __tablename__ = 'formation_catalog'
+    __table_args__ = (
+        db.UniqueConstraint('code', 'version', name='uq_formation_catalog_code_version'),
+        db.Index('ix_formation_catalog_active_order', 'is_active', 'order'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(50), nullable=False)  # Identifiant stable entre versions
+    version = db.Column(db.Integer, nullable=False, default=1)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    content = db.Column(db.Text)  # Contenu du module
+    content = db.Column(db.Text)  # Contenu du module, stocké une seule fois
     order = db.Column(db.Integer, default=0)
-    is_completed = db.Column(db.Boolean, default=False)
-    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), nullable=False)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)  # Version proposée aux nouveaux groupes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @staticmethod
+    def publish(code, name, description, content, order):
+        """Publie une nouvelle version si le module a changé ; retourne le module actif"""
+        current = FormationModule.query.filter_by(code=code, is_active=True).first()
+        if current and (current.name, current.description, current.content, current.order) == \
+                (name, description, content, order):
+            return current
+        # Les groupes déjà inscrits gardent la version qu'ils suivent
+        if current:
+            current.is_active = False
+        module = FormationModule(
+            code=code,
+            version=current.version + 1 if current else 1,
+            name=name,
+            description=description,
+            content=content,
+            order=order
+        )
+        db.session.add(module)
+        return module
+    
+    def __repr__(self):
+        return f'<FormationModule {self.code} v{self.version}>'
+
+class GroupFormationProgress(Archived, db.Model):
+    """Avancement d'un groupe sur un module du catalogue"""
+    __tablename__ = 'group_formation_progress'
+    __table_args__ = (
+        # Statistiques par module sur l'ensemble des groupes
+        db.Index('ix_group_formation_progress_module', 'module_id', 'is_completed'),
+    )
+    
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.id'), primary_key=True)
+    module_id = db.Column(db.Integer, db.ForeignKey('formation_catalog.id'), primary_key=True)
+    is_completed = db.Column(db.Boolean, nullable=False, default=False)
     completed_at = db.Column(db.DateTime)
     completed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     
+    module = db.relationship('FormationModule')
+    
+    @staticmethod
+    def enroll_groups(group_ids=None):
+        """Inscrit des groupes (tous par défaut) aux modules actifs en un seul INSERT ... SELECT.
+        
+        Un groupe qui suit déjà une version d'un module (même code) n'est pas inscrit à la
+        suivante ; les groupes des cycles archivés ne sont pas inscrits.
+        """
+        progress = GroupFormationProgress.__table__
+        followed = db.aliased(FormationModule)
+        candidates = db.select(Group.id, FormationModule.id, db.false()).select_from(Group).join(
+            FormationModule, FormationModule.is_active.is_(True)
+        ).join(
+            Cycle, Cycle.id == Group.cycle_id
+        ).where(
+            Cycle.archived_at.is_(None),
+            ~db.exists().where(
+                progress.c.group_id == Group.id,
+                progress.c.module_id == followed.id,
+                followed.code == FormationModule.code
+            )
+        )
+        if group_ids is not None:
+            candidates = candidates.where(Group.id.in_(group_ids))
+        return db.session.execute(
+            progress.insert().from_select(['group_id', 'module_id', 'is_completed'], candidates)
+        ).rowcount
+    
+    @staticmethod
+    def completion_by_module():
+        """Par module actif : (module, groupes inscrits, groupes ayant terminé)"""
+        return db.session.query(
+            FormationModule,
+            db.func.count(GroupFormationProgress.group_id),
+            db.func.coalesce(db.func.sum(db.case((GroupFormationProgress.is_completed, 1), else_=0)), 0)
+        ).outerjoin(
+            GroupFormationProgress, GroupFormationProgress.module_id == FormationModule.id
+        ).filter(
+            FormationModule.is_active.is_(True)
+        ).options(
+            db.defer(FormationModule.content)
+        ).group_by(FormationModule.id).order_by(FormationModule.order).all()
+    
     def __repr__(self):
-        return f'<FormationModule {self.name}>'
+        return f'<GroupFormationProgress {self.group_id} {self.module_id}>'
+
+GroupFormationProgress.__archive__ = archive_table(GroupFormationProgress.__table__)
 
 class CommunityEvaluation(db.Model):
     __tablename__ = 'community_evaluations'
     
+    # Taille d'une maille de la grille géographique (0,1° : environ 11 km)
+    GEO_CELL_DEGREES = 0.1
+    GEO_CELL_COLUMNS = 3600  # 360° de longitude / 0,1°
+    KM_PER_DEGREE = 111.32
+    
     id = db.Column(db.Integer, primary_key=True)
     village_name = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100))
     population = db.Column(db.Integer)
     main_activities = db.Column(db.Text)
     existing_groups = db.Column(db.Text)
@@ -230,6 +1279,211 @@ class CommunityEvaluation(db.Model):
     community_interest = db.Column(db.Boolean, default=False)
     evaluation_date = db.Column(db.DateTime, default=datetime.utcnow)
     evaluated_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer)  # Maille de la grille, calculée à partir des coordonnées
+    
+    __table_args__ = (
+        # Filtres du registre, toujours triés par date décroissante
+        db.Index('ix_community_evaluations_date', 'evaluation_date'),
+        db.Index('ix_community_evaluations_region_date', 'region', 'evaluation_date'),
+        db.Index('ix_community_evaluations_interest_date', 'community_interest', 'evaluation_date'),
+        db.Index('ix_community_evaluations_village_lower', db.func.lower(village_name)),
+        # Recherche « à proximité » : mailles voisines, puis distance exacte
+        db.Index('ix_community_evaluations_geo_cell', 'geo_cell'),
+    )
+    
+    @classmethod
+    def cell_for(cls, latitude, longitude):
+        """Numéro de la maille de la grille qui contient le point"""
+        row = math.floor((latitude + 90) / cls.GEO_CELL_DEGREES)
+        column = math.floor((longitude + 180) / cls.GEO_CELL_DEGREES) % cls.GEO_CELL_COLUMNS
+        return row * cls.GEO_CELL_COLUMNS + column
+    
+    def set_location(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.geo_cell = None if latitude is None or longitude is None else self.cell_for(latitude, longitude)
+    
+    @classmethod
+    def near(cls, latitude, longitude, radius_km, limit=50):
+        """Évaluations à moins de ``radius_km`` du point : [(évaluation, distance en km)], plus proches d'abord"""
+        lat_span = radius_km / cls.KM_PER_DEGREE
+        lon_span = min(radius_km / (cls.KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01)), 180)
+        step = cls.GEO_CELL_DEGREES
+        
+        # Mailles couvrant le rectangle englobant le cercle
+        cells = [
+            cls.cell_for(min(max(lat, -90), 90), lon)
+            for lat in _frange(latitude - lat_span, latitude + lat_span, step)
+            for lon in _frange(longitude - lon_span, longitude + lon_span, step)
+        ]
+        candidates = cls.query.filter(
+            cls.geo_cell.in_(set(cells)),
+            cls.latitude.between(latitude - lat_span, latitude + lat_span)
+        ).all()
+        
+        results = []
+        for evaluation in candidates:
+            distance = _haversine_km(latitude, longitude, evaluation.latitude, evaluation.longitude)
+            if distance <= radius_km:
+                results.append((evaluation, distance))
+        results.sort(key=lambda item: item[1])
+        return results[:limit]
+    
+    def __repr__(self):
+        return f'<CommunityEvaluation {self.village_name}>'
+
+def _frange(start, stop, step):
+    """Points espacés de ``step`` de start à stop, bornes comprises"""
+    count = int(math.floor((stop - start) / step)) + 1
+    return [start + index * step for index in range(count)] + [stop]
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+class RegionEvaluationSummary(db.Model):
+    """Agrégats des évaluations de communautés par région, tenus à jour à chaque évaluation"""
+    __tablename__ = 'region_evaluation_summaries'
+    
+    region = db.Column(db.String(100), primary_key=True)  # '' : région non renseignée
+    evaluation_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    interested_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_population = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    last_evaluation_date = db.Column(db.DateTime)
+    
+    @staticmethod
+    def record(evaluation):
+        """Ajoute une évaluation aux agrégats de sa région (incréments atomiques)"""
+        table = RegionEvaluationSummary.__table__
+        region = evaluation.region or ''
+        date = evaluation.evaluation_date or datetime.utcnow()
+        update = table.update().where(table.c.region == region).values(
+            evaluation_count=table.c.evaluation_count + 1,
+            interested_count=table.c.interested_count + (1 if evaluation.community_interest else 0),
+            total_population=table.c.total_population + (evaluation.population or 0),
+            last_evaluation_date=db.case(
+                (db.or_(table.c.last_evaluation_date.is_(None), table.c.last_evaluation_date < date), date),
+                else_=table.c.last_evaluation_date
+            )
+        )
+        if db.session.execute(update).rowcount:
+            return
+        try:
+            # Première évaluation de la région ; si une autre requête vient de
+            # créer la ligne, on retombe sur l'incrément
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(
+                    region=region,
+                    evaluation_count=1,
+                    interested_count=1 if evaluation.community_interest else 0,
+                    total_population=evaluation.population or 0,
+                    last_evaluation_date=date
+                ))
+        except IntegrityError:
+            db.session.execute(update)
+    
+    @staticmethod
+    def refresh():
+        """Recalcule tous les agrégats à partir des évaluations"""
+        region = db.func.coalesce(CommunityEvaluation.region, '')
+        rows = db.session.execute(
+            db.select(
+                region,
+                db.func.count(CommunityEvaluation.id),
+                db.func.sum(db.case((CommunityEvaluation.community_interest, 1), else_=0)),
+                db.func.coalesce(db.func.sum(CommunityEvaluation.population), 0),
+                db.func.max(CommunityEvaluation.evaluation_date)
+            ).group_by(region)
+        ).all()
+        table = RegionEvaluationSummary.__table__
+        db.session.execute(table.delete())
+        if rows:
+            db.session.execute(table.insert(), [
+                {
+                    'region': row[0],
+                    'evaluation_count': row[1],
+                    'interested_count': row[2] or 0,
+                    'total_population': row[3],
+                    'last_evaluation_date': row[4],
+                }
+                for row in rows
+            ])
+        return len(rows)
+    
+    def get_interest_rate(self):
+        if not self.evaluation_count:
+            return 0
+        return self.interested_count * 100 / self.evaluation_count
+    
+    def __repr__(self):
+        return f'<RegionEvaluationSummary {self.region}>'
+
+class Notification(db.Model):
+    __tablename__ = 'notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    type = db.Column(db.String(20), default='info')  # info, success, warning, danger
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text)
+    url = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    read_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_notifications_user_read', 'user_id', 'read_at'),
+    )
+    
+    def __repr__(self):
+        return f'<Notification {self.user_id} {self.title}>'
+
+class Job(db.Model):
+    """Travail différé exécuté par flask jobs work"""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+    
+    def __repr__(self):
+        return f'<Job {self.kind} {self.status}>'
+
+class SmsMessage(db.Model):
+    """SMS sortant, envoyé par flask sms send (jamais pendant une requête)"""
+    __tablename__ = 'sms_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    phone = db.Column(db.String(20), nullable=False)
+    kind = db.Column(db.String(30), nullable=False)  # meeting_reminder, overdue_loan, cycle_end, notification
+    body = db.Column(db.String(480), nullable=False)
+    # Un même avis n'est mis en file qu'une fois par destinataire
+    dedup_key = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    provider_id = db.Column(db.String(100))  # Identifiant rendu par la passerelle
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'dedup_key', name='uq_sms_outbox_user_dedup'),
+        db.Index('ix_sms_outbox_status_run_after', 'status', 'run_after'),
+    )
     
     def __repr__(self):
-        return f'<CommunityEvaluation {self.village_name}>' 
\ No newline at end of file
+        return f'<SmsMessage {self.kind} {self.phone} {self.status}>'
\ No newline at end of file
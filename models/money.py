@@ -0,0 +1,66 @@
+"""Montants en FCFA, stockés et manipulés en entiers.
+
+Le franc CFA n'a pas de subdivision : tous les montants sont des ``int``
+Python et des colonnes BIGINT en base. Les sommes, les contrôles de
+multiples de part et les partages se font ainsi sans erreur d'arrondi
+flottant ni conversion Decimal.
+"""
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy.types import BigInteger, TypeDecorator
+
+
+def to_amount(value):
+    """Convertit une valeur numérique en montant entier ; refuse les fractions de franc."""
+    if isinstance(value, bool):
+        raise ValueError('Montant invalide')
+    if isinstance(value, int):
+        return value
+    try:
+        decimal_value = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'Montant invalide : {value!r}')
+    if not decimal_value.is_finite() or decimal_value != decimal_value.to_integral_value():
+        raise ValueError(f'Montant non entier : {value!r}')
+    return int(decimal_value)
+
+
+def parse_amount(text):
+    """Lit un montant saisi dans un formulaire (« 10 000 », « 1500 », « 1500.00 »)."""
+    if text is None:
+        raise ValueError('Montant manquant')
+    # Séparateurs de milliers : espace, espace insécable, espace fine insécable
+    for separator in (' ', '\xa0', '\u202f'):
+        text = str(text).replace(separator, '')
+    return to_amount(text)
+
+
+def allocate(total, weights):
+    """Répartit ``total`` au prorata de ``weights`` en entiers dont la somme vaut exactement ``total``.
+
+    Chacun reçoit la partie entière de sa part ; les francs restants vont aux
+    plus grands restes (méthode du plus fort reste).
+    """
+    weight_sum = sum(weights)
+    if weight_sum <= 0:
+        return [0] * len(weights)
+    allocations = [total * weight // weight_sum for weight in weights]
+    remainders = [total * weight % weight_sum for weight in weights]
+    leftover = total - sum(allocations)
+    for index in sorted(range(len(weights)), key=lambda i: remainders[i], reverse=True)[:leftover]:
+        allocations[index] += 1
+    return allocations
+
+
+class Money(TypeDecorator):
+    """Colonne de montant en FCFA (BIGINT)."""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_amount(value)
+
+    def process_result_value(self, value, dialect):
+        # Les anciennes lignes SQLite (NUMERIC) peuvent encore être lues en flottant
+        return None if value is None else int(value)
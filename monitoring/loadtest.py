@@ -0,0 +1,111 @@
+"""Test de charge minimal (bibliothèque standard uniquement).
+
+Utilisation, contre une instance lancée par gunicorn :
+    python -m monitoring.loadtest http://127.0.0.1:8000 \\
+        --login admin@avec.com:admin123 --concurrency 32 --duration 20 \\
+        /notifications/api/unread-count /dashboard
+
+Chaque client virtuel se connecte, puis enchaîne les chemins donnés en
+boucle. Le débit (requêtes/s), les percentiles de latence et les erreurs
+permettent de comparer deux profils de serveur (workers sync et gthread)
+à nombre de processus égal.
+"""
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+from monitoring.perf import percentile
+
+
+class Client:
+    """Connexion persistante avec son cookie de session"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        if body is not None:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Connexion fermée par le serveur (keepalive, worker recyclé) : on rouvre
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+    def login(self, email, password):
+        self.request('POST', '/auth/login', urlencode({'email': email, 'password': password}))
+
+
+def run(base_url, paths, concurrency, duration, login=None):
+    """Lance la charge ; retourne (latences en ms triées, nombre d'erreurs, durée réelle)"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    ready = threading.Barrier(concurrency + 1)
+
+    def worker():
+        client = Client(base_url)
+        if login:
+            client.login(*login)
+        ready.wait()
+        deadline = time.perf_counter() + duration
+        local, failed, index = [], 0, 0
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                status = client.request('GET', path)
+            except (http.client.HTTPException, OSError):
+                status = 599
+            local.append((time.perf_counter() - started) * 1000)
+            if status >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    # Départ commun une fois tous les clients connectés
+    ready.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors[0], time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Test de charge HTTP minimal.')
+    parser.add_argument('base_url')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--login', help='email:mot_de_passe')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    login = tuple(args.login.split(':', 1)) if args.login else None
+    latencies, errors, elapsed = run(args.base_url, args.paths, args.concurrency, args.duration, login)
+    print(f'{len(latencies)} requêtes en {elapsed:.1f} s : {len(latencies) / elapsed:.1f} req/s, '
+          f'{errors} erreur(s)')
+    print(f'latence p50={percentile(latencies, 50):.1f} ms  p95={percentile(latencies, 95):.1f} ms  '
+          f'p99={percentile(latencies, 99):.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
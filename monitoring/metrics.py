@@ -0,0 +1,156 @@
+"""Métriques Prometheus : requêtes HTTP, pool de connexions, SQL et métier.
+
+Sous gunicorn, chaque worker est un processus distinct. Lorsque la variable
+``PROMETHEUS_MULTIPROC_DIR`` pointe vers un répertoire partagé, chaque
+processus y écrit ses valeurs et ``/metrics`` agrège l'ensemble des workers
+(voir ``gunicorn.conf.py`` pour le nettoyage du répertoire).
+"""
+import os
+import time
+
+from flask import g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    REGISTRY, generate_latest, multiprocess,
+)
+from sqlalchemy import event
+
+from models import db
+from monitoring import perf
+
+REQUESTS = Counter(
+    'avec_http_requests_total', 'Requêtes HTTP traitées',
+    ['blueprint', 'method', 'status'])
+REQUEST_LATENCY = Histogram(
+    'avec_http_request_duration_seconds', 'Durée des requêtes HTTP',
+    ['blueprint'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+DB_CHECKOUT_DURATION = Histogram(
+    'avec_db_pool_checkout_duration_seconds',
+    "Durée pendant laquelle une connexion reste empruntée au pool",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5))
+DB_CHECKED_OUT = Gauge(
+    'avec_db_pool_checked_out', 'Connexions actuellement empruntées',
+    multiprocess_mode='livesum')
+DB_OVERFLOW = Gauge(
+    'avec_db_pool_overflow', 'Connexions ouvertes au-delà de pool_size',
+    multiprocess_mode='livesum')
+DB_OVERFLOW_CHECKOUTS = Counter(
+    'avec_db_pool_overflow_checkouts_total',
+    'Emprunts servis par une connexion de débordement')
+SLOW_QUERIES = Counter(
+    'avec_db_slow_queries_total', 'Requêtes SQL au-delà du seuil SLOW_QUERY_MS',
+    ['blueprint'])
+
+TRANSACTIONS_CREATED = Counter(
+    'avec_transactions_created_total', 'Transactions créées (rate() pour le débit par minute)',
+    ['type'])
+TRANSACTIONS_APPROVED = Counter(
+    'avec_transactions_approved_total', 'Transactions approuvées (rate() pour le débit par minute)',
+    ['type'])
+SHARE_PURCHASES = Counter(
+    'avec_share_purchases_total', 'Achats de parts enregistrés')
+SHARES_PURCHASED = Counter(
+    'avec_shares_purchased_total', 'Nombre de parts achetées')
+MEETINGS_CREATED = Counter(
+    'avec_meetings_created_total', 'Réunions créées')
+
+APP_STARTUP = Gauge(
+    'avec_app_startup_seconds', "Durée de démarrage à froid de l'application (import et create_app)",
+    multiprocess_mode='max')
+
+_slow_query_seconds = 0.2
+
+
+def transaction_created(transaction):
+    TRANSACTIONS_CREATED.labels(type=transaction.type).inc()
+
+
+def transaction_approved(transaction):
+    TRANSACTIONS_APPROVED.labels(type=transaction.type).inc()
+
+
+def transactions_approved(type_, count):
+    TRANSACTIONS_APPROVED.labels(type=type_).inc(count)
+
+
+def shares_purchased(shares):
+    SHARE_PURCHASES.inc()
+    SHARES_PURCHASED.inc(shares)
+
+
+def meeting_created():
+    MEETINGS_CREATED.inc()
+
+
+def startup_completed(seconds):
+    APP_STARTUP.set(seconds)
+
+
+def render():
+    """Retourne (corps, content-type) au format texte Prometheus."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _blueprint():
+    return request.blueprint or 'app'
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('metrics_start', None)
+    if started is not None:
+        blueprint = _blueprint()
+        REQUEST_LATENCY.labels(blueprint=blueprint).observe(time.perf_counter() - started)
+        REQUESTS.labels(blueprint=blueprint, method=request.method,
+                        status=response.status_code).inc()
+    return response
+
+
+def _observe_query(elapsed, statement, parameters, context):
+    if elapsed >= _slow_query_seconds:
+        SLOW_QUERIES.labels(blueprint=_blueprint() if has_request_context() else 'cli').inc()
+
+
+def _watch_pool(pool):
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['metrics_checkout'] = time.perf_counter()
+        DB_CHECKED_OUT.inc()
+        # Seul QueuePool (PostgreSQL) connaît la notion de débordement
+        overflow = pool.overflow() if hasattr(pool, 'overflow') else 0
+        DB_OVERFLOW.set(max(overflow, 0))
+        if overflow > 0:
+            DB_OVERFLOW_CHECKOUTS.inc()
+
+    event.listen(pool, 'checkout', on_checkout)
+    event.listen(pool, 'checkin', _on_checkin)
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    started = connection_record.info.pop('metrics_checkout', None)
+    if started is not None:
+        DB_CHECKOUT_DURATION.observe(time.perf_counter() - started)
+        DB_CHECKED_OUT.dec()
+
+
+def init_app(app):
+    """Branche les métriques HTTP, pool et SQL sur l'application."""
+    global _slow_query_seconds
+
+    _slow_query_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+
+    with app.app_context():
+        _watch_pool(db.engine.pool)
+    perf.on_query(_observe_query)
+
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
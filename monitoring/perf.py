@@ -0,0 +1,185 @@
+"""Instrumentation des performances par requête.
+
+Pour chaque requête on mesure le nombre de requêtes SQL, le temps SQL total,
+le temps de rendu des templates et le temps total, étiquetés par endpoint.
+Les requêtes lentes sont écrites dans ``logs/perf.log`` et les derniers
+échantillons de chaque endpoint alimentent la page ``/debug/perf``.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from logging.handlers import RotatingFileHandler
+
+from flask import g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+perf_logger = logging.getLogger('avec.perf')
+
+_slow_request_ms = 500
+_listening = False
+# Fonctions appelées après chaque requête SQL : observer(durée_s, statement, paramètres, contexte)
+_query_observers = []
+
+
+class PerfStore:
+    """Derniers échantillons par endpoint (mémoire du processus courant)."""
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, sample):
+        with self._lock:
+            self._samples[endpoint].append(sample)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """Agrège les percentiles par endpoint, du plus lent au plus rapide (p95)."""
+        with self._lock:
+            snapshot = {endpoint: list(samples) for endpoint, samples in self._samples.items()}
+
+        rows = []
+        for endpoint, samples in snapshot.items():
+            wall = sorted(s['wall_ms'] for s in samples)
+            queries = [s['queries'] for s in samples]
+            rows.append({
+                'endpoint': endpoint,
+                'count': len(samples),
+                'p50_ms': percentile(wall, 50),
+                'p95_ms': percentile(wall, 95),
+                'p99_ms': percentile(wall, 99),
+                'max_ms': wall[-1],
+                'avg_queries': sum(queries) / len(queries),
+                'max_queries': max(queries),
+                'avg_sql_ms': sum(s['sql_ms'] for s in samples) / len(samples),
+                'avg_template_ms': sum(s['template_ms'] for s in samples) / len(samples),
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows
+
+
+def percentile(sorted_values, pct):
+    """Percentile par rang le plus proche sur une liste déjà triée."""
+    if not sorted_values:
+        return 0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+store = PerfStore()
+
+
+class TimedTemplate(Template):
+    """Template Jinja qui cumule son temps de rendu dans la requête courante."""
+
+    def render(self, *args, **kwargs):
+        if not has_request_context() or 'perf' not in g:
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            g.perf['template_time'] += time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('perf_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['perf_query_start'].pop()
+    if has_request_context() and 'perf' in g:
+        g.perf['queries'] += 1
+        g.perf['sql_time'] += elapsed
+    for observer in _query_observers:
+        observer(elapsed, statement, parameters, context)
+
+
+def on_query(observer):
+    """Enregistre une fonction appelée avec la durée de chaque requête SQL."""
+    if observer not in _query_observers:
+        _query_observers.append(observer)
+    return observer
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute n'est pas appelé en cas d'erreur : on dépile quand même
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('perf_query_start'):
+        connection.info['perf_query_start'].pop()
+
+
+def _start_timer():
+    g.perf = {
+        'start': time.perf_counter(),
+        'queries': 0,
+        'sql_time': 0.0,
+        'template_time': 0.0,
+    }
+
+
+def _record(response):
+    perf = g.pop('perf', None)
+    if perf is None:
+        return response
+
+    endpoint = request.endpoint or 'unknown'
+    sample = {
+        'wall_ms': (time.perf_counter() - perf['start']) * 1000,
+        'sql_ms': perf['sql_time'] * 1000,
+        'template_ms': perf['template_time'] * 1000,
+        'queries': perf['queries'],
+    }
+    store.record(endpoint, sample)
+
+    response.headers['Server-Timing'] = (
+        f"sql;dur={sample['sql_ms']:.1f}, "
+        f"tpl;dur={sample['template_ms']:.1f}, "
+        f"total;dur={sample['wall_ms']:.1f}"
+    )
+
+    if sample['wall_ms'] >= _slow_request_ms:
+        perf_logger.warning(
+            'requête lente endpoint=%s méthode=%s chemin=%s statut=%s total=%.1fms '
+            'sql=%.1fms requêtes=%d templates=%.1fms',
+            endpoint, request.method, request.path, response.status_code,
+            sample['wall_ms'], sample['sql_ms'], sample['queries'], sample['template_ms'],
+        )
+    return response
+
+
+def init_app(app):
+    """Active l'instrumentation des requêtes sur l'application."""
+    global _slow_request_ms, _listening
+
+    _slow_request_ms = app.config.get('PERF_SLOW_REQUEST_MS', 500)
+    store.max_samples = app.config.get('PERF_MAX_SAMPLES', 1000)
+
+    log_dir = app.config.get('PERF_LOG_DIR', 'logs')
+    if not os.path.exists(log_dir):
+        os.mkdir(log_dir)
+    if not perf_logger.handlers:
+        handler = RotatingFileHandler(
+            os.path.join(log_dir, 'perf.log'), maxBytes=5 * 1024 * 1024, backupCount=5)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        perf_logger.addHandler(handler)
+        perf_logger.setLevel(logging.INFO)
+
+    # Les événements sont écoutés sur la classe Engine : une seule fois par processus
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        _listening = True
+
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(_start_timer)
+    app.after_request(_record)
@@ -0,0 +1,157 @@
+"""Journal des requêtes SQL lentes avec capture du plan d'exécution.
+
+Chaque requête dépassant ``SLOW_QUERY_MS`` est écrite (une ligne JSON) dans
+``logs/slow_queries.jsonl`` avec ses paramètres masqués, l'endpoint et la
+ligne de ``routes/*`` qui l'a déclenchée, ainsi que la sortie de ``EXPLAIN``
+(PostgreSQL) ou ``EXPLAIN QUERY PLAN`` (SQLite). ``flask slow-queries analyze``
+regroupe ensuite ces lignes par empreinte normalisée.
+"""
+import json
+import logging
+import os
+import re
+import traceback
+from datetime import date, datetime
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+
+from flask import has_request_context, request
+
+from monitoring import perf
+
+slow_query_logger = logging.getLogger('avec.slow_queries')
+
+LOG_FILENAME = 'slow_queries.jsonl'
+ROUTES_MARKER = os.sep + 'routes' + os.sep
+# Point de sauvegarde autour d'EXPLAIN (PostgreSQL)
+EXPLAIN_SAVEPOINT = 'avec_slow_query_explain'
+
+_threshold_seconds = 0.2
+_explain = True
+
+
+def redact(value):
+    """Masque les valeurs potentiellement personnelles (texte) en gardant leur forme."""
+    if value is None or isinstance(value, (bool, int, float, Decimal)):
+        return value if not isinstance(value, Decimal) else str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return f'<str:{len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def redact_parameters(parameters):
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    return redact(parameters)
+
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_NAMED_PARAM = re.compile(r'%\(\w+\)s|(?<!:):\w+')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """Normalise une requête : littéraux et paramètres remplacés par ``?``."""
+    normalized = _STRING_LITERAL.sub('?', statement)
+    normalized = _NAMED_PARAM.sub('?', normalized)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+def _route_frame():
+    """Dernière ligne de ``routes/*`` dans la pile d'appel, ou None."""
+    for frame in reversed(traceback.extract_stack()):
+        if ROUTES_MARKER in frame.filename:
+            filename = 'routes/' + frame.filename.rsplit(ROUTES_MARKER, 1)[1]
+            return f'{filename}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def _explain_plan(context, statement, parameters):
+    """Exécute EXPLAIN sur un curseur DBAPI brut (sans repasser par les événements)."""
+    if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    connection = context.root_connection
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+
+    # EXPLAIN passe par la connexion de la requête : sous PostgreSQL, un échec
+    # annulerait toute sa transaction, il est donc isolé dans un point de sauvegarde
+    savepoint = dialect == 'postgresql'
+    cursor = connection.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute(f'SAVEPOINT {EXPLAIN_SAVEPOINT}')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as exc:
+            if savepoint:
+                cursor.execute(f'ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}')
+            return [f'EXPLAIN impossible : {exc}']
+        if savepoint:
+            cursor.execute(f'RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}')
+    finally:
+        cursor.close()
+
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def _observe_query(elapsed, statement, parameters, context):
+    if elapsed < _threshold_seconds or context is None:
+        return
+
+    record = {
+        'at': datetime.utcnow().isoformat(),
+        'duration_ms': round(elapsed * 1000, 2),
+        'statement': statement,
+        'fingerprint': fingerprint(statement),
+        'executemany': bool(context.executemany),
+        'endpoint': request.endpoint if has_request_context() else None,
+        'frame': _route_frame(),
+    }
+    if context.executemany:
+        record['parameters'] = f'<{len(parameters)} lignes>'
+        record['plan'] = None
+    else:
+        record['parameters'] = redact_parameters(parameters)
+        record['plan'] = _explain_plan(context, statement, parameters) if _explain else None
+
+    slow_query_logger.warning(json.dumps(record, ensure_ascii=False))
+
+
+def init_app(app):
+    """Active la journalisation des requêtes SQL lentes."""
+    global _threshold_seconds, _explain
+
+    _threshold_seconds = app.config.get('SLOW_QUERY_MS', 200) / 1000
+    _explain = app.config.get('SLOW_QUERY_EXPLAIN', True)
+
+    log_dir = app.config.get('PERF_LOG_DIR', 'logs')
+    if not os.path.exists(log_dir):
+        os.mkdir(log_dir)
+    if not slow_query_logger.handlers:
+        handler = RotatingFileHandler(
+            os.path.join(log_dir, LOG_FILENAME), maxBytes=10 * 1024 * 1024, backupCount=5)
+        # Une ligne JSON brute par requête, sans préfixe, pour l'analyseur hors ligne
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        slow_query_logger.addHandler(handler)
+        slow_query_logger.setLevel(logging.INFO)
+        slow_query_logger.propagate = False
+
+    perf.on_query(_observe_query)
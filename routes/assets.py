@@ -0,0 +1,34 @@
+import mimetypes
+import os
+
+from flask import Blueprint, abort, request, send_from_directory
+
+from assets import pipeline
+
+bp = Blueprint('assets', __name__, url_prefix='/assets')
+
+# Variantes précompressées, de la plus compacte à la plus répandue
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+@bp.route('/<path:filename>')
+def serve(filename):
+    """Ressource avec empreinte : contenu immuable, cache navigateur d'un an"""
+    if not pipeline.is_built(filename):
+        abort(404)
+    directory = pipeline.dist_dir()
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = None
+    for encoding, suffix in ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.exists(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype,
+                                           max_age=pipeline.MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(directory, filename, mimetype=mimetype, max_age=pipeline.MAX_AGE)
+
+    response.headers['Cache-Control'] = f'public, max-age={pipeline.MAX_AGE}, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
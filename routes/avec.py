@@ -1,10 +1,27 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from models import db, User, Cycle, Group, Transaction, FormationModule, CommunityEvaluation, Meeting
+from models import db, User, Cycle, Group, Transaction, FormationModule, GroupFormationProgress, CommunityEvaluation, RegionEvaluationSummary, Meeting, MeetingAttendance, MeetingSnapshot, BALANCE_COLUMNS, user_groups, starts_with
+from models.money import parse_amount, allocate
+from monitoring import metrics
 from datetime import datetime, timedelta
 
 bp = Blueprint('avec', __name__, url_prefix='/avec')
 
+LEDGER_PER_PAGE = 25
+EVALUATIONS_PER_PAGE = 25
+NEAR_RADIUS_KM = 10
+MAX_NEAR_RADIUS_KM = 100
+
+def parse_coordinate(value, limit):
+    """Coordonnée GPS saisie (virgule ou point décimal) ; None si vide, ValueError si invalide"""
+    value = (value or '').strip().replace(',', '.')
+    if not value:
+        return None
+    coordinate = float(value)
+    if not -limit <= coordinate <= limit:
+        raise ValueError(value)
+    return coordinate
+
 @bp.route('/community-evaluation', methods=['GET', 'POST'])
 @login_required
 def community_evaluation():
@@ -15,29 +32,45 @@ def community_evaluation():
     
     if request.method == 'POST':
         village_name = request.form.get('village_name')
-        population = request.form.get('population')
+        region = (request.form.get('region') or '').strip() or None
+        population = request.form.get('population', type=int)
         main_activities = request.form.get('main_activities')
         existing_groups = request.form.get('existing_groups')
         needs_assessment = request.form.get('needs_assessment')
         community_interest = request.form.get('community_interest') == 'on'
         
+        try:
+            latitude = parse_coordinate(request.form.get('latitude'), 90)
+            longitude = parse_coordinate(request.form.get('longitude'), 180)
+        except ValueError:
+            flash('Coordonnées GPS invalides', 'error')
+            return redirect(url_for('avec.community_evaluation'))
+        if (latitude is None) != (longitude is None):
+            flash('Indiquez la latitude et la longitude', 'error')
+            return redirect(url_for('avec.community_evaluation'))
+        
         evaluation = CommunityEvaluation(
             village_name=village_name,
+            region=region,
             population=population,
             main_activities=main_activities,
             existing_groups=existing_groups,
             needs_assessment=needs_assessment,
             community_interest=community_interest,
+            evaluation_date=datetime.utcnow(),
             evaluated_by=current_user.id
         )
+        evaluation.set_location(latitude, longitude)
         
         db.session.add(evaluation)
+        RegionEvaluationSummary.record(evaluation)
         db.session.commit()
         
         flash('Évaluation de communauté enregistrée avec succès!', 'success')
         return redirect(url_for('avec.community_evaluations'))
     
-    return render_template('avec/community_evaluation.html')
+    regions = RegionEvaluationSummary.query.order_by(RegionEvaluationSummary.region).all()
+    return render_template('avec/community_evaluation.html', regions=regions)
 
 @bp.route('/community-evaluations')
 @login_required
@@ -47,8 +80,53 @@ def community_evaluations():
         flash('Accès réservé aux animateurs', 'error')
         return redirect(url_for('dashboard'))
     
-    evaluations = CommunityEvaluation.query.order_by(CommunityEvaluation.evaluation_date.desc()).all()
-    return render_template('avec/community_evaluations.html', evaluations=evaluations)
+    filters = {
+        key: request.args.get(key, '').strip()
+        for key in ('village', 'region', 'interest', 'date_from', 'date_to', 'lat', 'lon', 'radius')
+    }
+    regions = RegionEvaluationSummary.query.order_by(RegionEvaluationSummary.region).all()
+    
+    # « À proximité » : mailles de la grille autour du point, triées par distance
+    nearby = None
+    if filters['lat'] or filters['lon']:
+        try:
+            latitude = parse_coordinate(filters['lat'], 90)
+            longitude = parse_coordinate(filters['lon'], 180)
+            radius = min(float(filters['radius'] or NEAR_RADIUS_KM), MAX_NEAR_RADIUS_KM)
+            if latitude is None or longitude is None or radius <= 0:
+                raise ValueError
+        except ValueError:
+            flash('Position invalide pour la recherche à proximité', 'error')
+            return redirect(url_for('avec.community_evaluations'))
+        nearby = CommunityEvaluation.near(latitude, longitude, radius)
+    
+    query = CommunityEvaluation.query
+    if filters['village']:
+        query = query.filter(starts_with(db.func.lower(CommunityEvaluation.village_name), filters['village'].lower()))
+    if filters['region']:
+        query = query.filter(CommunityEvaluation.region == filters['region'])
+    if filters['interest'] in ('1', '0'):
+        query = query.filter(CommunityEvaluation.community_interest.is_(filters['interest'] == '1'))
+    try:
+        if filters['date_from']:
+            query = query.filter(CommunityEvaluation.evaluation_date >= datetime.strptime(filters['date_from'], '%Y-%m-%d'))
+        if filters['date_to']:
+            query = query.filter(CommunityEvaluation.evaluation_date
+                                 < datetime.strptime(filters['date_to'], '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Date invalide', 'error')
+        return redirect(url_for('avec.community_evaluations'))
+    
+    page = request.args.get('page', 1, type=int)
+    evaluations = query.order_by(
+        CommunityEvaluation.evaluation_date.desc(), CommunityEvaluation.id.desc()
+    ).paginate(page=page, per_page=EVALUATIONS_PER_PAGE, error_out=False)
+    
+    return render_template('avec/community_evaluations.html',
+                         evaluations=evaluations,
+                         nearby=nearby,
+                         regions=regions,
+                         filters={key: value for key, value in filters.items() if value})
 
 @bp.route('/group/<int:group_id>/shares')
 @login_required
@@ -61,17 +139,18 @@ def group_shares(group_id):
         return redirect(url_for('dashboard'))
     
     # Calculer les parts de chaque membre
-    members_shares = {}
-    for member in group.members:
-        shares = group.get_member_shares(member.id)
-        members_shares[member.id] = shares
-    
-    total_shares = group.get_total_shares()
+    members_shares = group.get_shares_by_member()
+    total_shares = sum(members_shares.values())
+    ledger = group.ledger()
+    shares_transactions = db.session.query(ledger).filter(
+        ledger.group_id == group_id, ledger.type == 'shares_purchase'
+    ).order_by(ledger.created_at.desc()).all()
     
     return render_template('avec/group_shares.html', 
                          group=group, 
                          members_shares=members_shares,
-                         total_shares=total_shares)
+                         total_shares=total_shares,
+                         shares_transactions=shares_transactions)
 
 @bp.route('/group/<int:group_id>/shares/purchase', methods=['POST'])
 @login_required
@@ -92,21 +171,21 @@ def purchase_shares(group_id):
         return redirect(url_for('avec.group_shares', group_id=group_id))
     
     try:
-        amount = float(amount)
+        amount = parse_amount(amount)
         meeting_date = datetime.strptime(meeting_date, '%Y-%m-%d')
     except ValueError:
         flash('Format de montant ou date invalide', 'error')
         return redirect(url_for('avec.group_shares', group_id=group_id))
     
     # Vérifier que le montant est un multiple de la valeur de part
-    if amount % group.share_value != 0:
+    if amount <= 0 or not group.share_value or amount % group.share_value != 0:
         flash(f'Le montant doit être un multiple de {group.share_value} FCFA (valeur d\'une part)', 'error')
         return redirect(url_for('avec.group_shares', group_id=group_id))
     
     transaction = Transaction(
         type='shares_purchase',
         amount=amount,
-        description=f'Achat de {amount / group.share_value} part(s)',
+        description=f'Achat de {amount // group.share_value} part(s)',
         group_id=group_id,
         user_id=current_user.id,
         status='completed',
@@ -114,11 +193,14 @@ def purchase_shares(group_id):
         meeting_date=meeting_date
     )
     
-    group.total_savings += amount
+    Group.apply_balance_delta(group_id, total_savings=amount)
+    Transaction.apply_exposure([transaction])
     db.session.add(transaction)
     db.session.commit()
+    metrics.transaction_created(transaction)
+    metrics.shares_purchased(amount // group.share_value)
     
-    flash(f'Achat de {amount / group.share_value} part(s) enregistré!', 'success')
+    flash(f'Achat de {amount // group.share_value} part(s) enregistré!', 'success')
     return redirect(url_for('avec.group_shares', group_id=group_id))
 
 @bp.route('/group/<int:group_id>/meetings')
@@ -131,8 +213,69 @@ def group_meetings(group_id):
         flash('Accès non autorisé', 'error')
         return redirect(url_for('dashboard'))
     
-    meetings = Meeting.query.filter_by(group_id=group_id).order_by(Meeting.meeting_date.desc()).all()
-    return render_template('avec/group_meetings.html', group=group, meetings=meetings)
+    archived = group.is_archived()
+    history = group.meeting_history()
+    meetings = db.session.query(history).filter(history.group_id == group_id).order_by(history.meeting_date.desc()).all()
+    closed = {meeting_id for (meeting_id,) in db.session.query(MeetingSnapshot.meeting_id).filter(
+        MeetingSnapshot.group_id == group_id)}
+    return render_template('avec/group_meetings.html', group=group, meetings=meetings, archived=archived, closed=closed)
+
+@bp.route('/meeting/<int:meeting_id>/close', methods=['POST'])
+@login_required
+def close_meeting(meeting_id):
+    """Clôturer une réunion : enregistre les soldes du groupe et des membres"""
+    meeting = Meeting.query.get_or_404(meeting_id)
+    group = Group.query.get_or_404(meeting.group_id)
+    
+    if current_user.role not in ['admin', 'animateur'] and current_user not in [group.get_president(), group.get_secretary()]:
+        flash('Seuls les membres du comité peuvent clôturer les réunions', 'error')
+        return redirect(url_for('avec.group_meetings', group_id=group.id))
+    
+    meeting.close()
+    db.session.commit()
+    
+    flash(f'Réunion du {meeting.meeting_date.strftime("%d/%m/%Y")} clôturée : soldes enregistrés', 'success')
+    return redirect(url_for('avec.group_meetings', group_id=group.id))
+
+@bp.route('/group/<int:group_id>/balances')
+@login_required
+def group_balances(group_id):
+    """Évolution des soldes du groupe et soldes à une date donnée"""
+    group = Group.query.get_or_404(group_id)
+    
+    if current_user not in group.members and current_user.role not in ['admin', 'animateur']:
+        flash('Accès non autorisé', 'error')
+        return redirect(url_for('dashboard'))
+    
+    as_of = request.args.get('date', '')
+    when = datetime.utcnow()
+    if as_of:
+        try:
+            # Soldes en fin de journée
+            when = datetime.strptime(as_of, '%Y-%m-%d') + timedelta(days=1, microseconds=-1)
+        except ValueError:
+            flash('Format de date invalide', 'error')
+            as_of = ''
+    
+    # Au plus un instantané et les mouvements postérieurs
+    totals, balances = group.balances_as_of(when)
+    names = dict(db.session.query(User.id, User.first_name + ' ' + User.last_name).filter(User.id.in_(balances)))
+    members = sorted(((names.get(user_id, '?'), member_balances) for user_id, member_balances in balances.items()),
+                     key=lambda row: row[0])
+    
+    # Courbes : un point par réunion clôturée, lu dans les instantanés
+    history = group.balance_history()
+    chart = {'labels': [snapshot.meeting_date.strftime('%d/%m/%Y') for snapshot in history]}
+    for column in BALANCE_COLUMNS:
+        chart[column] = [int(getattr(snapshot, column)) for snapshot in history]
+    
+    return render_template('avec/group_balances.html',
+                         group=group,
+                         as_of=as_of,
+                         totals=totals,
+                         members=members,
+                         history=history,
+                         chart=chart)
 
 @bp.route('/group/<int:group_id>/meetings/create', methods=['GET', 'POST'])
 @login_required
@@ -172,12 +315,73 @@ def create_meeting(group_id):
         
         db.session.add(meeting)
         db.session.commit()
+        metrics.meeting_created()
         
         flash('Réunion créée avec succès!', 'success')
         return redirect(url_for('avec.group_meetings', group_id=group_id))
     
     return render_template('avec/create_meeting.html', group=group)
 
+@bp.route('/meeting/<int:meeting_id>/attendance', methods=['GET', 'POST'])
+@login_required
+def meeting_attendance(meeting_id):
+    """Feuille de présence d'une réunion, saisie en une seule fois"""
+    meeting = Meeting.query.get_or_404(meeting_id)
+    group = Group.query.get_or_404(meeting.group_id)
+    
+    if current_user.role not in ['admin', 'animateur'] and current_user.id not in (group.president_id, group.secretary_id):
+        flash('Seuls les membres du comité peuvent saisir les présences', 'error')
+        return redirect(url_for('avec.group_meetings', group_id=group.id))
+    
+    if request.method == 'POST':
+        # Verrou sur la réunion : deux saisies simultanées ne peuvent pas
+        # appliquer deux fois les mêmes écarts aux compteurs. populate_existing :
+        # la réunion est déjà dans la session, il faut relire ses compteurs verrouillés
+        meeting = Meeting.query.filter_by(id=meeting_id).with_for_update().populate_existing().one()
+        member_ids = [user_id for (user_id,) in db.session.execute(
+            db.select(user_groups.c.user_id).where(user_groups.c.group_id == group.id)
+        )]
+        meeting.record_attendance(
+            member_ids,
+            request.form.getlist('present', type=int),
+            request.form.getlist('late', type=int)
+        )
+        db.session.commit()
+        
+        flash(f'Présences enregistrées : {meeting.present_count}/{meeting.expected_count} membres présents', 'success')
+        return redirect(url_for('avec.group_meetings', group_id=group.id))
+    
+    # Membres, taux de présence dans le groupe et pointage existant, en une requête
+    attendance = MeetingAttendance.__table__
+    members = db.session.execute(
+        db.select(
+            User,
+            user_groups.c.meetings_present,
+            user_groups.c.meetings_recorded,
+            attendance.c.present,
+            attendance.c.late
+        )
+        .join(user_groups, user_groups.c.user_id == User.id)
+        .outerjoin(attendance, db.and_(
+            attendance.c.user_id == User.id,
+            attendance.c.meeting_id == meeting.id
+        ))
+        .where(user_groups.c.group_id == group.id)
+        .order_by(User.last_name, User.first_name)
+    ).all()
+    
+    return render_template('avec/meeting_attendance.html', group=group, meeting=meeting, members=members)
+
+def sharing_plan(group, total_capital):
+    """Parts et montant revenant à chaque membre : ({user_id: parts}, {user_id: FCFA})"""
+    # Répartition entière au prorata des parts : la somme des montants
+    # versés est exactement égale au capital, sans franc perdu ni créé
+    shares_by_member = group.get_shares_by_member()
+    members = [member.id for member in group.members]
+    shares = [shares_by_member.get(member_id, 0) for member_id in members]
+    profits = allocate(total_capital, shares)
+    return dict(zip(members, shares)), dict(zip(members, profits))
+
 @bp.route('/group/<int:group_id>/cycle-sharing')
 @login_required
 def cycle_sharing(group_id):
@@ -194,21 +398,13 @@ def cycle_sharing(group_id):
         return redirect(url_for('groups.show', id=group_id))
     
     # Calculer le partage des bénéfices
-    total_capital = group.total_savings + group.total_loans  # Épargne + intérêts
-    total_shares = group.get_total_shares()
-    
-    # Calculer la part de chaque membre
-    members_shares = {}
-    members_profit = {}
-    
-    for member in group.members:
-        shares = group.get_member_shares(member.id)
-        members_shares[member.id] = shares
-        if total_shares > 0:
-            profit_share = (shares / total_shares) * total_capital
-            members_profit[member.id] = profit_share
-        else:
-            members_profit[member.id] = 0
+    total_capital = group.sharing_capital()
+    members_shares, members_profit = sharing_plan(group, total_capital)
+    total_shares = sum(members_shares.values())
+    ledger = group.ledger()
+    cycle_transactions = db.session.query(ledger).filter(
+        ledger.group_id == group_id, ledger.created_at >= cycle.start_date
+    ).order_by(ledger.created_at.desc()).all()
     
     return render_template('avec/cycle_sharing.html',
                          group=group,
@@ -216,7 +412,8 @@ def cycle_sharing(group_id):
                          total_capital=total_capital,
                          total_shares=total_shares,
                          members_shares=members_shares,
-                         members_profit=members_profit)
+                         members_profit=members_profit,
+                         cycle_transactions=cycle_transactions)
 
 @bp.route('/group/<int:group_id>/cycle-sharing/execute', methods=['POST'])
 @login_required
@@ -234,14 +431,13 @@ def execute_cycle_sharing(group_id):
     cycle.profit_sharing_date = datetime.utcnow()
     
     # Créer des transactions de partage pour chaque membre
-    total_shares = group.get_total_shares()
-    total_capital = group.total_savings + group.total_loans
+    total_capital = group.sharing_capital()
+    members_shares, members_profit = sharing_plan(group, total_capital)
     
     for member in group.members:
-        shares = group.get_member_shares(member.id)
-        if total_shares > 0:
-            profit_share = (shares / total_shares) * total_capital
-            
+        shares = members_shares[member.id]
+        profit_share = members_profit[member.id]
+        if profit_share > 0:
             transaction = Transaction(
                 type='profit_sharing',
                 amount=profit_share,
@@ -268,26 +464,49 @@ def formation_modules(group_id):
         flash('Accès non autorisé', 'error')
         return redirect(url_for('dashboard'))
     
-    modules = FormationModule.query.filter_by(group_id=group_id).order_by(FormationModule.order).all()
-    return render_template('avec/formation_modules.html', group=group, modules=modules)
+    # Avancement et modules du catalogue en une requête, sans charger les contenus
+    progress = GroupFormationProgress.history() if group.is_archived() else GroupFormationProgress
+    modules = db.session.query(progress, FormationModule).join(
+        FormationModule, progress.module_id == FormationModule.id
+    ).filter(
+        progress.group_id == group_id
+    ).options(
+        db.defer(FormationModule.content)
+    ).order_by(FormationModule.order, FormationModule.id).all()
+    completed = sum(1 for progress, module in modules if progress.is_completed)
+    return render_template('avec/formation_modules.html', group=group, modules=modules, completed=completed)
 
 @bp.route('/formation/<int:group_id>/module/<int:module_id>', methods=['GET', 'POST'])
 @login_required
 def formation_module_detail(group_id, module_id):
     """Détail d'un module de formation"""
     group = Group.query.get_or_404(group_id)
-    module = FormationModule.query.get_or_404(module_id)
+    if group.is_archived():
+        history = GroupFormationProgress.history()
+        progress = db.session.query(history).filter(
+            history.group_id == group_id, history.module_id == module_id).first_or_404()
+    else:
+        progress = GroupFormationProgress.query.get_or_404((group_id, module_id))
+    module = progress.module
+    
+    if current_user not in group.members and current_user.role not in ['admin', 'animateur']:
+        flash('Accès non autorisé', 'error')
+        return redirect(url_for('dashboard'))
     
     if request.method == 'POST':
-        module.is_completed = True
-        module.completed_at = datetime.utcnow()
-        module.completed_by = current_user.id
-        db.session.commit()
+        if group.is_archived():
+            flash('Le cycle de ce groupe est archivé', 'warning')
+            return redirect(url_for('avec.formation_modules', group_id=group_id))
+        if not progress.is_completed:
+            progress.is_completed = True
+            progress.completed_at = datetime.utcnow()
+            progress.completed_by = current_user.id
+            db.session.commit()
         
         flash('Module marqué comme terminé!', 'success')
         return redirect(url_for('avec.formation_modules', group_id=group_id))
     
-    return render_template('avec/formation_module_detail.html', group=group, module=module)
+    return render_template('avec/formation_module_detail.html', group=group, module=module, progress=progress)
 
 @bp.route('/group/<int:group_id>/committee')
 @login_required
@@ -333,12 +552,18 @@ def solidarity_fund(group_id):
         flash('Accès non autorisé', 'error')
         return redirect(url_for('dashboard'))
     
-    solidarity_transactions = Transaction.query.filter_by(
-        group_id=group_id, 
-        type='solidarity'
-    ).order_by(Transaction.created_at.desc()).all()
+    page = request.args.get('page', 1, type=int)
+    ledger, ledger_total = group.solidarity_ledger()
+    movements = ledger.paginate(page=page, per_page=LEDGER_PER_PAGE, error_out=False)
+    
+    can_disburse = (current_user.id in (group.president_id, group.treasurer_id)
+                    or current_user.role in ['admin', 'animateur'])
     
-    return render_template('avec/solidarity_fund.html', group=group, transactions=solidarity_transactions)
+    return render_template('avec/solidarity_fund.html',
+                         group=group,
+                         movements=movements,
+                         ledger_total=ledger_total,
+                         can_disburse=can_disburse)
 
 @bp.route('/group/<int:group_id>/solidarity-fund/add', methods=['POST'])
 @login_required
@@ -358,7 +583,7 @@ def add_solidarity_contribution(group_id):
         return redirect(url_for('avec.solidarity_fund', group_id=group_id))
     
     try:
-        amount = float(amount)
+        amount = parse_amount(amount)
     except ValueError:
         flash('Montant invalide', 'error')
         return redirect(url_for('avec.solidarity_fund', group_id=group_id))
@@ -372,13 +597,72 @@ def add_solidarity_contribution(group_id):
         status='completed'
     )
     
-    group.solidarity_fund += amount
+    Group.apply_balance_delta(group_id, solidarity_fund=amount)
     db.session.add(transaction)
     db.session.commit()
+    metrics.transaction_created(transaction)
     
     flash(f'Contribution de {amount} FCFA ajoutée à la caisse de solidarité!', 'success')
     return redirect(url_for('avec.solidarity_fund', group_id=group_id))
 
+@bp.route('/group/<int:group_id>/solidarity-fund/disburse', methods=['POST'])
+@login_required
+def disburse_solidarity(group_id):
+    """Verser une aide de la caisse de solidarité à un membre"""
+    group = Group.query.get_or_404(group_id)
+    
+    if current_user.id not in (group.president_id, group.treasurer_id) and current_user.role not in ['admin', 'animateur']:
+        flash('Seuls le président, le trésorier ou l\'animateur peuvent décaisser', 'error')
+        return redirect(url_for('avec.solidarity_fund', group_id=group_id))
+    
+    beneficiary_id = request.form.get('beneficiary_id', type=int)
+    description = request.form.get('description')
+    
+    is_member = beneficiary_id and db.session.execute(
+        db.select(user_groups.c.user_id).where(
+            user_groups.c.group_id == group_id,
+            user_groups.c.user_id == beneficiary_id
+        )
+    ).first()
+    if not is_member:
+        flash('Le bénéficiaire doit être membre du groupe', 'error')
+        return redirect(url_for('avec.solidarity_fund', group_id=group_id))
+    
+    if not description:
+        flash('Le motif de l\'aide est obligatoire', 'error')
+        return redirect(url_for('avec.solidarity_fund', group_id=group_id))
+    
+    try:
+        amount = parse_amount(request.form.get('amount'))
+    except ValueError:
+        flash('Montant invalide', 'error')
+        return redirect(url_for('avec.solidarity_fund', group_id=group_id))
+    
+    if amount <= 0:
+        flash('Montant invalide', 'error')
+        return redirect(url_for('avec.solidarity_fund', group_id=group_id))
+    
+    if not Group.withdraw_solidarity(group_id, amount):
+        flash('Solde de la caisse de solidarité insuffisant', 'error')
+        return redirect(url_for('avec.solidarity_fund', group_id=group_id))
+    
+    transaction = Transaction(
+        type='solidarity_disbursement',
+        amount=amount,
+        description=description,
+        group_id=group_id,
+        user_id=beneficiary_id,
+        status='completed',
+        approved_by=current_user.id,
+        approved_at=datetime.utcnow()
+    )
+    db.session.add(transaction)
+    db.session.commit()
+    metrics.transaction_created(transaction)
+    
+    flash(f'Aide de {amount} FCFA versée depuis la caisse de solidarité', 'success')
+    return redirect(url_for('avec.solidarity_fund', group_id=group_id))
+
 @bp.route('/member/<int:user_id>/account-book')
 @login_required
 def member_account_book(user_id):
@@ -390,7 +674,9 @@ def member_account_book(user_id):
         flash('Accès non autorisé', 'error')
         return redirect(url_for('dashboard'))
     
-    transactions = Transaction.query.filter_by(user_id=user_id).order_by(Transaction.created_at.desc()).all()
+    # Cycles archivés compris (flask archive run)
+    ledger = Transaction.history()
+    transactions = db.session.query(ledger).filter(ledger.user_id == user_id).order_by(ledger.created_at.desc()).all()
     
     # Calculer les totaux
     total_savings = sum(t.amount for t in transactions if t.type == 'shares_purchase' and t.status == 'completed')
@@ -422,7 +708,21 @@ def supervision_dashboard():
     # Groupes récents
     recent_groups = Group.query.order_by(Group.created_at.desc()).limit(5).all()
     
+    # Assiduité : taux récent comparé au taux global, lus sur les compteurs des groupes
+    overall_rate = Group.attendance_present * 100.0 / Group.attendance_expected
+    trend = (Group.attendance_recent_rate - overall_rate).label('trend')
+    attendance_trends = db.session.query(Group, overall_rate.label('overall_rate'), trend).filter(
+        Group.attendance_expected > 0,
+        Group.attendance_recent_rate.isnot(None)
+    ).order_by(trend, Group.id).limit(10).all()
+    
+    # Avancement de la formation, agrégé par module du catalogue
+    formation_completion = GroupFormationProgress.completion_by_module()
+    
     return render_template('avec/supervision_dashboard.html',
+                         attendance_trends=attendance_trends,
+                         formation_completion=formation_completion,
+                         recent_meetings=Group.RECENT_MEETINGS,
                          total_groups=total_groups,
                          active_groups=active_groups,
                          groups_in_preparation=groups_in_preparation,
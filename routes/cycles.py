@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
 from models import db, Cycle, Group
+from models.money import parse_amount
 from datetime import datetime
+from search import index as search_index
 
 bp = Blueprint('cycles', __name__, url_prefix='/cycles')
 
@@ -20,7 +22,12 @@ def index():
     if phase:
         query = query.filter_by(phase=phase)
     if search:
-        query = query.filter(Cycle.name.ilike(f'%{search}%'))
+        # Index plein texte (préfixes de mots) ; ilike si l'index est indisponible
+        cycle_ids = search_index.matching('cycle', search)
+        if cycle_ids is None:
+            query = query.filter(Cycle.name.ilike(f'%{search}%'))
+        else:
+            query = query.filter(Cycle.id.in_(cycle_ids))
     
     cycles = query.order_by(Cycle.created_at.desc()).paginate(
         page=page, per_page=10, error_out=False
@@ -48,7 +55,7 @@ def create():
         try:
             start_date = datetime.strptime(start_date, '%Y-%m-%d')
             end_date = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
-            target_amount = float(target_amount) if target_amount else 0
+            target_amount = parse_amount(target_amount) if target_amount else 0
             interest_rate = float(interest_rate) if interest_rate else 0
         except ValueError:
             flash('Format de date ou de nombre invalide', 'error')
@@ -65,6 +72,7 @@ def create():
             meeting_day=meeting_day,
             created_by=current_user.id
         )
+        cycle.reschedule()
         
         db.session.add(cycle)
         db.session.commit()
@@ -110,7 +118,7 @@ def edit(id):
         try:
             start_date = datetime.strptime(start_date, '%Y-%m-%d')
             end_date = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
-            target_amount = float(target_amount) if target_amount else 0
+            target_amount = parse_amount(target_amount) if target_amount else 0
             interest_rate = float(interest_rate) if interest_rate else 0
         except ValueError:
             flash('Format de date ou de nombre invalide', 'error')
@@ -126,6 +134,7 @@ def edit(id):
         cycle.phase = phase
         cycle.meeting_frequency = meeting_frequency
         cycle.meeting_day = meeting_day
+        cycle.reschedule()
         
         db.session.commit()
         
@@ -168,11 +177,12 @@ def next_phase(id):
         flash('Le cycle est déjà terminé', 'error')
         return redirect(url_for('cycles.show', id=id))
     
-    phases = ['preparation', 'formation', 'supervision', 'completed']
+    phases = Cycle.PHASES
     current_index = phases.index(cycle.phase)
     
     if current_index < len(phases) - 1:
         cycle.phase = phases[current_index + 1]
+        cycle.reschedule()
         db.session.commit()
         flash('Cycle passé à la phase suivante!', 'success')
     else:
@@ -0,0 +1,29 @@
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app
+from flask_login import login_required, current_user
+from monitoring import perf
+
+bp = Blueprint('debug', __name__, url_prefix='/debug')
+
+@bp.route('/perf')
+@login_required
+def perf_panel():
+    """Percentiles de temps de réponse et de requêtes SQL par endpoint"""
+    if current_user.role != 'admin':
+        flash('Accès réservé aux administrateurs', 'error')
+        return redirect(url_for('dashboard'))
+
+    return render_template('debug/perf.html',
+                         rows=perf.store.summary(),
+                         slow_request_ms=current_app.config.get('PERF_SLOW_REQUEST_MS', 500))
+
+@bp.route('/perf/reset', methods=['POST'])
+@login_required
+def perf_reset():
+    """Vider les échantillons collectés"""
+    if current_user.role != 'admin':
+        flash('Accès réservé aux administrateurs', 'error')
+        return redirect(url_for('dashboard'))
+
+    perf.store.reset()
+    flash('Mesures de performance réinitialisées', 'success')
+    return redirect(url_for('debug.perf_panel'))
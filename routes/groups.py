@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
-from models import db, Group, Cycle, User, Transaction
+from models import db, Group, Cycle, User, GroupFormationProgress, MeetingSnapshot, user_groups, starts_with
+from models.money import parse_amount
 from datetime import datetime
+from search import index as search_index
 
 bp = Blueprint('groups', __name__, url_prefix='/groups')
 
@@ -20,7 +22,12 @@ def index():
     if cycle_id:
         query = query.filter_by(cycle_id=cycle_id)
     if search:
-        query = query.filter(Group.name.ilike(f'%{search}%'))
+        # Index plein texte sur le nom et le village ; ilike si l'index est indisponible
+        group_ids = search_index.matching('group', search)
+        if group_ids is None:
+            query = query.filter(Group.name.ilike(f'%{search}%'))
+        else:
+            query = query.filter(Group.id.in_(group_ids))
     
     groups = query.order_by(Group.created_at.desc()).paginate(
         page=page, per_page=10, error_out=False
@@ -61,8 +68,8 @@ def create():
         
         try:
             max_members = int(max_members) if max_members else 25
-            contribution_amount = float(contribution_amount) if contribution_amount else 0
-            share_value = float(share_value) if share_value else 1000
+            contribution_amount = parse_amount(contribution_amount) if contribution_amount else 0
+            share_value = parse_amount(share_value) if share_value else 1000
             loan_interest_rate = float(loan_interest_rate) if loan_interest_rate else 10
         except ValueError:
             flash('Format de nombre invalide', 'error')
@@ -83,6 +90,9 @@ def create():
         )
         
         db.session.add(group)
+        db.session.flush()
+        Cycle.apply_counter_delta(cycle.id, group_count=1)
+        GroupFormationProgress.enroll_groups([group.id])
         db.session.commit()
         
         flash('Groupe créé avec succès!', 'success')
@@ -95,9 +105,13 @@ def create():
 @login_required
 def show(id):
     group = Group.query.get_or_404(id)
-    transactions = group.transactions.order_by(Transaction.created_at.desc()).limit(10).all()
+    ledger = group.ledger()
+    group_transactions = db.session.query(ledger).filter(ledger.group_id == id)
+    transactions = group_transactions.order_by(ledger.created_at.desc()).limit(10).all()
+    completed_count = group_transactions.filter(ledger.status == 'completed').count()
     
-    return render_template('groups/show.html', group=group, transactions=transactions)
+    return render_template('groups/show.html', group=group, transactions=transactions,
+                           completed_count=completed_count)
 
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
@@ -124,7 +138,7 @@ def edit(id):
         
         try:
             max_members = int(max_members) if max_members else 25
-            contribution_amount = float(contribution_amount) if contribution_amount else 0
+            contribution_amount = parse_amount(contribution_amount) if contribution_amount else 0
         except ValueError:
             flash('Format de nombre invalide', 'error')
             return render_template('groups/edit.html', group=group)
@@ -158,12 +172,45 @@ def delete(id):
         flash('Impossible de supprimer un groupe avec des membres', 'error')
         return redirect(url_for('groups.show', id=id))
     
+    Cycle.apply_counter_delta(group.cycle_id, group_count=-1, current_amount=-(group.total_savings or 0))
+    GroupFormationProgress.query.filter_by(group_id=id).delete()
+    MeetingSnapshot.delete_for_group(id)
     db.session.delete(group)
     db.session.commit()
     
     flash('Groupe supprimé avec succès!', 'success')
     return redirect(url_for('groups.index'))
 
+MEMBERS_PER_PAGE = 20
+
+def available_users_query(group, search=None):
+    """Utilisateurs actifs non membres du groupe, filtrés par préfixe de nom, de village ou de téléphone"""
+    # Anti-jointure NOT EXISTS au lieu de NOT IN sur la liste complète des membres
+    query = User.query.filter(
+        User.status == 'active',
+        ~db.exists().where(
+            user_groups.c.user_id == User.id,
+            user_groups.c.group_id == group.id
+        )
+    )
+    
+    prefix = (search or '').strip().lower()
+    if prefix:
+        # Index plein texte, normalisé sans accents : « elo » comme « élo »
+        # trouvent « Élodie », ce que lower() de SQLite (ASCII seulement) ne
+        # permet pas. Préfixe sur lower(...) si l'index est indisponible
+        user_ids = search_index.matching('user', prefix)
+        if user_ids is None:
+            query = query.filter(db.or_(
+                starts_with(db.func.lower(User.last_name), prefix),
+                starts_with(db.func.lower(User.first_name), prefix),
+                starts_with(db.func.lower(User.village), prefix)
+            ))
+        else:
+            query = query.filter(User.id.in_(user_ids))
+    
+    return query.order_by(db.func.lower(User.last_name), db.func.lower(User.first_name), User.id)
+
 @bp.route('/<int:id>/add-member', methods=['GET', 'POST'])
 @login_required
 def add_member(id):
@@ -174,42 +221,51 @@ def add_member(id):
         return redirect(url_for('groups.show', id=id))
     
     if request.method == 'POST':
-        user_id = request.form.get('user_id')
-        
-        if not user_id:
-            flash('Utilisateur requis', 'error')
-            return redirect(url_for('groups.add_member', id=id))
+        # Plusieurs cases cochées (user_ids) ou un seul utilisateur (user_id)
+        user_ids = {int(user_id) for user_id in request.form.getlist('user_ids') + request.form.getlist('user_id')
+                    if user_id.isdigit()}
         
-        user = User.query.get(user_id)
-        if not user:
-            flash('Utilisateur non trouvé', 'error')
+        if not user_ids:
+            flash('Sélectionnez au moins un utilisateur', 'error')
             return redirect(url_for('groups.add_member', id=id))
         
-        if user in group.members:
-            flash('L\'utilisateur est déjà membre de ce groupe', 'error')
-            return redirect(url_for('groups.add_member', id=id))
+        # Verrouille la ligne du groupe (PostgreSQL) : deux inscriptions
+        # simultanées ne peuvent pas dépasser ensemble la capacité. populate_existing :
+        # le groupe est déjà dans la session, il faut relire son effectif verrouillé
+        group = Group.query.filter_by(id=id).with_for_update().populate_existing().one()
         
         if not group.can_accept_members():
             flash('Le groupe ne peut plus accepter de nouveaux membres', 'error')
             return redirect(url_for('groups.add_member', id=id))
         
-        group.members.append(user)
-        group.current_members += 1
+        places = group.max_members - group.current_members
+        added = group.enroll_members(user_ids)
         
-        if group.current_members >= group.max_members:
-            group.status = 'full'
+        if group.current_members > group.max_members:
+            db.session.rollback()
+            flash(f'Capacité dépassée : il reste {places} place(s) dans ce groupe', 'error')
+            return redirect(url_for('groups.add_member', id=id))
         
         db.session.commit()
         
-        flash('Membre ajouté avec succès!', 'success')
+        if not added:
+            flash('Aucun membre ajouté : utilisateurs déjà membres ou inactifs', 'error')
+            return redirect(url_for('groups.add_member', id=id))
+        
+        skipped = len(user_ids) - added
+        if skipped:
+            flash(f'{added} membre(s) ajouté(s), {skipped} ignoré(s) (déjà membres ou inactifs)', 'success')
+        else:
+            flash(f'{added} membre(s) ajouté(s) avec succès!', 'success')
         return redirect(url_for('groups.show', id=id))
     
-    # Utilisateurs disponibles (non membres du groupe)
-    available_users = User.query.filter(
-        ~User.id.in_([member.id for member in group.members])
-    ).all()
+    search = request.args.get('search', '')
+    page = request.args.get('page', 1, type=int)
+    available_users = available_users_query(group, search).paginate(
+        page=page, per_page=MEMBERS_PER_PAGE, error_out=False
+    )
     
-    return render_template('groups/add_member.html', group=group, available_users=available_users)
+    return render_template('groups/add_member.html', group=group, available_users=available_users, search=search)
 
 @bp.route('/<int:id>/remove-member/<int:user_id>', methods=['POST'])
 @login_required
@@ -220,18 +276,12 @@ def remove_member(id, user_id):
         flash('Permissions insuffisantes', 'error')
         return redirect(url_for('groups.show', id=id))
     
-    user = User.query.get_or_404(user_id)
+    User.query.get_or_404(user_id)
     
-    if user not in group.members:
+    if not group.remove_members([user_id]):
         flash('L\'utilisateur n\'est pas membre de ce groupe', 'error')
         return redirect(url_for('groups.show', id=id))
     
-    group.members.remove(user)
-    group.current_members -= 1
-    
-    if group.status == 'full' and group.current_members < group.max_members:
-        group.status = 'active'
-    
     db.session.commit()
     
     flash('Membre retiré avec succès!', 'success')
@@ -0,0 +1,15 @@
+from flask import Blueprint, Response, request, abort, current_app
+from monitoring import metrics
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics')
+def index():
+    """Exposition des métriques au format texte Prometheus"""
+    # Jeton facultatif pour les déploiements où /metrics est joignable publiquement
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
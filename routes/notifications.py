@@ -1,11 +1,15 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from models import db, User, Cycle, Group, Transaction
+from models import db, User, Cycle, Group, Transaction, Notification, user_groups
+from jobs.sms import enqueue_sms
 from datetime import datetime, timedelta
 import json
 
 bp = Blueprint('notifications', __name__, url_prefix='/notifications')
 
+# Notifications enregistrées affichées au plus
+STORED_LIMIT = 50
+
 @bp.route('/')
 @login_required
 def index():
@@ -17,13 +21,18 @@ def index():
 @login_required
 def mark_read(notification_id):
     """Marquer une notification comme lue"""
-    # Ici vous pourriez implémenter un système de notifications en base
+    Notification.query.filter_by(id=notification_id, user_id=current_user.id, read_at=None).update(
+        {'read_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
     return jsonify({'success': True})
 
 @bp.route('/mark-all-read', methods=['POST'])
 @login_required
 def mark_all_read():
     """Marquer toutes les notifications comme lues"""
+    Notification.query.filter_by(user_id=current_user.id, read_at=None).update(
+        {'read_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
     return jsonify({'success': True})
 
 @bp.route('/api/unread-count')
@@ -90,24 +99,80 @@ def get_user_notifications(user_id):
                     'url': url_for('transactions.show', id=transaction.id)
                 })
     
+    # Notifications enregistrées par les travaux différés (flask jobs work)
+    stored = Notification.query.filter_by(user_id=user_id, read_at=None).order_by(
+        Notification.created_at.desc()).limit(STORED_LIMIT).all()
+    for notification in stored:
+        notifications.append({
+            'id': notification.id,
+            'type': notification.type,
+            'title': notification.title,
+            'message': notification.message,
+            'date': notification.created_at,
+            'url': notification.url
+        })
+    
     # Trier par date (plus récentes en premier)
     notifications.sort(key=lambda x: x['date'], reverse=True)
     return notifications
 
 def get_unread_count(user_id):
-    """Obtenir le nombre de notifications non lues"""
-    notifications = get_user_notifications(user_id)
-    return len(notifications)
+    """Obtenir le nombre de notifications non lues.
+    
+    Appelée à chaque interrogation périodique des pages : mêmes règles que
+    get_user_notifications, mais en requêtes COUNT, sans charger les lignes.
+    """
+    now = datetime.utcnow()
+    overdue = db.and_(
+        Transaction.user_id == user_id,
+        Transaction.status == 'pending',
+        Transaction.due_date < now
+    )
+    counts = db.session.execute(db.select(
+        # Cycles qui se terminent dans 1 à 7 jours (jours entiers restants)
+        db.select(db.func.count(Cycle.id)).where(
+            Cycle.created_by == user_id,
+            Cycle.status == 'active',
+            Cycle.end_date >= now + timedelta(days=1),
+            Cycle.end_date < now + timedelta(days=8)
+        ).scalar_subquery(),
+        # Groupes actifs du membre où il a des transactions en retard
+        db.select(db.func.count(db.distinct(Transaction.group_id))).join(
+            user_groups, db.and_(user_groups.c.group_id == Transaction.group_id,
+                                 user_groups.c.user_id == user_id)
+        ).join(Group, Group.id == Transaction.group_id).where(
+            overdue, Group.status == 'active'
+        ).scalar_subquery(),
+        # Transactions en retard
+        db.select(db.func.count(Transaction.id)).where(overdue).scalar_subquery(),
+        # Notifications enregistrées non lues
+        db.select(db.func.count()).select_from(
+            db.select(Notification.id).where(
+                Notification.user_id == user_id, Notification.read_at.is_(None)
+            ).limit(STORED_LIMIT).subquery()
+        ).scalar_subquery()
+    )).one()
+    return sum(counts)
 
-def create_notification(user_id, notification_type, title, message, url=None):
-    """Créer une nouvelle notification"""
-    # Ici vous pourriez sauvegarder en base de données
-    notification = {
-        'id': f'notif_{datetime.utcnow().timestamp()}',
-        'type': notification_type,
-        'title': title,
-        'message': message,
-        'date': datetime.utcnow(),
-        'url': url
-    }
-    return notification 
\ No newline at end of file
+def create_notification(user_id, notification_type, title, message, url=None, sms=False):
+    """Créer une nouvelle notification
+    
+    Avec sms=True, le message est aussi mis en file pour un SMS si l'utilisateur
+    a un numéro ; l'envoi est fait par flask sms send, jamais ici. La
+    validation reste à l'appelant.
+    """
+    notification = Notification(user_id=user_id, type=notification_type, title=title,
+                                message=message, url=url)
+    db.session.add(notification)
+    if sms:
+        phone = db.session.execute(db.select(User.phone).where(User.id == user_id)).scalar()
+        if phone:
+            db.session.flush()
+            enqueue_sms([{
+                'user_id': user_id,
+                'phone': phone,
+                'kind': 'notification',
+                'body': f'{title} : {message}' if message else title,
+                'dedup_key': f'notification:{notification.id}',
+            }])
+    return notification
@@ -0,0 +1,49 @@
+from flask import Blueprint, request, jsonify, url_for
+from flask_login import login_required, current_user
+from search import index as search_index
+
+bp = Blueprint('search', __name__, url_prefix='/search')
+
+# Les fiches membres (téléphones) ne sont proposées qu'à l'encadrement
+STAFF_ROLES = ['admin', 'supervisor', 'animator', 'animateur']
+
+MAX_RESULTS = 20
+
+def result_url(kind, ref_id, label):
+    """Page de destination d'une entrée de l'index"""
+    if kind == 'group':
+        return url_for('groups.show', id=ref_id)
+    if kind == 'cycle':
+        return url_for('cycles.show', id=ref_id)
+    if kind == 'user':
+        return url_for('avec.member_account_book', user_id=ref_id)
+    # Village : les groupes du village (le nom de village est indexé avec les groupes)
+    return url_for('groups.index', search=label)
+
+@bp.route('/typeahead')
+@login_required
+def typeahead():
+    """Suggestions de groupes, cycles, membres et villages pour la saisie en cours"""
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 8, type=int), MAX_RESULTS))
+
+    kinds = [kind for kind in search_index.KINDS
+             if kind != 'user' or current_user.role in STAFF_ROLES]
+
+    results = []
+    seen_villages = set()
+    for row in search_index.search(query, kinds=kinds, limit=limit):
+        # Un village évalué plusieurs fois n'est proposé qu'une fois
+        if row.kind == 'village':
+            if row.label.lower() in seen_villages:
+                continue
+            seen_villages.add(row.label.lower())
+        results.append({
+            'kind': row.kind,
+            'id': row.ref_id,
+            'label': row.label,
+            'detail': row.detail,
+            'url': result_url(row.kind, row.ref_id, row.label)
+        })
+
+    return jsonify({'query': query, 'results': results})
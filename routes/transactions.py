@@ -1,10 +1,35 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
-from models import db, Transaction, Group, User
+from sqlalchemy.orm.exc import StaleDataError
+from models import db, Transaction, Group, User, Meeting, user_groups, BALANCE_EFFECTS, REPAYMENT_TYPES
+from models.money import parse_amount
+from monitoring import metrics
 from datetime import datetime
 
 bp = Blueprint('transactions', __name__, url_prefix='/transactions')
 
+# Nombre de tentatives quand une autre requête a modifié la transaction entre-temps
+MAX_ATTEMPTS = 3
+CONFLICT_MESSAGE = 'La transaction a été modifiée simultanément par un autre utilisateur, veuillez réessayer'
+
+def commit_or_rollback():
+    """Valide la session ; False si la version lue était périmée (conflit)"""
+    try:
+        db.session.commit()
+        return True
+    except StaleDataError:
+        db.session.rollback()
+        return False
+
+def can_manage(transaction):
+    return current_user.role in ['admin', 'supervisor', 'animator'] or transaction.group.created_by == current_user.id
+
+def loan_refusal(decision):
+    return f"Prêt refusé : {decision['message']} (montant maximum accordable : {decision['limit']} FCFA)"
+
+def repayment_refusal(owed):
+    return f"Remboursement refusé : le montant dépasse le restant dû du membre ({owed} FCFA, intérêts compris)"
+
 @bp.route('/')
 @login_required
 def index():
@@ -41,6 +66,7 @@ def create():
         due_date = request.form.get('due_date')
         interest_rate = request.form.get('interest_rate')
         loan_term = request.form.get('loan_term')
+        guarantor_ids = request.form.getlist('guarantor_ids', type=int) if type_transaction == 'loan' else []
         
         if not all([type_transaction, amount, group_id]):
             flash('Type, montant et groupe sont obligatoires', 'error')
@@ -57,7 +83,7 @@ def create():
             return render_template('transactions/create.html')
         
         try:
-            amount = float(amount)
+            amount = parse_amount(amount)
             interest_rate = float(interest_rate) if interest_rate else 0
             loan_term = int(loan_term) if loan_term else None
             due_date = datetime.strptime(due_date, '%Y-%m-%d') if due_date else None
@@ -65,6 +91,24 @@ def create():
             flash('Format de nombre ou date invalide', 'error')
             return render_template('transactions/create.html')
         
+        if type_transaction == 'loan':
+            # Décision immédiate à partir de l'exposition précalculée de l'emprunteur,
+            # lue sous le verrou du groupe comme à l'approbation
+            group = Group.query.filter_by(id=group.id).with_for_update().populate_existing().one()
+            decision = group.loan_eligibility(current_user.id, amount)
+            if not decision['eligible']:
+                flash(loan_refusal(decision), 'error')
+                return redirect(url_for('transactions.create', group_id=group.id))
+            if current_user.id in guarantor_ids or len(group.member_exposures(guarantor_ids)) != len(set(guarantor_ids)):
+                flash('Les garants doivent être d\'autres membres du groupe', 'error')
+                return redirect(url_for('transactions.create', group_id=group.id))
+        elif type_transaction in REPAYMENT_TYPES:
+            # Un remboursement ne peut dépasser ce que le membre doit encore
+            owed = group.amount_owed(current_user.id)
+            if amount > owed:
+                flash(repayment_refusal(owed), 'error')
+                return redirect(url_for('transactions.create', group_id=group.id))
+        
         transaction = Transaction(
             type=type_transaction,
             amount=amount,
@@ -74,92 +118,247 @@ def create():
             due_date=due_date,
             interest_rate=interest_rate,
             loan_term=loan_term,
+            remaining_balance=amount if type_transaction == 'loan' else 0,
+            guarantors=','.join(str(guarantor_id) for guarantor_id in sorted(set(guarantor_ids))) or None,
             status='pending'
         )
         
         db.session.add(transaction)
         db.session.commit()
+        metrics.transaction_created(transaction)
         
         flash('Transaction créée avec succès!', 'success')
         return redirect(url_for('transactions.index'))
     
     groups = Group.query.filter_by(status='active').all()
-    return render_template('transactions/create.html', groups=groups)
+    # Garants possibles : membres des groupes proposés, filtrés par groupe dans la page
+    members = db.session.query(user_groups.c.group_id, User.id, User.first_name, User.last_name).join(
+        User, User.id == user_groups.c.user_id
+    ).filter(
+        user_groups.c.group_id.in_([group.id for group in groups])
+    ).order_by(User.last_name, User.first_name).all()
+    return render_template('transactions/create.html', groups=groups, members=members)
+
+@bp.route('/loan-eligibility')
+@login_required
+def loan_eligibility():
+    """Éligibilité de l'utilisateur courant à un prêt, pendant la saisie de la demande"""
+    group = Group.query.get_or_404(request.args.get('group_id', type=int))
+    try:
+        amount = parse_amount(request.args.get('amount', '0') or '0')
+    except ValueError:
+        amount = 0
+    return jsonify(group.loan_eligibility(current_user.id, amount))
 
 @bp.route('/<int:id>')
 @login_required
 def show(id):
-    transaction = Transaction.query.get_or_404(id)
+    transaction = Transaction.query.get(id)
+    archived = transaction is None
+    if archived:
+        # Transaction d'un cycle archivé (flask archive run)
+        ledger = Transaction.history()
+        transaction = db.session.query(ledger).filter(ledger.id == id).first_or_404()
+    
+    # Éligibilité de l'emprunteur au moment de l'approbation
+    decision = None
+    if not archived and transaction.type == 'loan' and transaction.status == 'pending':
+        decision = transaction.group.loan_eligibility(transaction.user_id, transaction.amount)
     
-    return render_template('transactions/show.html', transaction=transaction)
+    return render_template('transactions/show.html', transaction=transaction, archived=archived,
+                           decision=decision)
 
 @bp.route('/<int:id>/approve', methods=['POST'])
 @login_required
 def approve(id):
-    transaction = Transaction.query.get_or_404(id)
-    
-    # Vérifier les permissions
-    if current_user.role not in ['admin', 'supervisor', 'animator'] and transaction.group.created_by != current_user.id:
-        flash('Permissions insuffisantes', 'error')
-        return redirect(url_for('transactions.show', id=id))
-    
-    if transaction.status != 'pending':
-        flash('Seules les transactions en attente peuvent être approuvées', 'error')
-        return redirect(url_for('transactions.show', id=id))
-    
-    transaction.status = 'approved'
-    transaction.approved_by = current_user.id
-    transaction.approved_at = datetime.utcnow()
-    
-    # Mettre à jour les statistiques du groupe
-    if transaction.type == 'savings':
-        transaction.group.total_savings += transaction.amount
-    elif transaction.type == 'loan':
-        transaction.group.total_loans += transaction.amount
-    
-    db.session.commit()
+    # En cas de conflit, on relit la transaction : le contrôle de statut
+    # ci-dessous signale alors qu'elle a déjà été traitée.
+    for attempt in range(MAX_ATTEMPTS):
+        transaction = Transaction.query.get_or_404(id)
+        
+        # Vérifier les permissions
+        if not can_manage(transaction):
+            flash('Permissions insuffisantes', 'error')
+            return redirect(url_for('transactions.show', id=id))
+        
+        if transaction.status != 'pending':
+            flash('Seules les transactions en attente peuvent être approuvées', 'error')
+            return redirect(url_for('transactions.show', id=id))
+        
+        if transaction.type == 'loan':
+            # L'exposition a pu changer depuis la demande. Le groupe est verrouillé
+            # puis relu : deux approbations de prêts du groupe sont décidées l'une
+            # après l'autre, sur la caisse et l'exposition laissées par la précédente.
+            group = Group.query.filter_by(id=transaction.group_id).with_for_update().populate_existing().one()
+            decision = group.loan_eligibility(transaction.user_id, transaction.amount)
+            if not decision['eligible']:
+                flash(loan_refusal(decision), 'error')
+                return redirect(url_for('transactions.show', id=id))
+        elif transaction.type in REPAYMENT_TYPES:
+            # Restant dû relu sous le même verrou : deux remboursements ne l'excèdent pas ensemble
+            group = Group.query.filter_by(id=transaction.group_id).with_for_update().populate_existing().one()
+            owed = group.amount_owed(transaction.user_id)
+            if transaction.amount > owed:
+                flash(repayment_refusal(owed), 'error')
+                return redirect(url_for('transactions.show', id=id))
+        
+        transaction.status = 'approved'
+        transaction.approved_by = current_user.id
+        transaction.approved_at = datetime.utcnow()
+        
+        try:
+            # L'autoflush exécute ici l'UPDATE conditionné par la version
+            Group.apply_balance_delta(transaction.group_id, **transaction.balance_delta())
+            Transaction.apply_exposure([transaction])
+        except StaleDataError:
+            db.session.rollback()
+            continue
+        
+        if commit_or_rollback():
+            metrics.transaction_approved(transaction)
+            flash('Transaction approuvée avec succès!', 'success')
+            return redirect(url_for('transactions.show', id=id))
     
-    flash('Transaction approuvée avec succès!', 'success')
+    flash(CONFLICT_MESSAGE, 'error')
     return redirect(url_for('transactions.show', id=id))
 
 @bp.route('/<int:id>/reject', methods=['POST'])
 @login_required
 def reject(id):
-    transaction = Transaction.query.get_or_404(id)
-    
-    # Vérifier les permissions
-    if current_user.role not in ['admin', 'supervisor', 'animator'] and transaction.group.created_by != current_user.id:
-        flash('Permissions insuffisantes', 'error')
-        return redirect(url_for('transactions.show', id=id))
-    
-    if transaction.status != 'pending':
-        flash('Seules les transactions en attente peuvent être rejetées', 'error')
-        return redirect(url_for('transactions.show', id=id))
-    
     reason = request.form.get('reason', '')
-    transaction.status = 'rejected'
-    if reason:
-        transaction.description = f"{transaction.description or ''}\n\nRaison du rejet: {reason}"
     
-    db.session.commit()
+    for attempt in range(MAX_ATTEMPTS):
+        transaction = Transaction.query.get_or_404(id)
+        
+        # Vérifier les permissions
+        if not can_manage(transaction):
+            flash('Permissions insuffisantes', 'error')
+            return redirect(url_for('transactions.show', id=id))
+        
+        if transaction.status != 'pending':
+            flash('Seules les transactions en attente peuvent être rejetées', 'error')
+            return redirect(url_for('transactions.show', id=id))
+        
+        transaction.status = 'rejected'
+        if reason:
+            transaction.description = f"{transaction.description or ''}\n\nRaison du rejet: {reason}"
+        
+        if commit_or_rollback():
+            flash('Transaction rejetée avec succès!', 'success')
+            return redirect(url_for('transactions.show', id=id))
     
-    flash('Transaction rejetée avec succès!', 'success')
+    flash(CONFLICT_MESSAGE, 'error')
     return redirect(url_for('transactions.show', id=id))
 
 @bp.route('/<int:id>/complete', methods=['POST'])
 @login_required
 def complete(id):
-    transaction = Transaction.query.get_or_404(id)
+    for attempt in range(MAX_ATTEMPTS):
+        transaction = Transaction.query.get_or_404(id)
+        
+        if transaction.status != 'approved':
+            flash('Seules les transactions approuvées peuvent être complétées', 'error')
+            return redirect(url_for('transactions.show', id=id))
+        
+        transaction.status = 'completed'
+        
+        if commit_or_rollback():
+            flash('Transaction complétée avec succès!', 'success')
+            return redirect(url_for('transactions.show', id=id))
+    
+    flash(CONFLICT_MESSAGE, 'error')
+    return redirect(url_for('transactions.show', id=id))
+
+@bp.route('/meeting/<int:meeting_id>/approve-pending', methods=['POST'])
+@login_required
+def approve_meeting_pending(meeting_id):
+    """Approuver en une seule requête toutes les transactions en attente d'une réunion"""
+    meeting = Meeting.query.get_or_404(meeting_id)
+    # Verrou du groupe jusqu'au commit : les prêts sont décidés sur une caisse et
+    # des expositions qu'aucune autre approbation ne peut modifier entre-temps
+    group = Group.query.filter_by(id=meeting.group_id).with_for_update().populate_existing().first_or_404()
+    
+    if current_user.role not in ['admin', 'supervisor', 'animator', 'animateur'] and group.created_by != current_user.id:
+        flash('Permissions insuffisantes', 'error')
+        return redirect(url_for('avec.group_meetings', group_id=group.id))
+    
+    approved_at = datetime.utcnow()
+    
+    # Prêts et remboursements sont décidés dans l'ordre de saisie : chaque prêt
+    # accordé réduit la caisse et le plafond du membre pour les suivants ; un
+    # remboursement ne peut dépasser le restant dû du membre à ce moment
+    requests = db.session.execute(
+        db.select(Transaction.id, Transaction.type, Transaction.user_id, Transaction.amount)
+        .where(Transaction.meeting_id == meeting_id, Transaction.status == 'pending',
+               Transaction.type.in_(('loan',) + REPAYMENT_TYPES))
+        .order_by(Transaction.created_at, Transaction.id)
+    ).all()
+    exposures = group.member_exposures({request_row.user_id for request_row in requests})
+    cash, refused = group.available_cash(), []
+    for request_row in requests:
+        exposure = exposures.get(request_row.user_id)
+        if request_row.type == 'loan':
+            if group.loan_decision(exposure, request_row.amount, cash=cash)['eligible']:
+                cash -= request_row.amount
+                exposure['loan_outstanding'] += request_row.amount
+                continue
+        elif exposure is not None and request_row.amount <= exposure['loan_outstanding']:
+            # Le remboursement rentre dans la caisse
+            cash += request_row.amount
+            exposure['loan_outstanding'] -= request_row.amount
+            continue
+        refused.append(request_row.id)
+    
+    # Un seul UPDATE réserve l'ensemble : une approbation concurrente de l'une
+    # de ces transactions échouera sur sa version périmée.
+    claimed = db.session.execute(
+        db.update(Transaction)
+        .where(Transaction.meeting_id == meeting_id, Transaction.status == 'pending',
+               Transaction.id.notin_(refused))
+        .values(status='approved',
+                approved_by=current_user.id,
+                approved_at=approved_at,
+                version=Transaction.version + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    
+    if refused:
+        flash(f'{len(refused)} prêt(s) ou remboursement(s) laissé(s) en attente : plafond du membre, '
+              'caisse insuffisante ou montant supérieur au restant dû', 'warning')
     
-    if transaction.status != 'approved':
-        flash('Seules les transactions approuvées peuvent être complétées', 'error')
-        return redirect(url_for('transactions.show', id=id))
+    if not claimed:
+        flash('Aucune transaction en attente pour cette réunion', 'info')
+        return redirect(url_for('avec.group_meetings', group_id=group.id))
     
-    transaction.status = 'completed'
+    # Lignes réservées ci-dessus (même transaction SQL)
+    claimed_rows = db.and_(
+        Transaction.meeting_id == meeting_id,
+        Transaction.status == 'approved',
+        Transaction.approved_by == current_user.id,
+        Transaction.approved_at == approved_at
+    )
+    totals = db.session.query(Transaction.type, db.func.count(), db.func.sum(Transaction.amount)).filter(
+        claimed_rows
+    ).group_by(Transaction.type).all()
+    
+    deltas = {}
+    for type_transaction, count, amount in totals:
+        if type_transaction in BALANCE_EFFECTS:
+            column, sign = BALANCE_EFFECTS[type_transaction]
+            deltas[column] = deltas.get(column, 0) + sign * amount
+    
+    Group.apply_balance_delta(group.id, **deltas)
+    Transaction.apply_exposure(db.session.execute(
+        db.select(Transaction.type, Transaction.amount, Transaction.group_id, Transaction.user_id,
+                  Transaction.guarantors, Transaction.remaining_balance).where(claimed_rows)
+    ).all())
     db.session.commit()
     
-    flash('Transaction complétée avec succès!', 'success')
-    return redirect(url_for('transactions.show', id=id))
+    for type_transaction, count, amount in totals:
+        metrics.transactions_approved(type_transaction, count)
+    
+    flash(f'{claimed} transaction(s) approuvée(s) pour la réunion du {meeting.meeting_date.strftime("%d/%m/%Y")}', 'success')
+    return redirect(url_for('avec.group_meetings', group_id=group.id))
 
 @bp.route('/stats')
 @login_required
@@ -167,10 +366,12 @@ def stats():
     period = request.args.get('period', 'month')
     group_id = request.args.get('group_id')
     
-    query = Transaction.query.filter_by(status='completed')
+    # Les rapports couvrent aussi les cycles archivés
+    ledger = Transaction.history()
+    query = db.session.query(ledger).filter(ledger.status == 'completed')
     
     if group_id:
-        query = query.filter_by(group_id=group_id)
+        query = query.filter(ledger.group_id == group_id)
     
     # Filtrer par période
     now = datetime.utcnow()
@@ -183,7 +384,7 @@ def stats():
     else:
         start_date = datetime(now.year, now.month, now.day - 30)
     
-    query = query.filter(Transaction.created_at >= start_date)
+    query = query.filter(ledger.created_at >= start_date)
     transactions = query.all()
     
     # Calculer les statistiques
@@ -0,0 +1,314 @@
+"""Index de recherche plein texte : groupes, cycles, membres et villages.
+
+Sous SQLite, l'index est une table virtuelle FTS5 (avec index de préfixes
+pour la saisie semi-automatique) ; sous PostgreSQL, une table ordinaire
+indexée par trigrammes (``pg_trgm``). Les deux stockent un texte normalisé
+(minuscules, sans accents) calculé en Python, si bien que « kone » trouve
+« Koné » quel que soit le moteur.
+
+L'index est tenu à jour à chaque flush de la session ORM. Les écritures en
+masse qui passent par SQLAlchemy Core ne déclenchent pas ces événements :
+``flask seed generate`` reconstruit l'index à la fin, ``flask schema upgrade``
+le complète s'il lui manque des lignes, et ``flask search rebuild`` le refait
+à la demande. Tant qu'un type n'a aucune entrée, les listes gardent leur
+filtre ``ilike``.
+"""
+import logging
+import re
+import unicodedata
+
+from sqlalchemy import event, inspect
+
+from models import db, User, Cycle, Group, CommunityEvaluation
+
+logger = logging.getLogger('avec.search')
+
+TABLE = 'search_index'
+
+# Type d'entrée -> (modèle, code). Sous SQLite le rowid FTS5 vaut
+# ref_id * 8 + code : mise à jour et suppression se font alors par rowid
+# sans parcourir la table virtuelle.
+KINDS = {
+    'group': (Group, 1),
+    'cycle': (Cycle, 2),
+    'user': (User, 3),
+    'village': (CommunityEvaluation, 4),
+}
+KIND_BY_MODEL = {model: kind for kind, (model, code) in KINDS.items()}
+
+# Attributs dont la modification impose de réindexer la ligne
+INDEXED_ATTRIBUTES = {
+    Group: ('name', 'village'),
+    Cycle: ('name',),
+    User: ('first_name', 'last_name', 'phone', 'village', 'status'),
+    CommunityEvaluation: ('village_name',),
+}
+
+_WORD = re.compile(r'\w+')
+
+_backend = None
+# Types ayant au moins une entrée dans l'index (un type peuplé le reste)
+_populated = set()
+
+
+def normalize(text):
+    """Minuscules sans accents : « Bouaké » -> « bouake »."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokens(text):
+    return _WORD.findall(normalize(text))
+
+
+def document(kind, obj):
+    """Retourne (libellé, détail, termes indexés) d'une ligne, ou None si elle ne doit pas être indexée."""
+    if kind == 'group':
+        return obj.name, obj.village, f'{obj.name} {obj.village}'
+    if kind == 'cycle':
+        return obj.name, None, obj.name
+    if kind == 'user':
+        if obj.status != 'active':
+            return None
+        phone_digits = ''.join(char for char in obj.phone or '' if char.isdigit())
+        detail = ' · '.join(part for part in (obj.village, obj.phone) if part)
+        # Le numéro est aussi indexé sans séparateurs pour la recherche par préfixe
+        return (f'{obj.first_name} {obj.last_name}', detail,
+                f'{obj.first_name} {obj.last_name} {obj.village or ""} {obj.phone or ""} {phone_digits}')
+    if kind == 'village':
+        detail = f'Évaluation du {obj.evaluation_date:%d/%m/%Y}' if obj.evaluation_date else None
+        return obj.village_name, detail, obj.village_name
+    raise ValueError(kind)
+
+
+class SQLiteBackend:
+    """Table virtuelle FTS5, requêtes ``MATCH 'mot'*`` classées par bm25."""
+
+    def create(self, conn):
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            "terms, label UNINDEXED, detail UNINDEXED, kind UNINDEXED, ref_id UNINDEXED, "
+            "tokenize='unicode61', prefix='1 2 3')"
+        )
+
+    def clear(self, conn):
+        conn.exec_driver_sql(f'DELETE FROM {TABLE}')
+
+    def delete(self, conn, kind, ref_id):
+        conn.exec_driver_sql(f'DELETE FROM {TABLE} WHERE rowid = ?', (self._rowid(kind, ref_id),))
+
+    def insert(self, conn, rows):
+        conn.exec_driver_sql(
+            f'INSERT INTO {TABLE} (rowid, terms, label, detail, kind, ref_id) VALUES (?, ?, ?, ?, ?, ?)',
+            [(self._rowid(kind, ref_id), normalize(terms), label, detail, kind, ref_id)
+             for kind, ref_id, label, detail, terms in rows]
+        )
+
+    def search(self, conn, words, kinds, limit):
+        match = ' '.join(f'"{word}"*' for word in words)
+        kind_filter = ' AND kind IN (%s)' % ', '.join('?' * len(kinds))
+        return conn.exec_driver_sql(
+            f'SELECT kind, ref_id, label, detail FROM {TABLE} '
+            f'WHERE {TABLE} MATCH ?{kind_filter} ORDER BY rank LIMIT ?',
+            (match, *kinds, limit)
+        ).fetchall()
+
+    def matching(self, words, kind):
+        match = ' '.join(f'"{word}"*' for word in words)
+        return db.text(f'SELECT ref_id FROM {TABLE} WHERE {TABLE} MATCH :match AND kind = :kind').bindparams(
+            match=match, kind=kind)
+
+    def counts(self, conn):
+        return dict(conn.exec_driver_sql(f'SELECT kind, count(*) FROM {TABLE} GROUP BY kind').fetchall())
+
+    @staticmethod
+    def _rowid(kind, ref_id):
+        return ref_id * 8 + KINDS[kind][1]
+
+
+class PostgresBackend:
+    """Table ordinaire avec index GIN trigrammes, classée par similarité."""
+
+    def create(self, conn):
+        conn.exec_driver_sql('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        conn.exec_driver_sql(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+            'kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, '
+            'label TEXT NOT NULL, detail TEXT, terms TEXT NOT NULL, '
+            'PRIMARY KEY (kind, ref_id))'
+        )
+        conn.exec_driver_sql(
+            f'CREATE INDEX IF NOT EXISTS ix_{TABLE}_terms_trgm ON {TABLE} USING gin (terms gin_trgm_ops)')
+
+    def clear(self, conn):
+        conn.exec_driver_sql(f'TRUNCATE {TABLE}')
+
+    def delete(self, conn, kind, ref_id):
+        conn.exec_driver_sql(f'DELETE FROM {TABLE} WHERE kind = %s AND ref_id = %s', (kind, ref_id))
+
+    def insert(self, conn, rows):
+        conn.exec_driver_sql(
+            f'INSERT INTO {TABLE} (kind, ref_id, label, detail, terms) VALUES (%s, %s, %s, %s, %s) '
+            'ON CONFLICT (kind, ref_id) DO UPDATE SET '
+            'label = EXCLUDED.label, detail = EXCLUDED.detail, terms = EXCLUDED.terms',
+            [(kind, ref_id, label, detail, normalize(terms))
+             for kind, ref_id, label, detail, terms in rows]
+        )
+
+    def search(self, conn, words, kinds, limit):
+        # Chaque mot doit apparaître ; l'index trigramme sert les LIKE '%mot%'
+        word_filter = ' AND '.join(['terms LIKE %s'] * len(words))
+        kind_filter = ', '.join(['%s'] * len(kinds))
+        return conn.exec_driver_sql(
+            f'SELECT kind, ref_id, label, detail FROM {TABLE} '
+            f'WHERE {word_filter} AND kind IN ({kind_filter}) '
+            'ORDER BY similarity(terms, %s) DESC LIMIT %s',
+            (*[f'%{word}%' for word in words], *kinds, ' '.join(words), limit)
+        ).fetchall()
+
+    def matching(self, words, kind):
+        params = {f'word_{position}': f'%{word}%' for position, word in enumerate(words)}
+        word_filter = ' AND '.join(f'terms LIKE :{name}' for name in params)
+        return db.text(f'SELECT ref_id FROM {TABLE} WHERE {word_filter} AND kind = :kind').bindparams(
+            kind=kind, **params)
+
+    def counts(self, conn):
+        return dict(conn.exec_driver_sql(f'SELECT kind, count(*) FROM {TABLE} GROUP BY kind').fetchall())
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgresBackend,
+}
+
+
+def backend_for(engine):
+    backend_class = BACKENDS.get(engine.dialect.name)
+    return backend_class() if backend_class else None
+
+
+def enabled():
+    return _backend is not None
+
+
+def search(query, kinds=None, limit=10):
+    """Entrées correspondant à tous les mots (préfixes) de ``query``, les plus pertinentes d'abord."""
+    words = tokens(query)
+    if not words or not enabled():
+        return []
+    kinds = list(kinds or KINDS)
+    return _backend.search(db.session.connection(), words, kinds, limit)
+
+
+def populated(kind):
+    """Vrai si l'index contient au moins une entrée du type donné"""
+    if kind not in _populated and db.session.execute(
+            db.text(f'SELECT 1 FROM {TABLE} WHERE kind = :kind LIMIT 1'), {'kind': kind}).first():
+        _populated.add(kind)
+    return kind in _populated
+
+
+def matching(kind, query):
+    """Sous-requête des identifiants d'un type donné correspondant à ``query``.
+
+    S'utilise dans un filtre ``Model.id.in_(...)``, sans limite de nombre.
+    Retourne None si l'index n'est pas disponible ou pas encore peuplé pour
+    ce type : l'appelant garde alors son filtre ``ilike`` habituel.
+    """
+    if not enabled() or not populated(kind):
+        return None
+    words = tokens(query)
+    if not words:
+        return None
+    return _backend.matching(words, kind).columns(ref_id=db.Integer).scalar_subquery()
+
+
+def missing_entries():
+    """Nombre d'entrées attendues mais absentes de l'index, par type"""
+    backend = _backend or backend_for(db.engine)
+    with db.engine.connect() as conn:
+        indexed = backend.counts(conn)
+    expected = {kind: model.query.count() for kind, (model, code) in KINDS.items()}
+    expected['user'] = User.query.filter_by(status='active').count()
+    return {kind: count - indexed.get(kind, 0) for kind, count in expected.items()
+            if count > indexed.get(kind, 0)}
+
+
+def rebuild(batch_size=1000):
+    """Recrée l'index à partir des tables sources ; retourne le nombre d'entrées par type."""
+    backend = _backend or backend_for(db.engine)
+    if backend is None:
+        raise RuntimeError(f'Recherche plein texte non prise en charge pour {db.engine.dialect.name}')
+    counts = {}
+    with db.engine.begin() as conn:
+        backend.create(conn)
+        backend.clear(conn)
+        for kind, (model, code) in KINDS.items():
+            counts[kind] = 0
+            rows = []
+            for obj in model.query.yield_per(batch_size):
+                entry = document(kind, obj)
+                if entry is None:
+                    continue
+                rows.append((kind, obj.id, *entry))
+                if len(rows) >= batch_size:
+                    backend.insert(conn, rows)
+                    counts[kind] += len(rows)
+                    rows = []
+            if rows:
+                backend.insert(conn, rows)
+                counts[kind] += len(rows)
+    _populated.clear()
+    return counts
+
+
+def _needs_reindex(obj):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in INDEXED_ATTRIBUTES[type(obj)])
+
+
+def _sync_after_flush(session, flush_context):
+    """Reporte dans l'index les lignes indexées créées, modifiées ou supprimées."""
+    if not enabled():
+        return
+
+    changed = [obj for obj in session.new if type(obj) in KIND_BY_MODEL]
+    changed += [obj for obj in session.dirty
+                if type(obj) in KIND_BY_MODEL and _needs_reindex(obj)]
+    deleted = [obj for obj in session.deleted if type(obj) in KIND_BY_MODEL]
+    if not changed and not deleted:
+        return
+
+    # Même connexion, donc même transaction que les écritures ORM
+    conn = session.connection()
+    rows = []
+    for obj in changed + deleted:
+        _backend.delete(conn, KIND_BY_MODEL[type(obj)], obj.id)
+    for obj in changed:
+        kind = KIND_BY_MODEL[type(obj)]
+        entry = document(kind, obj)
+        if entry is not None:
+            rows.append((kind, obj.id, *entry))
+    if rows:
+        _backend.insert(conn, rows)
+
+
+def init_app(app):
+    """Crée l'index s'il manque et branche sa mise à jour sur la session."""
+    global _backend
+
+    with app.app_context():
+        backend = backend_for(db.engine)
+        if backend is None:
+            logger.warning('Recherche plein texte indisponible pour %s', db.engine.dialect.name)
+            return
+        try:
+            with db.engine.begin() as conn:
+                backend.create(conn)
+        except Exception as exc:
+            # pg_trgm absent ou droits insuffisants : les pages gardent leur filtre ilike
+            logger.warning('Index de recherche désactivé : %s', exc)
+            return
+
+    _backend = backend
+    event.listen(db.session, 'after_flush', _sync_after_flush)
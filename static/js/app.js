@@ -0,0 +1,83 @@
+// Scripts communs à toutes les pages (servis avec une empreinte par /assets)
+// Auto-hide alerts after 5 seconds
+document.addEventListener('DOMContentLoaded', function() {
+    setTimeout(function() {
+        const alerts = document.querySelectorAll('.alert');
+        alerts.forEach(function(alert) {
+            const bsAlert = new bootstrap.Alert(alert);
+            bsAlert.close();
+        });
+    }, 5000);
+});
+
+// Show loading on form submission
+document.addEventListener('DOMContentLoaded', function() {
+    const forms = document.querySelectorAll('form');
+    forms.forEach(function(form) {
+        form.addEventListener('submit', function() {
+            const loading = document.getElementById('loading');
+            if (loading) {
+                loading.classList.add('show');
+            }
+        });
+    });
+});
+
+// Recherche rapide : suggestions pendant la saisie
+document.addEventListener('DOMContentLoaded', function() {
+    const input = document.getElementById('typeahead-input');
+    const list = document.getElementById('typeahead-results');
+    if (!input) {
+        return;
+    }
+    const icons = {group: 'people', cycle: 'calendar-event', user: 'person', village: 'geo-alt'};
+    let timer = null;
+    let controller = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            const query = input.value.trim();
+            if (controller) {
+                controller.abort();
+            }
+            if (!query) {
+                list.innerHTML = '';
+                return;
+            }
+            controller = new AbortController();
+            fetch(input.dataset.url + '?q=' + encodeURIComponent(query), {signal: controller.signal})
+                .then(response => response.json())
+                .then(function(data) {
+                    list.innerHTML = '';
+                    data.results.forEach(function(result) {
+                        const item = document.createElement('a');
+                        item.className = 'list-group-item list-group-item-action py-1';
+                        item.href = result.url;
+                        const icon = document.createElement('i');
+                        icon.className = 'bi bi-' + icons[result.kind] + ' me-1';
+                        item.appendChild(icon);
+                        item.appendChild(document.createTextNode(result.label));
+                        if (result.detail) {
+                            const detail = document.createElement('small');
+                            detail.className = 'text-muted d-block';
+                            detail.textContent = result.detail;
+                            item.appendChild(detail);
+                        }
+                        list.appendChild(item);
+                    });
+                })
+                .catch(function() {});
+        }, 150);
+    });
+});
+
+// Mobile sidebar toggle
+document.addEventListener('DOMContentLoaded', function() {
+    const sidebarToggle = document.querySelector('[data-bs-toggle="collapse"]');
+    if (sidebarToggle) {
+        sidebarToggle.addEventListener('click', function() {
+            const sidebar = document.getElementById('sidebar');
+            sidebar.classList.toggle('show');
+        });
+    }
+});